@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import socket
+import time
+from typing import Optional
+
+from gt7dashboard import gt7events
+from gt7dashboard.gt7communication import GT7TelemetryProcessor
+from gt7dashboard.gt7heartbeat import HeartbeatScheduler, RECEIVE_TIMEOUT
+from gt7dashboard.gt7lap import Lap
+from gt7dashboard.gt7stats import ReceiveStats
+
+logger = logging.getLogger('gt7asynccommunication.py')
+
+
+class GT7AsyncCommunication(GT7TelemetryProcessor, asyncio.DatagramProtocol):
+    """
+    Receives and processes the packets of the PlayStation on an asyncio event loop,
+    e.g. the one of the Bokeh server, as an alternative to the threads of GT7Communication.
+
+    Packets are processed in the event loop as they arrive, so laps and data are only ever
+    changed on the loop. Heartbeats are scheduled by a HeartbeatScheduler.
+    """
+
+    def __init__(self, playstation_ip):
+        GT7TelemetryProcessor.__init__(self, playstation_ip)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._transport: Optional[asyncio.DatagramTransport] = None
+        self._heartbeat_handle: Optional[asyncio.TimerHandle] = None
+        # Set interval and jitter of the heartbeats here
+        self.heartbeat_scheduler = HeartbeatScheduler()
+
+    async def start(self):
+        """Starts receiving packets on the running event loop"""
+        self._loop = asyncio.get_running_loop()
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if self.playstation_ip == "255.255.255.255":
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.bind(('0.0.0.0', self.receive_port))
+
+        await self._loop.create_datagram_endpoint(lambda: self, sock=sock)
+
+    def stop(self):
+        if self._heartbeat_handle is not None:
+            self._heartbeat_handle.cancel()
+            self._heartbeat_handle = None
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def restart(self):
+        """Starts a new packet stream, e.g. after the PlayStation was restarted"""
+        self._package_id = 0
+        self._previous_lap = -1
+        self._send_heartbeat()
+
+    def is_receiving(self) -> bool:
+        return self._transport is not None
+
+    async def wait_for_lap(self, timeout: float = None) -> Lap:
+        """Waits for the next finished lap and returns it, raises asyncio.TimeoutError after timeout seconds"""
+        return await self.events.wait_for(gt7events.LAP_FINISHED, timeout)
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self._transport = transport
+        self._package_id = 0
+        self.stats = ReceiveStats()
+        self._previous_lap = -1
+        self._heartbeat()
+
+    def connection_lost(self, exc):
+        self._transport = None
+        if self._heartbeat_handle is not None:
+            self._heartbeat_handle.cancel()
+            self._heartbeat_handle = None
+
+    def datagram_received(self, data: bytes, addr):
+        arrival_time = time.time()
+        self.stats.add_arrival(arrival_time)
+
+        capture_writer = self._capture_writer
+        if capture_writer is not None:
+            capture_writer.write(data, arrival_time)
+
+        self._process_datagram(data, arrival_time)
+        if not self._connected:
+            self._check_connection()
+
+    def error_received(self, exc):
+        # e.g. port unreachable while the PlayStation is starting
+        logger.debug("Error while receiving packets from %s: %s" % (self.playstation_ip, exc))
+
+    def _heartbeat(self):
+        if self._transport is None:
+            return
+
+        if self._last_time_data_received > 0 and time.time() - self._last_time_data_received > RECEIVE_TIMEOUT:
+            # Reset package id for new connections
+            self._package_id = 0
+            self._last_time_data_received = 0
+            self.stats = ReceiveStats()
+
+        self._check_connection()
+        self._send_heartbeat()
+        self.heartbeat_scheduler.sent()
+        self._heartbeat_handle = self._loop.call_later(self.heartbeat_scheduler.next_heartbeat_in(), self._heartbeat)
+
+    def _send_heartbeat(self):
+        if self._transport is None:
+            return
+        send_data = self._heartbeat_check_mode.value
+        self._transport.sendto(send_data.encode('utf-8'), (self.playstation_ip, self.send_port))
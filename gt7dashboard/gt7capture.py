@@ -0,0 +1,106 @@
+import struct
+import threading
+import time
+from typing import BinaryIO, Iterator, Tuple
+
+# A capture file starts with the magic, the format version and the heartbeat mode,
+# which is needed to decrypt the packets
+CAPTURE_MAGIC = b"GT7CAP"
+CAPTURE_VERSION = 1
+_HEADER = struct.Struct("<6sBc")
+
+# Every packet is stored as arrival time in seconds since the epoch, its length and the encrypted packet
+_RECORD_HEADER = struct.Struct("<dH")
+
+
+class PacketCaptureWriter:
+    """
+    Appends raw encrypted packets and their arrival time to a capture file.
+    Writing and closing are thread safe, packets written after closing are ignored.
+    """
+
+    def __init__(self, path: str, heartbeat_mode: str):
+        self.path = path
+        self.packets_written = 0
+        self._lock = threading.Lock()
+        self._file: BinaryIO = open(path, "wb")
+        self._file.write(_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, heartbeat_mode.encode("ascii")))
+
+    def write(self, data: bytes, arrival_time: float = None):
+        if arrival_time is None:
+            arrival_time = time.time()
+
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(_RECORD_HEADER.pack(arrival_time, len(data)))
+            self._file.write(data)
+            self.packets_written += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PacketCaptureReader:
+    """Reads the packets of a capture file written by PacketCaptureWriter"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+
+        if len(header) < _HEADER.size:
+            raise ValueError("%s is not a capture file" % path)
+        magic, version, heartbeat_mode = _HEADER.unpack(header)
+        if magic != CAPTURE_MAGIC:
+            raise ValueError("%s is not a capture file" % path)
+        if version != CAPTURE_VERSION:
+            raise ValueError("Capture file version %d of %s is not supported" % (version, path))
+
+        self.heartbeat_mode = heartbeat_mode.decode("ascii")
+
+    def __iter__(self) -> Iterator[Tuple[float, bytes]]:
+        """Yields arrival time and encrypted packet of every packet, a truncated last packet is skipped"""
+        with open(self.path, "rb") as f:
+            f.seek(_HEADER.size)
+            while True:
+                record_header = f.read(_RECORD_HEADER.size)
+                if len(record_header) < _RECORD_HEADER.size:
+                    return
+                arrival_time, length = _RECORD_HEADER.unpack(record_header)
+                data = f.read(length)
+                if len(data) < length:
+                    return
+                yield arrival_time, data
+
+
+def main():
+    import argparse
+    from gt7dashboard.gt7communication import GT7Communication
+
+    parser = argparse.ArgumentParser(description="Replays a capture file and prints the recorded laps")
+    parser.add_argument("path")
+    parser.add_argument("--speed", type=float, help="Multiple of real time, as fast as possible if not set")
+    args = parser.parse_args()
+
+    gt7comm = GT7Communication("127.0.0.1")
+    start = time.perf_counter()
+    gt7comm.replay_capture(args.path, args.speed)
+    duration = time.perf_counter() - start
+
+    for lap in reversed(gt7comm.get_laps()):
+        print(lap.format())
+    print("Replayed %s in %.2f s" % (args.path, duration))
+
+
+if __name__ == "__main__":
+    main()
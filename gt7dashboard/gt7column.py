@@ -0,0 +1,111 @@
+import numpy as np
+
+
+class TelemetryColumn:
+    """
+    A growable column of telemetry values, one value per tick.
+
+    Values are stored unboxed in a NumPy array whose capacity is doubled when it is full,
+    so appending is amortized O(1). Reading behaves like a list, view() and np.asarray()
+    return the values as NumPy array without copying them.
+
+    A frozen column is read-only and can be shared between threads without copying it.
+    Columns wrapping a read-only array are frozen as well.
+    """
+
+    __slots__ = ("_values", "_length")
+
+    # About 17 seconds of telemetry at 60 ticks per second
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, values=None, dtype=None):
+        """
+        :param values: Initial values, arrays are wrapped without copying them
+        :param dtype: Type of the values, defaults to the type of a given array or float64
+        """
+        if values is None:
+            # Capacity is only allocated on the first append, empty laps are created often
+            self._values = np.empty(0, dtype=dtype or np.float64)
+            self._length = 0
+            return
+
+        if dtype is None and not isinstance(values, np.ndarray):
+            dtype = np.float64
+
+        # Since the capacity is exactly the length, the first append
+        # will reallocate and never write into a wrapped array
+        self._values = np.asarray(values, dtype=dtype)
+        self._length = len(self._values)
+
+    def append(self, value):
+        if self._length == len(self._values):
+            self._grow(self._length + 1)
+        self._values[self._length] = value
+        self._length += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._values.dtype)
+        new_length = self._length + len(values)
+        if new_length > len(self._values):
+            self._grow(new_length)
+        self._values[self._length:new_length] = values
+        self._length = new_length
+
+    def freeze(self):
+        """Makes the column read-only, appending or assigning values raises a ValueError afterwards"""
+        self._values.flags.writeable = False
+
+    @property
+    def frozen(self) -> bool:
+        return not self._values.flags.writeable
+
+    def _grow(self, minimum_capacity: int):
+        # Writing into a frozen array raises on its own, only growing has to be prevented
+        if self.frozen:
+            raise ValueError("Telemetry column is frozen")
+        capacity = max(self.INITIAL_CAPACITY, 2 * len(self._values), minimum_capacity)
+        values = np.empty(capacity, dtype=self._values.dtype)
+        values[:self._length] = self._values[:self._length]
+        self._values = values
+
+    def view(self) -> np.ndarray:
+        """Returns the values as NumPy array sharing the memory of this column"""
+        return self._values[:self._length]
+
+    def tolist(self) -> list:
+        return self.view().tolist()
+
+    @property
+    def nbytes(self) -> int:
+        return self._values.nbytes
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is not None and dtype != self._values.dtype:
+            return self.view().astype(dtype)
+        if copy:
+            return self.view().copy()
+        return self.view()
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        return self._values[:self._length][index]
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __eq__(self, other):
+        if isinstance(other, (TelemetryColumn, list, tuple, np.ndarray)):
+            return len(self) == len(other) and bool(np.array_equal(self.view(), np.asarray(other)))
+        return NotImplemented
+
+    # Columns are mutable like lists
+    __hash__ = None
+
+    def __reduce__(self):
+        # Only the used part of the capacity is pickled or copied
+        return self.__class__, (self.view(), self._values.dtype)
+
+    def __repr__(self):
+        return repr(self.tolist())
@@ -5,19 +5,27 @@ import logging
 import math
 import os
 import socket
-import struct
 import time
-import copy
 import traceback
 from datetime import timedelta
-from threading import Thread
-from typing import List
+from threading import Condition, RLock, Thread
+from typing import List, Optional, Tuple
 
 from Crypto.Cipher import Salsa20
 
+from gt7dashboard import gt7events
+from gt7dashboard.gt7capture import PacketCaptureReader, PacketCaptureWriter
+from gt7dashboard.gt7events import EventBus
+from gt7dashboard.gt7heartbeat import HeartbeatScheduler, RECEIVE_TIMEOUT
+from gt7dashboard.gt7stats import ReceiveStats
 from gt7dashboard.gt7helper import seconds_to_lap_time
+from gt7dashboard.gt7packetbuffer import PacketRingBuffer
 from gt7dashboard.gt7lap import Lap
-from gt7dashboard.gt7data import GTData
+from gt7dashboard.gt7lapcollection import LapCollection
+from gt7dashboard.gt7laphistory import LapHistory, DEFAULT_MAX_LAPS_IN_MEMORY, DEFAULT_MAX_BYTES_IN_MEMORY
+from gt7dashboard.gt7data import GTData, LazyGTData, PACKET_MAGIC
+
+logger = logging.getLogger('gt7communication.py')
 
 class HeartbeatCheckMode(Enum):
     A = 'A'
@@ -46,137 +54,240 @@ def get_heartbeat_check_mode_from_environment() -> HeartbeatCheckMode:
     else:
         return HeartbeatCheckMode.A
 
-class GT7Communication(Thread):
+def get_lap_memory_budget_from_environment() -> Tuple[int, int]:
+    max_laps = int(os.environ.get("GT7_MAX_LAPS_IN_MEMORY", DEFAULT_MAX_LAPS_IN_MEMORY))
+    max_megabytes = os.environ.get("GT7_MAX_LAP_MEMORY_MB")
+    max_bytes = int(max_megabytes) * 1024 * 1024 if max_megabytes else DEFAULT_MAX_BYTES_IN_MEMORY
+    return max_laps, max_bytes
+
+# Changes of max speed and min body height are published at most once per this many seconds
+SESSION_EVENT_INTERVAL = 1.0
+
+
+class GT7TelemetryProcessor:
+    """
+    Processes the encrypted packets of the PlayStation into laps and the current session.
+    Subclasses receive the packets and pass them to _process_datagram.
+    """
+
     def __init__(self, playstation_ip):
-        # Thread control
-        Thread.__init__(self)
-        self._shall_run = True
-        self._shall_restart = False
         self._heartbeat_check_mode = get_heartbeat_check_mode_from_environment()
-        # True will always quit with the main process
-        self.daemon = True
 
         # Set lap callback function as none
         self.lap_callback_function = None
+        # Publishes the events of gt7events
+        self.events = EventBus()
+        self._connected = False
+        self._last_session_event_time = 0
 
         self.playstation_ip = playstation_ip
         self.send_port = 33739
         self.receive_port = 33740
         self._last_time_data_received = 0
+        # Arrival time of the packet being processed, the recorded one during replays
+        self._packet_date_time = datetime.datetime.now()
+
+        # State of the packet stream, reset for every connection
+        self._package_id = 0
+        self._previous_lap = -1
+
+        # Writes received packets to a capture file while recording
+        self._capture_writer = None
+
+        # Statistics of the packets of the current connection
+        self.stats = ReceiveStats()
 
         self.current_lap = Lap()
         self.session = Session()
-        self.laps = []
+        # Set the budget of laps kept in memory here, older laps are spilled to disk
+        self.max_laps_in_memory, self.max_bytes_in_memory = get_lap_memory_budget_from_environment()
+        self.laps = self._new_lap_history()
         self.last_data = GTData(None)
+        # Number of processed packets, increased with every new last_data. Waiting threads are notified.
+        self.frame_sequence = 0
+        self._frame_condition = Condition()
+        # Guards current_lap and session, which are changed by the processing and e.g. by 'Log Lap' of the dashboard
+        self._lap_lock = RLock()
 
         # This is used to record race data in any case. This will override the "in_race" flag.
         # When recording data. Useful when recording replays.
         self.always_record_data = False
 
+    def is_receiving(self) -> bool:
+        """Returns True while packets are received from the PlayStation"""
+        return False
 
-    def stop(self):
-        self._shall_run = False
-    def run(self):
-        while self._shall_run:
-            s = None
-            try:
-                self._shall_restart = False
-                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
-                if self.playstation_ip == "255.255.255.255":
-                    s.setsockopt (socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-
-                s.bind(('0.0.0.0', self.receive_port))
-                self._send_hb(s)
-                s.settimeout(10)
-                previous_lap = -1
-                package_id = 0
-                package_nr = 0
-                while not self._shall_restart and self._shall_run:
-                    try:
-                        data, address = s.recvfrom(4096)
-                        package_nr = package_nr + 1
-                        ddata = salsa20_dec(self,data)
-                        if len(ddata) > 0 and struct.unpack('i', ddata[0x70:0x70 + 4])[0] > package_id:
-
-                            self.last_data = GTData(ddata)
-                            self._last_time_data_received = time.time()
-
-                            package_id = struct.unpack('i', ddata[0x70:0x70 + 4])[0]
-
-                            bstlap = struct.unpack('i', ddata[0x78:0x78 + 4])[0]
-                            lstlap = struct.unpack('i', ddata[0x7C:0x7C + 4])[0]
-                            curlap = struct.unpack('h', ddata[0x74:0x74 + 2])[0]
-
-                            if curlap == 0:
-                                self.session.special_packet_time = 0
-
-                            if curlap > 0 and (self.last_data.in_race or self.always_record_data):
-
-                                if curlap != previous_lap:
-                                    # New lap
-                                    previous_lap = curlap
-
-                                    self.session.special_packet_time += lstlap - self.current_lap.lap_ticks * 1000.0 / 60.0
-                                    self.session.best_lap = bstlap
-
-                                    self.finish_lap()
-
-                            else:
-                                curLapTime = 0
-                                # Reset lap
-                                self.current_lap = Lap()
-
-                            self._log_data(self.last_data)
-
-                            if package_nr > 100:
-                                self._send_hb(s)
-                                package_nr = 0
-                    except (OSError, TimeoutError) as e:
-                        # Handler for package exceptions
-                        self._send_hb(s)
-                        package_nr = 0
-                        # Reset package id for new connections
-                        package_id = 0
-
-            except Exception as e:
-                # Handler for general socket exceptions
-                # TODO logging not working
-                print("Error while connecting to %s:%d: %s" % (self.playstation_ip, self.send_port, e))
-                s.close()
-                # Wait before reconnect
-                time.sleep(5)
-
-    def restart(self):
-        self._shall_restart = True
+    def _process_datagram(self, data: bytes, arrival_time: float = None) -> bool:
+        """
+        Decrypts and processes an encrypted packet of the PlayStation, received at arrival_time
+        in seconds since the epoch. Timestamps of data and laps are based on arrival_time.
+        Returns False if the packet was dropped, because it could not be decrypted or is older than the last one.
+        """
+        if arrival_time is None:
+            arrival_time = time.time()
+
+        start = time.perf_counter()
+        ddata = salsa20_dec(self,data)
+        decrypted = time.perf_counter()
+        if len(ddata) == 0:
+            self.stats.add_bad_magic((decrypted - start) * 1000)
+            return False
+
+        # Only decode the fields that are read while processing this packet
+        gt7data = LazyGTData(ddata)
+        if gt7data.package_id <= self._package_id:
+            self.stats.add_out_of_order()
+            return False
+
+        gt7data.date_time = datetime.datetime.fromtimestamp(arrival_time)
+        self._packet_date_time = gt7data.date_time
+        self._last_time_data_received = arrival_time
+        with self._frame_condition:
+            self.last_data = gt7data
+            self.frame_sequence += 1
+            self._frame_condition.notify_all()
+
+        self._package_id = gt7data.package_id
+
+        bstlap = gt7data.best_lap
+        lstlap = gt7data.last_lap
+        curlap = gt7data.current_lap
+
+        finished_lap = None
+        new_lap = False
+        with self._lap_lock:
+            if curlap == 0:
+                self.session.special_packet_time = 0
+
+            if curlap > 0 and (self.last_data.in_race or self.always_record_data):
+
+                if curlap != self._previous_lap:
+                    # New lap
+                    self._previous_lap = curlap
+
+                    self.session.special_packet_time += lstlap - self.current_lap.lap_ticks * 1000.0 / 60.0
+                    self.session.best_lap = bstlap
+
+                    finished_lap = self._finish_current_lap()
+                    new_lap = True
+
+            else:
+                # Reset lap
+                self.current_lap = self._new_lap()
+
+            decoded = time.perf_counter()
+            self._log_data(self.last_data)
+            logged = time.perf_counter()
+
+        # Lap subscribers are called without the lock, so they cannot block manual laps or the processing
+        if new_lap:
+            self._publish_finished_lap(finished_lap)
+            self._publish_session_changed()
+
+        self.stats.add_processed(gt7data.package_id, (decrypted - start) * 1000, (decoded - decrypted) * 1000,
+                                 (logged - decoded) * 1000)
+        return True
+
+    def start_recording(self, path: str):
+        """Appends every received encrypted packet to a capture file, see gt7capture"""
+        self.stop_recording()
+        self._capture_writer = PacketCaptureWriter(path, self._heartbeat_check_mode.value)
+
+    def stop_recording(self):
+        capture_writer = self._capture_writer
+        self._capture_writer = None
+        if capture_writer is not None:
+            capture_writer.close()
+
+    def replay_capture(self, path: str, speed: float = None):
+        """
+        Processes the packets of a capture file, as if they were received at their recorded arrival time.
+        Packets are processed with the timing of their arrival divided by speed,
+        or as fast as possible without speed.
+        Replays need a dedicated instance, which is not started, because they reset the state of the packet stream.
+        """
+        if self.is_receiving():
+            raise RuntimeError("Cannot replay a capture while receiving packets")
+
+        reader = PacketCaptureReader(path)
+        self._heartbeat_check_mode = HeartbeatCheckMode(reader.heartbeat_mode)
+        self._previous_lap = -1
+        self._package_id = 0
+        self.stats = ReceiveStats()
+
+        first_arrival_time = None
+        replay_start = time.perf_counter()
+        for arrival_time, data in reader:
+            if speed:
+                if first_arrival_time is None:
+                    first_arrival_time = arrival_time
+                delay = (arrival_time - first_arrival_time) / speed - (time.perf_counter() - replay_start)
+                if delay > 0:
+                    time.sleep(delay)
+            self.stats.add_arrival(arrival_time)
+            self._process_datagram(data, arrival_time)
+
+    def get_receive_stats(self) -> dict:
+        """Returns the statistics of the packets of the current connection, see ReceiveStats"""
+        return self.stats.to_dict()
 
     def is_connected(self) -> bool:
         return self._last_time_data_received > 0 and (time.time() - self._last_time_data_received) <= 1
 
-    def _send_hb(self, s):
-        send_data = self._heartbeat_check_mode.value
-        s.sendto(send_data.encode('utf-8'), (self.playstation_ip, self.send_port))
+    def _check_connection(self):
+        """Publishes a connection change, has to be called regularly by the receiving subclass"""
+        connected = self.is_connected()
+        if connected != self._connected:
+            self._connected = connected
+            self.events.publish(gt7events.CONNECTION_CHANGED, connected)
+
+    def _publish_session_changed(self, rate_limited=False):
+        now = time.monotonic()
+        if rate_limited and now - self._last_session_event_time < SESSION_EVENT_INTERVAL:
+            return
+        self._last_session_event_time = now
+        self.events.publish(gt7events.SESSION_CHANGED, self.session)
 
-    def get_last_data(self) -> GTData:
-        timeout = time.time() + 5  # 5 seconds timeout
-        while True:
+    def get_last_data(self, timeout: float = 5) -> GTData:
+        """Returns the data of the last packet, waits up to timeout seconds if there is none, returns None then"""
+        with self._frame_condition:
+            self._frame_condition.wait_for(lambda: self.last_data is not None, timeout)
+            return self.last_data
 
-            if self.last_data is not None:
-                return self.last_data
+    def get_last_frame(self) -> Tuple[int, GTData]:
+        """
+        Returns the frame sequence and the data of the last packet without waiting.
+        Compare the sequence with one returned before to tell whether the data is new.
+        """
+        with self._frame_condition:
+            return self.frame_sequence, self.last_data
 
-            if time.time() > timeout:
-                break
+    def wait_for_next_frame(self, after_sequence: int, timeout: float = None) -> Tuple[int, GTData]:
+        """
+        Waits until a packet after the frame sequence after_sequence was processed
+        and returns the frame sequence and the data of the last packet.
+        Returns the current frame after timeout seconds, its sequence is after_sequence then.
+        This blocks, GT7AsyncCommunication should use get_last_frame or events instead.
+        """
+        with self._frame_condition:
+            self._frame_condition.wait_for(lambda: self.frame_sequence > after_sequence, timeout)
+            return self.frame_sequence, self.last_data
 
-    def get_laps(self) -> List[Lap]:
-        return self.laps
+    def get_laps(self) -> LapCollection:
+        """Returns a snapshot of the laps, the most recent lap first"""
+        return self.laps.snapshot()
 
     def load_laps(self, laps: List[Lap], to_last_position = False, to_first_position = False, replace_other_laps = False):
         if to_last_position:
-            self.laps = self.laps + laps
+            self.laps.extend(laps)
         elif to_first_position:
-            self.laps = laps + self.laps
+            self.laps.extend_first(laps)
         elif replace_other_laps:
-            self.laps = laps
+            self.laps = self._new_lap_history(laps)
+        self.events.publish(gt7events.LAPS_CHANGED, self.laps.snapshot())
+
+    def _new_lap_history(self, laps: List[Lap] = ()) -> LapHistory:
+        return LapHistory(laps, max_laps_in_memory=self.max_laps_in_memory, max_bytes_in_memory=self.max_bytes_in_memory)
 
     def _log_data(self, data):
 
@@ -186,11 +297,17 @@ class GT7Communication(Thread):
         if data.is_paused:
             return
 
+        session_changed = False
         if data.ride_height < self.session.min_body_height:
             self.session.min_body_height = data.ride_height
+            session_changed = True
 
         if data.car_speed > self.session.max_speed:
             self.session.max_speed = data.car_speed
+            session_changed = True
+
+        if session_changed:
+            self._publish_session_changed(rate_limited=True)
 
         if data.throttle == 100:
             self.current_lap.full_throttle_ticks += 1
@@ -270,9 +387,16 @@ class GT7Communication(Thread):
 
     def finish_lap(self, manual=False):
         """
-        Finishes a lap with info we only know after crossing the line after each lap
+        Finishes a lap with info we only know after crossing the line after each lap.
+        Can be called from any thread, e.g. for manual laps of the dashboard.
         """
+        with self._lap_lock:
+            finished_lap = self._finish_current_lap(manual)
+        self._publish_finished_lap(finished_lap)
 
+    def _finish_current_lap(self, manual=False) -> Optional[Lap]:
+        """Finishes the current lap while holding the lap lock, returns it if it was added to the laps"""
+        finished_lap = None
         if manual:
             # Manual laps have no time assigned, so take current live time as lap finish time.
             # Finish time is tracked in seconds while live time is tracked in ms
@@ -296,58 +420,212 @@ class GT7Communication(Thread):
         # TODO Proper pythonic name
         self.current_lap.EstimatedTopSpeed = self.last_data.estimated_top_speed
 
-        self.current_lap.lap_end_timestamp = datetime.datetime.now()
+        self.current_lap.lap_end_timestamp = self._packet_date_time
 
         # Race is not in 0th lap, which is before starting the race.
         # We will only persist those laps that have crossed the starting line at least once
         # And those laps which have data for speed logged. This will prevent empty laps.
         # TODO Correct this comment, this is about Laptime not lap numbers
         if self.current_lap.lap_finish_time > 0 and len(self.current_lap.data_speed) > 0:
-            self.laps.insert(0, self.current_lap)
-
-            # Make a copy of this lap and call the callback function if set
-            if self.lap_callback_function:
-                self.lap_callback_function(copy.deepcopy(self.current_lap))
+            # Finished laps do not change anymore, so they are shared with the callback and subscribers without copying
+            self.current_lap.seal()
+            self.laps.prepend(self.current_lap)
+            finished_lap = self.current_lap
 
         # Reset current lap with an empty one
-        self.current_lap = Lap()
+        self.current_lap = self._new_lap()
         self.current_lap.fuel_at_start = self.last_data.current_fuel
+        return finished_lap
+
+    def _publish_finished_lap(self, lap: Optional[Lap]):
+        if lap is None:
+            return
+        if self.lap_callback_function:
+            self.lap_callback_function(lap)
+        self.events.publish(gt7events.LAP_FINISHED, lap)
 
 
+    def _new_lap(self) -> Lap:
+        lap = Lap()
+        lap.lap_start_timestamp = self._packet_date_time
+        return lap
+
     def reset(self):
         """
         Resets the current lap, all stored laps and the current session.
         """
-        self.current_lap = Lap()
-        self.session = Session()
-        self.last_data = GTData(None)
-        self.laps = []
+        with self._lap_lock:
+            self.current_lap = Lap()
+            self.session = Session()
+        with self._frame_condition:
+            self.last_data = GTData(None)
+        # Laps of the old history still shown by the dashboard read their spilled channels from its file
+        self.laps = self._new_lap_history()
+        self.events.publish(gt7events.LAPS_CHANGED, self.laps.snapshot())
+        self._publish_session_changed()
 
     def set_lap_callback(self, new_lap_callback):
         self.lap_callback_function = new_lap_callback
 
-def get_iv(self, iv1):     
-    if(self._heartbeat_check_mode == HeartbeatCheckMode.A):
+
+# Maximum number of packets processed at once, before checking for a new connection
+PROCESSING_BATCH_SIZE = 64
+
+
+class GT7Communication(Thread, GT7TelemetryProcessor):
+    """Receives the packets of the PlayStation on a thread, they are processed on a second thread"""
+
+    def __init__(self, playstation_ip):
+        # Thread control
+        Thread.__init__(self)
+        GT7TelemetryProcessor.__init__(self, playstation_ip)
+        self._shall_run = True
+        self._shall_restart = False
+        # True will always quit with the main process
+        self.daemon = True
+
+        # Received packets waiting to be processed
+        self.packet_buffer = PacketRingBuffer()
+        # Set interval and jitter of the heartbeats here
+        self.heartbeat_scheduler = HeartbeatScheduler()
+        # Increased on new connections and timeouts, the processing thread resets the package id then
+        self._stream_generation = 0
+        self._processing_thread = None
+
+    def is_receiving(self) -> bool:
+        return self.is_alive()
+
+    def stop(self):
+        self._shall_run = False
+
+    def run(self):
+        """
+        Receives packets into the packet buffer, which are processed on a separate thread.
+        This thread does as little as possible per packet, so bursts do not overrun the socket buffer.
+        """
+        self._processing_thread = Thread(target=self._process_packets, name="GT7 packet processing", daemon=True)
+        self._processing_thread.start()
+
+        while self._shall_run:
+            s = None
+            try:
+                self._shall_restart = False
+                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+                if self.playstation_ip == "255.255.255.255":
+                    s.setsockopt (socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+                s.bind(('0.0.0.0', self.receive_port))
+                self._new_connection()
+                self.heartbeat_scheduler.reset()
+                last_packet_time = time.monotonic()
+                while not self._shall_restart and self._shall_run:
+                    if self.heartbeat_scheduler.is_due():
+                        self._send_hb(s)
+                        self.heartbeat_scheduler.sent()
+                    # Wake up for the next heartbeat, even without packets
+                    s.settimeout(max(0.001, self.heartbeat_scheduler.next_heartbeat_in()))
+
+                    try:
+                        arrival_time, data = self.packet_buffer.receive_from(s)
+                    except socket.timeout:
+                        # socket.timeout is an alias of TimeoutError since Python 3.10, but a subclass of OSError before
+                        if time.monotonic() - last_packet_time > RECEIVE_TIMEOUT:
+                            # Reset package id for new connections
+                            self._new_connection()
+                            last_packet_time = time.monotonic()
+                        continue
+                    except OSError as e:
+                        # e.g. port unreachable while the PlayStation is starting, heartbeats continue
+                        logger.debug("Error while receiving packets from %s: %s" % (self.playstation_ip, e))
+                        continue
+
+                    last_packet_time = time.monotonic()
+                    self.heartbeat_scheduler.connected()
+                    self.stats.add_arrival(arrival_time)
+
+                    # Record before processing, so packets dropped by a full packet buffer are captured as well
+                    capture_writer = self._capture_writer
+                    if capture_writer is not None:
+                        capture_writer.write(data, arrival_time)
+
+            except Exception as e:
+                # Handler for general socket exceptions
+                # TODO logging not working
+                print("Error while connecting to %s:%d: %s" % (self.playstation_ip, self.send_port, e))
+                # Wait before reconnect, longer with every failed attempt
+                time.sleep(self.heartbeat_scheduler.connection_failed())
+            finally:
+                if s is not None:
+                    s.close()
+
+    def _new_connection(self):
+        self.stats = ReceiveStats()
+        self._stream_generation += 1
+
+    def get_receive_stats(self) -> dict:
+        stats = GT7TelemetryProcessor.get_receive_stats(self)
+        stats["buffer_overflows"] = self.packet_buffer.overflows
+        stats["buffer_high_watermark"] = self.packet_buffer.high_watermark
+        stats["buffered_packets"] = len(self.packet_buffer)
+        return stats
+
+    def _process_packets(self):
+        processed_generation = self._stream_generation
+        while self._shall_run:
+            batch = self.packet_buffer.get_batch(PROCESSING_BATCH_SIZE, timeout=0.5)
+
+            if processed_generation != self._stream_generation:
+                processed_generation = self._stream_generation
+                self._package_id = 0
+
+            for arrival_time, data in batch:
+                try:
+                    self._process_datagram(data, arrival_time)
+                except Exception as e:
+                    # A failing packet must not stop the processing of the following ones
+                    logger.exception("Error while processing a packet: %s" % e)
+                    self.stats.add_failed()
+            self._check_connection()
+
+    def restart(self):
+        self._shall_restart = True
+
+    def _send_hb(self, s):
+        send_data = self._heartbeat_check_mode.value
+        s.sendto(send_data.encode('utf-8'), (self.playstation_ip, self.send_port))
+
+# Key of the Salsa20 encryption of the telemetry packets, only the first 32 bytes are used
+SALSA20_KEY = b'Simulator Interface Packet GT7 ver 0.0'[0:32]
+
+
+def get_iv_for_heartbeat_check_mode(iv1: int, heartbeat_check_mode: HeartbeatCheckMode) -> int:
+    if heartbeat_check_mode == HeartbeatCheckMode.A:
         iv2 = iv1 ^ 0xDEADBEAF
-    elif (self._heartbeat_check_mode == HeartbeatCheckMode.Tilde):
+    elif heartbeat_check_mode == HeartbeatCheckMode.Tilde:
         iv2 = iv1 ^ 0x55FABB4F
     else:
         iv2 = iv1 ^ 0xDEADBEEF
     return iv2
 
+
+def get_iv(self, iv1):
+    return get_iv_for_heartbeat_check_mode(iv1, self._heartbeat_check_mode)
+
+
+def get_nonce(iv1: int, iv2: int) -> bytes:
+    return iv2.to_bytes(4, 'little') + iv1.to_bytes(4, 'little')
+
+
 # data stream decoding
 def salsa20_dec(self,dat):
-    key = b'Simulator Interface Packet GT7 ver 0.0'
     # Seed IV is always located here
     oiv = dat[0x40:0x44]
     iv1 = int.from_bytes(oiv, byteorder='little')
     iv2 = get_iv(self,iv1)
-    iv = bytearray()
-    iv.extend(iv2.to_bytes(4, 'little'))
-    iv.extend(iv1.to_bytes(4, 'little'))
-    cipher = Salsa20.new(key[0:32], bytes(iv))
+    cipher = Salsa20.new(SALSA20_KEY, get_nonce(iv1, iv2))
     ddata = cipher.decrypt(dat)
     magic = int.from_bytes(ddata[0:4], byteorder='little')
-    if magic != 0x47375330:
+    if magic != PACKET_MAGIC:
         return bytearray(b'')
     return ddata
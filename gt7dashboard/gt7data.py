@@ -2,143 +2,326 @@ from datetime import timedelta
 import datetime
 import json
 import struct
-
-
+from typing import Tuple
+
+
+# Packet sizes of the heartbeat variants 'A', 'B' and '~'
+PACKET_SIZE_A = 0x128
+PACKET_SIZE_B = 0x13C
+PACKET_SIZE_TILDE = 0x158
+
+# Layout of the decrypted packet as (offset, struct format, field name).
+# Bytes in between fields are skipped. Fields that are not stored as is
+# (flags, gears, wheel rotations per second) are converted in GTData.__init__.
+# See https://github.com/Nenkai/PDTools/blob/master/PDTools.SimulatorInterface/SimulatorPacketG7S0.cs
+PACKET_LAYOUT = (
+    (0x04, 'f', 'position_x'),
+    (0x08, 'f', 'position_y'),
+    (0x0C, 'f', 'position_z'),
+    (0x10, 'f', 'velocity_x'),
+    (0x14, 'f', 'velocity_y'),
+    (0x18, 'f', 'velocity_z'),
+    (0x1C, 'f', 'rotation_pitch'),
+    (0x20, 'f', 'rotation_yaw'),
+    (0x24, 'f', 'rotation_roll'),
+    (0x28, 'f', 'rotation_z'),
+    (0x2C, 'f', 'angular_velocity_x'),
+    (0x30, 'f', 'angular_velocity_y'),
+    (0x34, 'f', 'angular_velocity_z'),
+    (0x38, 'f', 'ride_height'),
+    (0x3C, 'f', 'rpm'),
+    # 0x40 is the seed of the IV
+    (0x44, 'f', 'current_fuel'),
+    (0x48, 'f', 'fuel_capacity'),
+    (0x4C, 'f', 'car_speed'),
+    (0x50, 'f', 'boost'),
+    (0x54, 'f', 'oil_pressure'),
+    (0x58, 'f', 'water_temp'),
+    (0x5C, 'f', 'oil_temp'),
+    (0x60, 'f', 'tyre_temp_FL'),
+    (0x64, 'f', 'tyre_temp_FR'),
+    (0x68, 'f', 'tyre_temp_rl'),
+    (0x6C, 'f', 'tyre_temp_rr'),
+    (0x70, 'i', 'package_id'),
+    (0x74, 'h', 'current_lap'),
+    (0x76, 'h', 'total_laps'),
+    (0x78, 'i', 'best_lap'),
+    (0x7C, 'i', 'last_lap'),
+    (0x80, 'i', 'time_on_track'),
+    (0x84, 'h', 'current_position'),
+    (0x86, 'h', 'total_positions'),
+    (0x88, 'H', 'rpm_rev_warning'),
+    (0x8A, 'H', 'rpm_rev_limiter'),
+    (0x8C, 'h', 'estimated_top_speed'),
+    (0x8E, 'B', 'flags'),
+    (0x90, 'B', 'gears'),
+    (0x91, 'B', 'throttle'),
+    (0x92, 'B', 'brake'),
+    (0x94, 'f', 'road_plane_x'),
+    (0x98, 'f', 'road_plane_w'),
+    (0x9C, 'f', 'road_plane_y'),
+    (0xA0, 'f', 'road_plane_z'),
+    (0xA4, 'f', 'wheel_rps_FL'),
+    (0xA8, 'f', 'wheel_rps_FR'),
+    (0xAC, 'f', 'wheel_rps_RL'),
+    (0xB0, 'f', 'wheel_rps_RR'),
+    (0xB4, 'f', 'tyre_diameter_FL'),
+    (0xB8, 'f', 'tyre_diameter_FR'),
+    (0xBC, 'f', 'tyre_diameter_RL'),
+    (0xC0, 'f', 'tyre_diameter_RR'),
+    (0xC4, 'f', 'suspension_fl'),
+    (0xC8, 'f', 'suspension_fr'),
+    (0xCC, 'f', 'suspension_rl'),
+    (0xD0, 'f', 'suspension_rr'),
+    (0xD4, 'f', 'unknown_1'),
+    (0xD8, 'f', 'unknown_2'),
+    (0xDC, 'f', 'unknown_3'),
+    (0xE0, 'f', 'unknown_4'),
+    (0xE4, 'f', 'unknown_5'),
+    (0xE8, 'f', 'unknown_6'),
+    (0xEC, 'f', 'unknown_7'),
+    (0xF0, 'f', 'unknown_8'),
+    (0xF4, 'f', 'clutch'),
+    (0xF8, 'f', 'clutch_engaged'),
+    (0xFC, 'f', 'rpm_after_clutch'),
+    # 0x100 = ??? gear
+    (0x104, 'f', 'gear_1'),
+    (0x108, 'f', 'gear_2'),
+    (0x10C, 'f', 'gear_3'),
+    (0x110, 'f', 'gear_4'),
+    (0x114, 'f', 'gear_5'),
+    (0x118, 'f', 'gear_6'),
+    (0x11C, 'f', 'gear_7'),
+    (0x120, 'f', 'gear_8'),
+    (0x124, 'i', 'car_id'),
+    # Only in packets of heartbeat 'B' and '~'
+    (0x128, 'f', 'wheel_rotation'),
+    (0x12C, 'f', 'filler_float_fb'),
+    (0x130, 'f', 'sway'),
+    (0x134, 'f', 'heave'),
+    (0x138, 'f', 'surge'),
+    # Only in packets of heartbeat '~'
+    (0x13C, 'B', 'filtered_throttle'),
+    (0x13D, 'B', 'filtered_brake'),
+    (0x13E, 'B', 'unknown_9'),
+    (0x13F, 'B', 'unknown_10'),
+    (0x140, 'f', 'unknown_vector_1_1'),
+    (0x144, 'f', 'unknown_vector_1_2'),
+    (0x148, 'f', 'unknown_vector_1_3'),
+    (0x14C, 'f', 'unknown_vector_1_4'),
+    (0x150, 'f', 'energy_recovery'),
+    (0x154, 'f', 'unknown_15'),
+)
+
+
+def _compile_packet_struct(packet_size: int) -> Tuple[struct.Struct, Tuple[str, ...]]:
+    """
+    Compiles the fields of PACKET_LAYOUT that fit into a packet of the given size
+    into a single little endian struct, padding the bytes in between fields.
+    """
+    packet_format = "<"
+    fields = []
+    position = 0
+    for offset, field_format, name in PACKET_LAYOUT:
+        size = struct.calcsize("<" + field_format)
+        if offset + size > packet_size:
+            break
+        if offset > position:
+            packet_format += "%dx" % (offset - position)
+        packet_format += field_format
+        fields.append(name)
+        position = offset + size
+
+    return struct.Struct(packet_format), tuple(fields)
+
+
+# Values of all GTData fields when there is no data or the field is not part of the packet
+_DEFAULTS = {
+    "date_time": None,
+    "package_id": 0,
+    "best_lap": 0,
+    "last_lap": 0,
+    "current_lap": 0,
+    "current_gear": 0,
+    "suggested_gear": 0,
+    "fuel_capacity": .0,
+    "current_fuel": .0,  # fuel
+    "boost": .0,
+    "tyre_diameter_FL": .0,
+    "tyre_diameter_FR": .0,
+    "tyre_diameter_RL": .0,
+    "tyre_diameter_RR": .0,
+    "type_speed_FL": .0,
+    "type_speed_FR": .0,
+    "type_speed_RL": .0,
+    "tyre_speed_RR": .0,
+    "car_speed": .0,
+    "tyre_slip_ratio_FL": .0,
+    "tyre_slip_ratio_FR": .0,
+    "tyre_slip_ratio_RL": .0,
+    "tyre_slip_ratio_RR": .0,
+    "time_on_track": 0,  # time of day on track
+    "total_laps": 0,  # total laps
+    "current_position": 0,  # current position
+    "total_positions": 0,  # total positions
+    "car_id": 0,  # car id
+    "throttle": .0,  # throttle
+    "rpm": .0,  # rpm
+    "rpm_rev_warning": 0,  # rpm rev warning
+    "brake": .0,  # brake
+    "rpm_rev_limiter": 0,  # rpm rev limiter
+    "estimated_top_speed": 0,  # estimated top speed
+    "clutch": .0,  # clutch
+    "clutch_engaged": .0,  # clutch engaged
+    "rpm_after_clutch": .0,  # rpm after clutch
+    "oil_temp": .0,  # oil temp
+    "water_temp": .0,  # water temp
+    "oil_pressure": .0,  # oil pressure
+    "ride_height": .0,  # ride height
+    "tyre_temp_FL": .0,  # tyre temp FL
+    "tyre_temp_FR": .0,  # tyre temp FR
+    "suspension_fl": .0,  # suspension FL
+    "suspension_fr": .0,  # suspension FR
+    "tyre_temp_rl": .0,  # tyre temp RL
+    "tyre_temp_rr": .0,  # tyre temp RR
+    "suspension_rl": .0,  # suspension RL
+    "suspension_rr": .0,  # suspension RR
+    "gear_1": .0,  # 1st gear
+    "gear_2": .0,  # 2nd gear
+    "gear_3": .0,  # 3rd gear
+    "gear_4": .0,  # 4th gear
+    "gear_5": .0,  # 5th gear
+    "gear_6": .0,  # 6th gear
+    "gear_7": .0,  # 7th gear
+    "gear_8": .0,  # 8th gear
+    "position_x": .0,  # pos X
+    "position_y": .0,  # pos Y
+    "position_z": .0,  # pos Z
+    "velocity_x": .0,  # velocity X
+    "velocity_y": .0,  # velocity Y
+    "velocity_z": .0,  # velocity Z
+    "rotation_pitch": .0,  # rot Pitch
+    "rotation_yaw": .0,  # rot Yaw
+    "rotation_roll": .0,  # rot Roll
+    "rotation_z": .0,  # rot Z ???
+    "angular_velocity_x": .0,  # angular velocity X
+    "angular_velocity_y": .0,  # angular velocity Y
+    "angular_velocity_z": .0,  # angular velocity Z
+    "is_paused": False,
+    "in_race": False,
+    "road_plane_x": .0,  # 0x94 = ???
+    "road_plane_w": .0,  # 0x98 = ???
+    "road_plane_y": .0,  # 0x9C = ???
+    "road_plane_z": .0,  # 0xA0 = ???
+    "unknown_1": .0,  # 0xD4 = ???
+    "unknown_2": .0,  # 0xD8 = ???
+    "unknown_3": .0,  # 0xDC = ???
+    "unknown_4": .0,  # 0xE0 = ???
+    "unknown_5": .0,  # 0xE4 = ???
+    "unknown_6": .0,  # 0xE8 = ???
+    "unknown_7": .0,  # 0xEC = ???
+    "unknown_8": .0,
+    "wheel_rotation": .0,
+    "filler_float_fb": .0,
+    "sway": .0,  # sway
+    "heave": .0,  # heave
+    "surge": .0,  # surge
+    "filtered_throttle": 0,  # filtered throttle
+    "filtered_brake": 0,  # filtered brake
+    "brake_abs": 0,  # ABS brake value
+    "unknown_9": 0,
+    "unknown_10": 0,
+    "unknown_vector_1_1": .0,  # 0x140 = ???
+    "unknown_vector_1_2": .0,  # 0x144 = ???
+    "unknown_vector_1_3": .0,  # 0x148 = ???
+    "unknown_vector_1_4": .0,  # 0x14C = ???
+    "energy_recovery": .0,  # energy recovery
+    "unknown_15": .0,  # 0x154 = ???
+}
+
+
+def _get_defaults_of_missing_fields(fields: Tuple[str, ...]) -> Tuple[Tuple[str, object], ...]:
+    return tuple((name, value) for name, value in _DEFAULTS.items() if name not in fields)
+
+
+_PACKET_STRUCTS = []
+for _packet_size in (PACKET_SIZE_TILDE, PACKET_SIZE_B, PACKET_SIZE_A):
+    _packet_struct, _fields = _compile_packet_struct(_packet_size)
+    _PACKET_STRUCTS.append((_packet_size, _packet_struct, _fields, _get_defaults_of_missing_fields(_fields)))
+del _packet_size, _packet_struct, _fields
+
+
+def _get_packet_struct(packet_length: int) -> Tuple[struct.Struct, Tuple[str, ...], Tuple[Tuple[str, object], ...]]:
+    """
+    Returns the struct and its field names for a packet of the given length,
+    together with the defaults of all GTData fields that are not part of this packet.
+    """
+    for packet_size, packet_struct, fields, defaults in _PACKET_STRUCTS:
+        if packet_length >= packet_size:
+            return packet_struct, fields, defaults
+
+    raise ValueError("Packet of %d bytes is too short, expected at least %d bytes" % (packet_length, PACKET_SIZE_A))
+
+
+# Magic number at the start of every decrypted packet, "G7S0"
+PACKET_MAGIC = 0x47375330
+
+
+def encode_packet(values: dict, packet_size: int = PACKET_SIZE_A) -> bytes:
+    """
+    Encodes the raw values of PACKET_LAYOUT fields into a decrypted packet, the inverse of decoding.
+    Values are expected in the units of the packet, e.g. car_speed in m/s and throttle from 0 to 255.
+    Missing fields are 0.
+    """
+    packet_struct, fields, _ = _get_packet_struct(packet_size)
+    data = bytearray(packet_size)
+    packet_struct.pack_into(data, 0, *(values.get(name, 0) for name in fields))
+    struct.pack_into("<i", data, 0x00, PACKET_MAGIC)
+    return bytes(data)
 
 
 class GTData:
-    date_time = None
-    package_id = 0
-    best_lap = 0
-    last_lap = 0
-    current_lap = 0
-    current_gear = 0
-    suggested_gear = 0
-    fuel_capacity = .0
-    current_fuel = .0  # fuel
-    boost = .0
-    tyre_diameter_FL = .0
-    tyre_diameter_FR = .0
-    tyre_diameter_RL = .0
-    tyre_diameter_RR = .0
-    type_speed_FL = .0
-    type_speed_FR =.0
-    type_speed_RL =.0
-    tyre_speed_RR =.0
-    car_speed = .0
-    tyre_slip_ratio_FL =.0
-    tyre_slip_ratio_FR =.0
-    tyre_slip_ratio_RL =.0
-    tyre_slip_ratio_RR =.0
-    time_on_track = 0  # time of day on track
-    total_laps = 0  # total laps
-    current_position = 0  # current position
-    total_positions = 0  # total positions
-    car_id = 0  # car id
-    throttle = .0  # throttle
-    rpm = .0  # rpm
-    rpm_rev_warning = any  # rpm rev warning
-    brake = .0  # brake
-    boost = .0   # boost
-    rpm_rev_limiter = any  # rpm rev limiter
-    estimated_top_speed = 0  # estimated top speed
-    clutch = .0  # clutch
-    clutch_engaged = .0  # clutch engaged
-    rpm_after_clutch = .0  # rpm after clutch
-    oil_temp = .0  # oil temp
-    water_temp = .0  # water temp
-    oil_pressure = .0  # oil pressure
-    ride_height = .0  # ride height
-    tyre_temp_FL = .0  # tyre temp FL
-    tyre_temp_FR = .0  # tyre temp FR
-    suspension_fl = .0  # suspension FL
-    suspension_fr = .0  # suspension FR
-    tyre_temp_rl = .0  # tyre temp RL
-    tyre_temp_rr = .0  # tyre temp RR
-    suspension_rl = .0  # suspension RL
-    suspension_rr = .0  # suspension RR
-    gear_1 = .0  # 1st gear
-    gear_2 = .0  # 2nd gear
-    gear_3 = .0  # 3rd gear
-    gear_4 = .0  # 4th gear
-    gear_5 = .0  # 5th gear
-    gear_6 = .0  # 6th gear
-    gear_7 = .0  # 7th gear
-    gear_8 = .0  # 8th gear
-    position_x = .0  # pos X
-    position_y = .0  # pos Y
-    position_z = .0  # pos Z
-    velocity_x = .0  # velocity X
-    velocity_y = .0  # velocity Y
-    velocity_z = .0  # velocity Z
-    rotation_pitch = .0  # rot Pitch
-    rotation_yaw = .0  # rot Yaw
-    rotation_roll = .0  # rot Roll
-    rotation_z =  .0	# rot Z ???
-    angular_velocity_x = .0  # angular velocity X
-    angular_velocity_y = .0  # angular velocity Y
-    angular_velocity_z = .0  # angular velocity Z
-    is_paused = False
-    in_race = False
-    road_plane_x = .0			# 0x94 = ???
-    road_plane_w = .0			# 0x98 = ???
-    road_plane_y = .0			# 0x9C = ???
-    road_plane_z = .0			# 0xA0 = ???
-    unknown_1 = .0			# 0xD4 = ???
-    unknown_2 =  .0			# 0xD8 = ???
-    unknown_3 =  .0			# 0xDC = ???
-    unknown_4 = .0			# 0xE0 = ???
-    unknown_5 =  .0			# 0xE4 = ???
-    unknown_6 =  .0			# 0xE8 = ???
-    unknown_7 =  .0			# 0xEC = ???
-    unknown_8 =  .0	
-    wheel_rotation =  .0
-    filler_float_fb = .0
-    sway = .0  # sway
-    heave = .0  # heave
-    surge = .0  # surge
-    filtered_throttle = 0  # filtered throttle
-    filtered_brake = 0  # filtered brake
-    brake_abs = 0  # ABS brake value
-    unknown_9 = 0  
-    unknown_10 = 0
-    unknown_vector_1_1 = .0  # 0x140 = ???
-    unknown_vector_1_2 = .0  # 0x144 = ???
-    unknown_vector_1_3 = .0  # 0x148 = ???
-    unknown_vector_1_4 = .0 # 0x14C = ???
-    energy_recovery = .0  # energy recovery
-    unknown_15 = .0  # 0x154 = ???
+    __slots__ = tuple(_DEFAULTS)
 
     def get_attributes():
-        members = [attr for attr in dir(GTData) if not callable(getattr(GTData, attr)) and not attr.startswith("__")]
-        return members   
+        return sorted(GTData.__slots__)
+
 
     def __init__(self, ddata):
         if not ddata:
+            for name, value in _DEFAULTS.items():
+                setattr(self, name, value)
             return
 
+        # Decode all fields of the packet with a single call instead of slicing every field
+        packet_struct, fields, defaults = _get_packet_struct(len(ddata))
+        values = dict(zip(fields, packet_struct.unpack_from(ddata)))
+
+        for name, value in defaults:
+            setattr(self, name, value)
+
         self.date_time = datetime.datetime.now()
-        self.package_id = struct.unpack('i', ddata[0x70:0x70 + 4])[0]
-        self.best_lap = struct.unpack('i', ddata[0x78:0x78 + 4])[0]
-        self.last_lap = struct.unpack('i', ddata[0x7C:0x7C + 4])[0]
-        self.current_lap = struct.unpack('h', ddata[0x74:0x74 + 2])[0]
-        self.current_gear = struct.unpack('B', ddata[0x90:0x90 + 1])[0] & 0b00001111
-        self.suggested_gear = struct.unpack('B', ddata[0x90:0x90 + 1])[0] >> 4
-        self.fuel_capacity = struct.unpack('f', ddata[0x48:0x48 + 4])[0]
-        self.current_fuel = struct.unpack('f', ddata[0x44:0x44 + 4])[0]  # fuel
-        self.boost = struct.unpack('f', ddata[0x50:0x50 + 4])[0] - 1
-
-        self.tyre_diameter_FL = struct.unpack('f', ddata[0xB4:0xB4 + 4])[0]
-        self.tyre_diameter_FR = struct.unpack('f', ddata[0xB8:0xB8 + 4])[0]
-        self.tyre_diameter_RL = struct.unpack('f', ddata[0xBC:0xBC + 4])[0]
-        self.tyre_diameter_RR = struct.unpack('f', ddata[0xC0:0xC0 + 4])[0]
-
-        self.type_speed_FL = abs(3.6 * self.tyre_diameter_FL * struct.unpack('f', ddata[0xA4:0xA4 + 4])[0])
-        self.type_speed_FR = abs(3.6 * self.tyre_diameter_FR * struct.unpack('f', ddata[0xA8:0xA8 + 4])[0])
-        self.type_speed_RL = abs(3.6 * self.tyre_diameter_RL * struct.unpack('f', ddata[0xAC:0xAC + 4])[0])
-        self.tyre_speed_RR = abs(3.6 * self.tyre_diameter_RR * struct.unpack('f', ddata[0xB0:0xB0 + 4])[0])
-
-        self.car_speed = 3.6 * struct.unpack('f', ddata[0x4C:0x4C + 4])[0]
+
+        flags = values.pop("flags")
+        gears = values.pop("gears")
+        wheel_rps_fl = values.pop("wheel_rps_FL")
+        wheel_rps_fr = values.pop("wheel_rps_FR")
+        wheel_rps_rl = values.pop("wheel_rps_RL")
+        wheel_rps_rr = values.pop("wheel_rps_RR")
+
+        for name, value in values.items():
+            setattr(self, name, value)
+
+        self.current_gear = gears & 0b00001111
+        self.suggested_gear = gears >> 4
+        self.boost = self.boost - 1
+
+        self.type_speed_FL = abs(3.6 * self.tyre_diameter_FL * wheel_rps_fl)
+        self.type_speed_FR = abs(3.6 * self.tyre_diameter_FR * wheel_rps_fr)
+        self.type_speed_RL = abs(3.6 * self.tyre_diameter_RL * wheel_rps_rl)
+        self.tyre_speed_RR = abs(3.6 * self.tyre_diameter_RR * wheel_rps_rr)
+
+        self.car_speed = 3.6 * self.car_speed
 
         if self.car_speed > 0:
             self.tyre_slip_ratio_FL = '{:6.2f}'.format(self.type_speed_FL / self.car_speed)
@@ -146,119 +329,153 @@ class GTData:
             self.tyre_slip_ratio_RL = '{:6.2f}'.format(self.type_speed_RL / self.car_speed)
             self.tyre_slip_ratio_RR = '{:6.2f}'.format(self.tyre_speed_RR / self.car_speed)
 
+        self.time_on_track = timedelta(seconds=round(self.time_on_track / 1000))  # time of day on track
 
-        self.time_on_track = timedelta(
-            seconds=round(struct.unpack('i', ddata[0x80:0x80 + 4])[0] / 1000))  # time of day on track
+        self.throttle = self.throttle / 2.55  # throttle
+        self.brake = self.brake / 2.55  # brake
+        self.ride_height = 1000 * self.ride_height  # ride height
 
-        self.total_laps = struct.unpack('h', ddata[0x76:0x76 + 2])[0]  # total laps
+        self.is_paused = bool(flags & 0b00000010)
+        self.in_race = bool(flags & 0b00000001)
 
-        self.current_position = struct.unpack('h', ddata[0x84:0x84 + 2])[0]  # current position
-        self.total_positions = struct.unpack('h', ddata[0x86:0x86 + 2])[0]  # total positions
+        if len(ddata) >= PACKET_SIZE_B:
+            self.wheel_rotation = self.wheel_rotation * 180 / 3.141592653589793  # convert to degrees
+        if len(ddata) >= PACKET_SIZE_TILDE:
+            self.filtered_throttle = self.filtered_throttle / 2.55  # filtered throttle
+            self.filtered_brake = self.filtered_brake / 2.55  # filtered brake
+            self.brake_abs = 0 if self.brake == self.filtered_brake else (self.brake - self.filtered_brake ) / (100 - self.filtered_brake) * 100
 
-        self.car_id = struct.unpack('i', ddata[0x124:0x124 + 4])[0]  # car id
+    def materialize(self) -> "GTData":
+        """Returns a GTData with all fields decoded, which is the object itself"""
+        return self
 
-        self.throttle = struct.unpack('B', ddata[0x91:0x91 + 1])[0] / 2.55  # throttle
-        self.rpm = struct.unpack('f', ddata[0x3C:0x3C + 4])[0]  # rpm
-        self.rpm_rev_warning = struct.unpack('H', ddata[0x88:0x88 + 2])[0]  # rpm rev warning
+    def to_json(self):
+        return json.dumps(self, indent=4, sort_keys=True, default=str)
 
-        self.brake = struct.unpack('B', ddata[0x92:0x92 + 1])[0] / 2.55  # brake
 
-        self.boost = struct.unpack('f', ddata[0x50:0x50 + 4])[0] - 1  # boost
+class _LazyField:
+    """
+    Decodes a single field of a LazyGTData on first access.
+    The decoded value is stored in the instance __dict__, which takes precedence
+    over this descriptor on every following access.
+    """
 
-        self.rpm_rev_limiter = struct.unpack('H', ddata[0x8A:0x8A + 2])[0]  # rpm rev limiter
+    def __init__(self, decode, packet_size=PACKET_SIZE_A):
+        self.decode = decode
+        self.packet_size = packet_size
+        self.name = None
 
-        self.estimated_top_speed = struct.unpack('h', ddata[0x8C:0x8C + 2])[0]  # estimated top speed
+    def __set_name__(self, owner, name):
+        self.name = name
 
-        self.clutch = struct.unpack('f', ddata[0xF4:0xF4 + 4])[0]  # clutch
-        self.clutch_engaged = struct.unpack('f', ddata[0xF8:0xF8 + 4])[0]  # clutch engaged
-        self.rpm_after_clutch = struct.unpack('f', ddata[0xFC:0xFC + 4])[0]  # rpm after clutch
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
 
-        self.oil_temp = struct.unpack('f', ddata[0x5C:0x5C + 4])[0]  # oil temp
-        self.water_temp = struct.unpack('f', ddata[0x58:0x58 + 4])[0]  # water temp
+        if len(instance._buffer) >= self.packet_size:
+            value = self.decode(instance)
+        else:
+            # Field is not part of this packet variant
+            value = _DEFAULTS[self.name]
 
-        self.oil_pressure = struct.unpack('f', ddata[0x54:0x54 + 4])[0]  # oil pressure
-        self.ride_height = 1000 * struct.unpack('f', ddata[0x38:0x38 + 4])[0]  # ride height
+        instance.__dict__[self.name] = value
+        return value
 
-        self.tyre_temp_FL = struct.unpack('f', ddata[0x60:0x60 + 4])[0]  # tyre temp FL
-        self.tyre_temp_FR = struct.unpack('f', ddata[0x64:0x64 + 4])[0]  # tyre temp FR
 
-        self.suspension_fl = struct.unpack('f', ddata[0xC4:0xC4 + 4])[0]  # suspension FL
-        self.suspension_fr = struct.unpack('f', ddata[0xC8:0xC8 + 4])[0]  # suspension FR
+def _get_packet_size_for_field(offset: int, field_format: str) -> int:
+    end = offset + struct.calcsize("<" + field_format)
+    for packet_size in (PACKET_SIZE_A, PACKET_SIZE_B, PACKET_SIZE_TILDE):
+        if end <= packet_size:
+            return packet_size
 
-        self.tyre_temp_rl = struct.unpack('f', ddata[0x68:0x68 + 4])[0]  # tyre temp RL
-        self.tyre_temp_rr = struct.unpack('f', ddata[0x6C:0x6C + 4])[0]  # tyre temp RR
+    raise ValueError("Field at offset 0x%X is not part of any packet" % offset)
 
-        self.suspension_rl = struct.unpack('f', ddata[0xCC:0xCC + 4])[0]  # suspension RL
-        self.suspension_rr = struct.unpack('f', ddata[0xD0:0xD0 + 4])[0]  # suspension RR
 
-        self.gear_1 = struct.unpack('f', ddata[0x104:0x104 + 4])[0]  # 1st gear
-        self.gear_2 = struct.unpack('f', ddata[0x108:0x108 + 4])[0]  # 2nd gear
-        self.gear_3 = struct.unpack('f', ddata[0x10C:0x10C + 4])[0]  # 3rd gear
-        self.gear_4 = struct.unpack('f', ddata[0x110:0x110 + 4])[0]  # 4th gear
-        self.gear_5 = struct.unpack('f', ddata[0x114:0x114 + 4])[0]  # 5th gear
-        self.gear_6 = struct.unpack('f', ddata[0x118:0x118 + 4])[0]  # 6th gear
-        self.gear_7 = struct.unpack('f', ddata[0x11C:0x11C + 4])[0]  # 7th gear
-        self.gear_8 = struct.unpack('f', ddata[0x120:0x120 + 4])[0]  # 8th gear
+_PACKET_LAYOUT_BY_NAME = {name: (offset, field_format) for offset, field_format, name in PACKET_LAYOUT}
 
-        # self.struct.unpack('f', ddata[0x100:0x100+4])[0]					# ??? gear
 
-        self.position_x = struct.unpack('f', ddata[0x04:0x04 + 4])[0]  # pos X
-        self.position_y = struct.unpack('f', ddata[0x08:0x08 + 4])[0]  # pos Y
-        self.position_z = struct.unpack('f', ddata[0x0C:0x0C + 4])[0]  # pos Z
+def _raw_field(name: str, convert=None) -> _LazyField:
+    """Returns a _LazyField that is read as is from the packet layout, optionally converted"""
+    offset, field_format = _PACKET_LAYOUT_BY_NAME[name]
+    unpack_from = struct.Struct("<" + field_format).unpack_from
+    packet_size = _get_packet_size_for_field(offset, field_format)
 
-        self.velocity_x = struct.unpack('f', ddata[0x10:0x10 + 4])[0]  # velocity X
-        self.velocity_y = struct.unpack('f', ddata[0x14:0x14 + 4])[0]  # velocity Y
-        self.velocity_z = struct.unpack('f', ddata[0x18:0x18 + 4])[0]  # velocity Z
+    if convert is None:
+        return _LazyField(lambda data: unpack_from(data._buffer, offset)[0], packet_size)
 
-        self.rotation_pitch = struct.unpack('f', ddata[0x1C:0x1C + 4])[0]  # rot Pitch
-        self.rotation_yaw = struct.unpack('f', ddata[0x20:0x20 + 4])[0]  # rot Yaw
-        self.rotation_roll = struct.unpack('f', ddata[0x24:0x24 + 4])[0]  # rot Roll
-        self.rotation_z =  struct.unpack('f', ddata[0x28:0x28+4])[0]	# rot Z ???
+    return _LazyField(lambda data: convert(unpack_from(data._buffer, offset)[0]), packet_size)
 
-        self.angular_velocity_x = struct.unpack('f', ddata[0x2C:0x2C + 4])[0]  # angular velocity X
-        self.angular_velocity_y = struct.unpack('f', ddata[0x30:0x30 + 4])[0]  # angular velocity Y
-        self.angular_velocity_z = struct.unpack('f', ddata[0x34:0x34 + 4])[0]  # angular velocity Z
 
-        self.is_paused = bin(struct.unpack('B', ddata[0x8E:0x8E + 1])[0])[-2] == '1'
-        self.in_race = bin(struct.unpack('B', ddata[0x8E:0x8E + 1])[0])[-1] == '1'
+def _tyre_speed_field(tyre_diameter: str, wheel_rps: str) -> _LazyField:
+    unpack_wheel_rps = _raw_field(wheel_rps).decode
+    return _LazyField(lambda data: abs(3.6 * getattr(data, tyre_diameter) * unpack_wheel_rps(data)))
 
-        
-        # bin(struct.unpack('B', ddata[0x8E:0x8E+1])[0])[2:]	# various flags (see https://github.com/Nenkai/PDTools/blob/master/PDTools.SimulatorInterface/SimulatorPacketG7S0.cs)
-        # bin(struct.unpack('B', ddata[0x8F:0x8F+1])[0])[2:]	# various flags (see https://github.com/Nenkai/PDTools/blob/master/PDTools.SimulatorInterface/SimulatorPacketG7S0.cs)
-        # bin(struct.unpack('B', ddata[0x93:0x93+1])[0])[2:]	# 0x93 = ???
 
-        self.road_plane_x = struct.unpack('f', ddata[0x94:0x94+4])[0]			# 0x94 = ???
-        self.road_plane_w = struct.unpack('f', ddata[0x98:0x98+4])[0]			# 0x98 = ???
-        self.road_plane_y = struct.unpack('f', ddata[0x9C:0x9C+4])[0]			# 0x9C = ???
-        self.road_plane_z = struct.unpack('f', ddata[0xA0:0xA0+4])[0]			# 0xA0 = ???
+def _tyre_slip_ratio_field(tyre_speed: str) -> _LazyField:
+    def decode(data):
+        if data.car_speed > 0:
+            return '{:6.2f}'.format(getattr(data, tyre_speed) / data.car_speed)
+        return .0
 
-        self.unknown_1 = struct.unpack('f', ddata[0xD4:0xD4+4])[0]			# 0xD4 = ???
-        self.unknown_2 =  struct.unpack('f', ddata[0xD8:0xD8+4])[0]			# 0xD8 = ???
-        self.unknown_3 =  struct.unpack('f', ddata[0xDC:0xDC+4])[0]			# 0xDC = ???
-        self.unknown_4 = struct.unpack('f', ddata[0xE0:0xE0+4])[0]			# 0xE0 = ???
+    return _LazyField(decode)
+
+
+def _decode_brake_abs(data) -> float:
+    if data.brake == data.filtered_brake:
+        return 0
+    return (data.brake - data.filtered_brake) / (100 - data.filtered_brake) * 100
+
+
+class LazyGTData:
+    """
+    A variant of GTData that keeps a reference to the decrypted packet and only decodes
+    the fields that are actually read. Use materialize() to get a fully decoded GTData.
+    """
+
+    # Decoded fields are cached in __dict__
+    __slots__ = ("_buffer", "date_time", "__dict__")
+
+    current_gear = _raw_field("gears", lambda gears: gears & 0b00001111)
+    suggested_gear = _raw_field("gears", lambda gears: gears >> 4)
+    boost = _raw_field("boost", lambda boost: boost - 1)
+    car_speed = _raw_field("car_speed", lambda car_speed: 3.6 * car_speed)
+    time_on_track = _raw_field("time_on_track", lambda time_on_track: timedelta(seconds=round(time_on_track / 1000)))
+    throttle = _raw_field("throttle", lambda throttle: throttle / 2.55)
+    brake = _raw_field("brake", lambda brake: brake / 2.55)
+    ride_height = _raw_field("ride_height", lambda ride_height: 1000 * ride_height)
+    is_paused = _raw_field("flags", lambda flags: bool(flags & 0b00000010))
+    in_race = _raw_field("flags", lambda flags: bool(flags & 0b00000001))
+    wheel_rotation = _raw_field("wheel_rotation", lambda wheel_rotation: wheel_rotation * 180 / 3.141592653589793)
+    filtered_throttle = _raw_field("filtered_throttle", lambda filtered_throttle: filtered_throttle / 2.55)
+    filtered_brake = _raw_field("filtered_brake", lambda filtered_brake: filtered_brake / 2.55)
+
+    type_speed_FL = _tyre_speed_field("tyre_diameter_FL", "wheel_rps_FL")
+    type_speed_FR = _tyre_speed_field("tyre_diameter_FR", "wheel_rps_FR")
+    type_speed_RL = _tyre_speed_field("tyre_diameter_RL", "wheel_rps_RL")
+    tyre_speed_RR = _tyre_speed_field("tyre_diameter_RR", "wheel_rps_RR")
+    tyre_slip_ratio_FL = _tyre_slip_ratio_field("type_speed_FL")
+    tyre_slip_ratio_FR = _tyre_slip_ratio_field("type_speed_FR")
+    tyre_slip_ratio_RL = _tyre_slip_ratio_field("type_speed_RL")
+    tyre_slip_ratio_RR = _tyre_slip_ratio_field("tyre_speed_RR")
+    brake_abs = _LazyField(_decode_brake_abs, PACKET_SIZE_TILDE)
+
+    def __init__(self, ddata):
+        self._buffer = ddata
+        self.date_time = datetime.datetime.now()
+
+    def materialize(self) -> GTData:
+        data = GTData(self._buffer)
+        data.date_time = self.date_time
+        return data
 
-        self.unknown_5 =  struct.unpack('f', ddata[0xE4:0xE4+4])[0]			# 0xE4 = ???
-        self.unknown_6 =  struct.unpack('f', ddata[0xE8:0xE8+4])[0]			# 0xE8 = ???
-        self.unknown_7 =  struct.unpack('f', ddata[0xEC:0xEC+4])[0]			# 0xEC = ???
-        self.unknown_8 =  struct.unpack('f', ddata[0xF0:0xF0+4])[0]	
-        if len(ddata) >= 0x13C:
-            self.wheel_rotation =  struct.unpack('f', ddata[0x128:0x128+4])[0] * 180 / 3.141592653589793  # convert to degrees
-            self.filler_float_fb = struct.unpack('f', ddata[0x12C:0x12C+4])[0]
-            self.sway = struct.unpack('f', ddata[0x130:0x130+4])[0]  # sway
-            self.heave = struct.unpack('f', ddata[0x134:0x134+4])[0]  # heave
-            self.surge = struct.unpack('f', ddata[0x138:0x138+4])[0]  # surge
-        if len(ddata) >= 0x158:
-            self.filtered_throttle = struct.unpack('B', ddata[0x13C:0x13C+1])[0] / 2.55  # filtered throttle
-            self.filtered_brake = struct.unpack('B', ddata[0x13D:0x13D+1])[0] / 2.55  # filtered brake
-            self.unknown_9 = struct.unpack('B', ddata[0x13E:0x13E+1])[0]  
-            self.unknown_10 = struct.unpack('B', ddata[0x13F:0x13F+1])[0]
-            self.unknown_vector_1_1 = struct.unpack('f', ddata[0x140:0x140+4])[0]  # 0x140 = ???
-            self.unknown_vector_1_2 = struct.unpack('f', ddata[0x144:0x144+4])[0]  # 0x144 = ???
-            self.unknown_vector_1_3 = struct.unpack('f', ddata[0x148:0x148+4])[0]  # 0x148 = ???
-            self.unknown_vector_1_4 = struct.unpack('f', ddata[0x14C:0x14C+4])[0] # 0x14C = ???
-            self.energy_recovery = struct.unpack('f', ddata[0x150:0x150+4])[0]  # energy recovery
-            self.unknown_15 = struct.unpack('f', ddata[0x154:0x154+4])[0]  # 0x154 = ???
-            self.brake_abs = 0 if self.brake == self.filtered_brake else (self.brake - self.filtered_brake ) / (100 - self.filtered_brake) * 100
-            
     def to_json(self):
-        return json.dumps(self, indent=4, sort_keys=True, default=str)
\ No newline at end of file
+        return self.materialize().to_json()
+
+
+# All other fields of the layout are stored as is
+for _name in GTData.get_attributes():
+    if _name in _PACKET_LAYOUT_BY_NAME and _name not in vars(LazyGTData):
+        _field = _raw_field(_name)
+        _field.__set_name__(LazyGTData, _name)
+        setattr(LazyGTData, _name, _field)
+del _name, _field
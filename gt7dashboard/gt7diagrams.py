@@ -9,7 +9,7 @@ from bokeh.models import ColumnDataSource, Label, Column, Line, TableColumn, Dat
 from bokeh.plotting import figure
 from bokeh.palettes import Dark2_5 as palette
 
-from gt7dashboard import gt7helper
+from gt7dashboard import gt7helper, gt7stats
 from gt7dashboard.gt7data import GTData
 from gt7dashboard.gt7lap import Lap
 from bokeh.models import MultiChoice
@@ -137,9 +137,24 @@ class DebugTable(object):
     def update_debug_data(self, debug_data: GTData):
         if debug_data is None:
             return
-        new_values = gt7helper.pd_data_frame_from_debug_data(debug_data)
+        new_values = gt7helper.pd_data_frame_from_debug_data(debug_data.materialize())
         self.t_debug_table.source.data = ColumnDataSource.from_df(new_values)
 
+class ReceiveStatsTable(object):
+    def __init__(self):
+        self.columns = [TableColumn(field="name", title="Name"), TableColumn(field="value", title="Value")]
+        self.t_receive_stats_table = DataTable(
+            source=ColumnDataSource(data={"name": [], "value": []}),
+            columns=self.columns
+        )
+
+    def update_receive_stats(self, stats: dict):
+        rows = gt7stats.flatten_stats(stats)
+        self.t_receive_stats_table.source.data = {
+            "name": [name for name, _ in rows],
+            "value": [value for _, value in rows],
+        }
+
 class RaceTimeTable(object):
 
     def __init__(self):
@@ -159,25 +174,64 @@ class RaceTimeTable(object):
         ]
 
         self.lap_times_source = ColumnDataSource(
-            gt7helper.pd_data_frame_from_lap([], best_lap_time=0)
+            data={field: [] for field in gt7helper.LAP_TABLE_FIELDS}
         )
         self.t_lap_times: DataTable
 
         self.t_lap_times = DataTable(
-            source=self.lap_times_source, columns=self.columns, index_position=None, css_classes=["lap_times_table"]
+            source=self.lap_times_source, columns=self.columns, index_position=None, css_classes=["lap_times_table"],
+            scroll_to_selection=True,
         )
         # This will lead to not being rendered
         # self.t_lap_times.autosize_mode = "fit_columns"
         # Maybe this is related: https://github.com/bokeh/bokeh/issues/10512 ?
 
+        # Laps in the order of the table rows, oldest lap first, so new laps can be streamed
+        self.laps: List[Lap] = []
+        self.best_lap_time = 0
 
     def show_laps(self, laps: List[Lap]):
+        """
+        Shows the laps, given the newest lap first as in the session, in chronological order with
+        the latest lap at the bottom of the table. Laps added since the last call are streamed
+        as new rows and if the best lap changed only the diff column is patched, the data of
+        the source is only replaced if the laps do not continue the shown laps, e.g. after a reset.
+        """
         best_lap = gt7helper.get_best_lap(laps)
         if best_lap == None:
             return
 
-        new_df = gt7helper.pd_data_frame_from_lap(laps, best_lap_time=best_lap.lap_finish_time)
-        self.lap_times_source.data = ColumnDataSource.from_df(new_df)
+        best_lap_time = best_lap.lap_finish_time
+        if not self._continues_shown_laps(laps):
+            self.laps = list(reversed(laps))
+            self.best_lap_time = best_lap_time
+            new_df = gt7helper.pd_data_frame_from_lap(self.laps, best_lap_time=best_lap_time)
+            self.lap_times_source.data = {field: new_df[field].tolist() for field in gt7helper.LAP_TABLE_FIELDS}
+            return
+
+        if best_lap_time != self.best_lap_time:
+            self.best_lap_time = best_lap_time
+            diffs = [gt7helper.get_lap_time_diff(lap, best_lap_time) for lap in self.laps]
+            if len(diffs) > 0:
+                self.lap_times_source.patch({"diff": [(slice(0, len(diffs)), diffs)]})
+
+        new_laps = list(reversed(laps[:len(laps) - len(self.laps)]))
+        if len(new_laps) == 0:
+            return
+
+        rows = [gt7helper.get_lap_table_row(lap, best_lap_time) for lap in new_laps]
+        self.lap_times_source.stream({field: [row[field] for row in rows] for field in gt7helper.LAP_TABLE_FIELDS})
+        self.laps.extend(new_laps)
+
+    def _continues_shown_laps(self, laps: List[Lap]) -> bool:
+        # Laps of a session are only ever added in front, so comparing the ends is sufficient
+        shown = len(self.laps)
+        if shown == 0 or len(laps) < shown:
+            return False
+        return laps[-1] is self.laps[0] and laps[len(laps) - shown] is self.laps[-1]
+
+    def get_lap(self, row_index: int) -> Lap:
+        return self.laps[row_index]
 
 class RaceDiagram(object):
     def __init__(self, width=400):
@@ -546,7 +600,6 @@ class RaceDiagram(object):
         self.sources_additional_laps.append(source)
 
     def update_fastest_laps_variance(self, laps):
-        # FIXME, many many data points, mayabe reduce by the amount of laps?
         variance, fastest_laps = gt7helper.get_variance_for_fastest_laps(laps)
         self.source_speed_variance.data = variance
         return fastest_laps
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import threading
+from functools import partial
+from typing import Any, Callable
+
+logger = logging.getLogger('gt7events.py')
+
+# A lap was finished and added to the laps, the lap is passed
+LAP_FINISHED = "lap_finished"
+# The laps were replaced, e.g. by loading laps or a reset, the laps are passed
+LAPS_CHANGED = "laps_changed"
+# Best lap, max speed or min body height of the session changed, the session is passed
+SESSION_CHANGED = "session_changed"
+# The connection to the PlayStation was established or lost, True if connected is passed
+CONNECTION_CHANGED = "connection_changed"
+
+
+class EventBus:
+    """
+    Delivers events of the telemetry processing to subscribers.
+
+    Callbacks are called on the thread publishing the event, use subscribe_document
+    to run them on the event loop of a Bokeh document instead, or await wait_for.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, event: str, callback: Callable[[Any], None]) -> Callable[[], None]:
+        """Calls callback with the payload of every event, returns a function that unsubscribes"""
+        with self._lock:
+            # Copy on write, so publishing does not need the lock
+            self._subscribers[event] = self._subscribers.get(event, ()) + (callback,)
+        return partial(self.unsubscribe, event, callback)
+
+    def unsubscribe(self, event: str, callback: Callable[[Any], None]):
+        with self._lock:
+            callbacks = list(self._subscribers.get(event, ()))
+            if callback in callbacks:
+                callbacks.remove(callback)
+            self._subscribers[event] = tuple(callbacks)
+
+    def publish(self, event: str, payload: Any = None):
+        for callback in self._subscribers.get(event, ()):
+            try:
+                callback(payload)
+            except Exception as e:
+                # A failing subscriber must not stop the telemetry processing
+                logger.exception("Error in subscriber of %s: %s" % (event, e))
+
+    def subscribe_document(self, doc, event: str, callback: Callable[[Any], None]) -> Callable[[], None]:
+        """
+        Calls callback with the payload of every event on the next tick of a Bokeh document,
+        where changing models is safe. Unsubscribes when the session of the document is destroyed.
+        """
+        def on_event(payload):
+            doc.add_next_tick_callback(partial(callback, payload))
+
+        unsubscribe = self.subscribe(event, on_event)
+        doc.on_session_destroyed(lambda session_context: unsubscribe())
+        return unsubscribe
+
+    async def wait_for(self, event: str, timeout: float = None) -> Any:
+        """Waits for the next event and returns its payload, raises asyncio.TimeoutError after timeout seconds"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def on_event(payload):
+            loop.call_soon_threadsafe(_set_result_if_pending, future, payload)
+
+        unsubscribe = self.subscribe(event, on_event)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            unsubscribe()
+
+
+def _set_result_if_pending(future: asyncio.Future, result: Any):
+    if not future.done():
+        future.set_result(result)
@@ -0,0 +1,54 @@
+import random
+import time
+from typing import Callable
+
+# Seconds between heartbeats, the game stops sending packets without a heartbeat for about 10 seconds
+HEARTBEAT_INTERVAL = 1.0
+# Heartbeats are sent up to this many seconds earlier or later, so several dashboards do not send at once
+HEARTBEAT_JITTER = 0.1
+
+# Seconds without packets after which the packet stream is considered a new connection
+RECEIVE_TIMEOUT = 10
+
+# Seconds to wait before reconnecting after an error, doubled with every failed attempt
+RECONNECT_BACKOFF_MIN = 0.25
+RECONNECT_BACKOFF_MAX = 5.0
+
+
+class HeartbeatScheduler:
+    """
+    Decides when to send the next heartbeat and how long to wait before reconnecting,
+    based on a monotonic clock instead of the number of received packets.
+    """
+
+    def __init__(self, interval: float = HEARTBEAT_INTERVAL, jitter: float = HEARTBEAT_JITTER,
+                 clock: Callable[[], float] = time.monotonic):
+        self.interval = interval
+        self.jitter = jitter
+        self._clock = clock
+        self._next_heartbeat = clock()
+        self._backoff = RECONNECT_BACKOFF_MIN
+
+    def is_due(self) -> bool:
+        return self._clock() >= self._next_heartbeat
+
+    def next_heartbeat_in(self) -> float:
+        """Returns the seconds until the next heartbeat is due, 0 if it is due"""
+        return max(0.0, self._next_heartbeat - self._clock())
+
+    def sent(self):
+        """Schedules the next heartbeat after sending one"""
+        self._next_heartbeat = self._clock() + self.interval + random.uniform(-self.jitter, self.jitter)
+
+    def reset(self):
+        """Makes the next heartbeat due immediately, e.g. for a new connection"""
+        self._next_heartbeat = self._clock()
+
+    def connected(self):
+        self._backoff = RECONNECT_BACKOFF_MIN
+
+    def connection_failed(self) -> float:
+        """Returns the seconds to wait before reconnecting, which increase with every failed attempt"""
+        backoff = self._backoff
+        self._backoff = min(self._backoff * 2, RECONNECT_BACKOFF_MAX)
+        return backoff
@@ -1,24 +1,28 @@
 import csv
-import itertools
 import json
 import logging
 import os
 import pickle
 import statistics
 import sys
+import threading
+import warnings
+from collections import OrderedDict
 from datetime import datetime, timezone
 from pathlib import Path
-from statistics import StatisticsError
 from typing import Tuple, List
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 from scipy.signal import find_peaks
 from tabulate import tabulate
 
+from gt7dashboard.gt7column import TelemetryColumn
 from gt7dashboard.gt7data import GTData
-from gt7dashboard.gt7lap import Lap
-from gt7dashboard import gt7helper
+from gt7dashboard.gt7lap import Lap, LAP_ATTRIBUTES, DATA_CHANNELS
+from gt7dashboard.gt7lapcollection import LapCollection
+from gt7dashboard import gt7helper, gt7lapfile
 from gt7dashboard.gt7laphelper import car_name
 
 
@@ -37,17 +41,30 @@ def calculate_remaining_fuel(
     return fuel_consumed_per_lap, laps_remaining, time_remaining
 
 
-def get_x_axis_for_distance(lap: Lap) -> List:
-    x_axis = []
-    tick_time = 16.668  # https://www.gtplanet.net/forum/threads/gt7-is-compatible-with-motion-rig.410728/post-13806131
-    for i, s in enumerate(lap.data_speed):
-        # distance traveled + (Speed in km/h / 3.6 / 1000 = mm / ms) * tick_time
-        if i == 0:
-            x_axis.append(0)
-            continue
+# https://www.gtplanet.net/forum/threads/gt7-is-compatible-with-motion-rig.410728/post-13806131
+TICK_TIME = 16.668
+
 
-        x_axis.append(x_axis[i - 1] + (lap.data_speed[i] / 3.6 / 1000) * tick_time)
+def get_x_axis_for_distance(lap: Lap) -> np.ndarray:
+    """
+    Returns the distance travelled in meters for every tick of the lap.
 
+    The result is read-only and cached on the lap. It is only calculated again
+    when data_speed was replaced or has grown since.
+    """
+    speed = lap.data_speed
+    cached = lap._distance_axis
+    if cached is not None and cached[0] is speed and cached[1] == len(speed):
+        return cached[2]
+
+    speed_values = np.asarray(speed, dtype=np.float64)
+    x_axis = np.zeros(len(speed_values))
+    # distance traveled + (Speed in km/h / 3.6 / 1000 = mm / ms) * tick_time
+    np.cumsum(speed_values[1:] / 3.6 / 1000 * TICK_TIME, out=x_axis[1:])
+    x_axis.flags.writeable = False
+
+    # Keep the column itself, so its identity can not be reused by another object
+    lap._distance_axis = (speed, len(speed_values), x_axis)
     return x_axis
 
 
@@ -57,58 +74,71 @@ def get_x_axis_depending_on_mode(lap: Lap, distance_mode: bool):
         return get_x_axis_for_distance(lap)
     else:
         # Use ticks as length, which is the length of any given data list
-        return list(range(len(lap.data_speed)))
-    pass
+        return np.arange(len(lap.data_speed))
 
 
-def get_time_delta_dataframe_for_lap(lap: Lap, name: str) -> DataFrame:
-    lap_distance = get_x_axis_for_distance(lap)
-    lap_time = lap.data_time
-
-    # Multiply to match datatype which is nanoseconds?
-    lap_time_ms = [convert_seconds_to_milliseconds(item) for item in lap_time]
+# Resolution of the distance grid for comparing lap times, in meters
+TIME_DIFF_DISTANCE_STEP = 1.0
 
-    series = pd.Series(
-        lap_distance, index=pd.TimedeltaIndex(data=lap_time_ms, unit="ms")
-    )
 
-    upsample = series.resample("10ms").asfreq()
-    interpolated_upsample = upsample.interpolate()
+def get_time_at_distances(lap: Lap, distances: np.ndarray) -> np.ndarray:
+    """
+    Returns the lap time in seconds when the lap reached the given distances.
+    Distances beyond the end of the lap get the time of the last tick.
+    """
+    lap_distance = get_x_axis_for_distance(lap)
+    lap_time = np.asarray(lap.data_time, dtype=np.float64)
+    ticks = min(len(lap_distance), len(lap_time))
+    if ticks == 0:
+        return np.full(len(distances), np.nan)
 
-    # Make distance to index and time to value, because we want to join on distance
-    inverted = pd.Series(
-        interpolated_upsample.index.values, index=interpolated_upsample
-    )
+    return np.interp(distances, lap_distance[:ticks], lap_time[:ticks])
 
-    # Flip around, we have to convert timedelta back to integer to do this
-    s1 = pd.Series(inverted.values.astype("int64"), name=name, index=inverted.index)
 
-    df1 = DataFrame(data=s1)
-    # returns a dataframe where index is distance travelled and first data field is time passed
-    return df1
+class LapTimeAligner:
+    """
+    Compares laps with a reference lap by the time they needed for the same distance.
 
+    The lap time of the reference lap is interpolated once on a grid of distances,
+    comparison laps are interpolated on the same grid.
+    """
 
-def calculate_time_diff_by_distance(
-        reference_lap: Lap, comparison_lap: Lap
-) -> DataFrame:
-    df1 = get_time_delta_dataframe_for_lap(reference_lap, "reference")
-    df2 = get_time_delta_dataframe_for_lap(comparison_lap, "comparison")
+    def __init__(self, reference_lap: Lap, distance_step: float = TIME_DIFF_DISTANCE_STEP):
+        reference_distance = get_x_axis_for_distance(reference_lap)
+        if len(reference_distance) == 0:
+            self.distance = np.empty(0)
+        else:
+            lap_distance = reference_distance[-1]
+            self.distance = np.append(np.arange(0, lap_distance, distance_step), lap_distance)
 
-    df = df1.join(df2, how="outer").sort_index().interpolate()
+        self.reference_time = get_time_at_distances(reference_lap, self.distance)
+        self._reference_timedelta = pd.to_timedelta(self.reference_time, unit="s")
 
-    # After interpolation, we can make the index a normal field and rename it
-    df.reset_index(inplace=True)
-    df = df.rename(columns={"index": "distance"})
+    def compare(self, comparison_lap: Lap) -> DataFrame:
+        """
+        Returns a dataframe with the columns distance, reference, comparison and timedelta.
+        Times are timedeltas, a positive timedelta means the comparison lap is slower.
+        """
+        comparison_time = get_time_at_distances(comparison_lap, self.distance)
+        comparison_timedelta = pd.to_timedelta(comparison_time, unit="s")
+
+        return DataFrame(
+            {
+                "distance": self.distance,
+                "reference": self._reference_timedelta,
+                "comparison": comparison_timedelta,
+                "timedelta": comparison_timedelta - self._reference_timedelta,
+            }
+        )
 
-    # Convert integer timestamps back to timestamp format
-    s_reference_timestamped = pd.to_timedelta(getattr(df, "reference"))
-    s_comparison_timestamped = pd.to_timedelta(getattr(df, "comparison"))
+    def compare_all(self, comparison_laps: List[Lap]) -> List[DataFrame]:
+        return [self.compare(lap) for lap in comparison_laps]
 
-    df["reference"] = s_reference_timestamped
-    df["comparison"] = s_comparison_timestamped
 
-    df["timedelta"] = df["comparison"] - df["reference"]
-    return df
+def calculate_time_diff_by_distance(
+        reference_lap: Lap, comparison_lap: Lap
+) -> DataFrame:
+    return LapTimeAligner(reference_lap).compare(comparison_lap)
 
 
 def mark_if_matches_highest_or_lowest(
@@ -258,37 +288,6 @@ def get_speed_peaks_and_valleys(lap: Lap):
         valley_speed_data_y,
     )
 
-
-
-def none_ignoring_median(data):
-    """Return the median (middle value) of numeric data but ignore None values.
-
-    When the number of data points is odd, return the middle data point.
-    When the number of data points is even, the median is interpolated by
-    taking the average of the two middle values:
-
-    >>> none_ignoring_median([1, 3, None, 5])
-    3
-    >>> none_ignoring_median([1, 3, 5, None, 7])
-    4.0
-
-    """
-    # FIXME improve me
-    filtered_data = []
-    for d in data:
-        if d is not None:
-            filtered_data.append(d)
-    filtered_data = sorted(filtered_data)
-    n = len(filtered_data)
-    if n == 0:
-        raise StatisticsError("no median for empty data")
-    if n % 2 == 1:
-        return filtered_data[n // 2]
-    else:
-        i = n // 2
-        return (filtered_data[i - 1] + filtered_data[i]) / 2
-
-
 class LapFile:
     def __init__(self):
         self.name = None
@@ -303,7 +302,7 @@ def list_lap_files_from_path(root: str):
     lap_files = []
     for path, sub_dirs, files in os.walk(root):
         for name in files:
-            if name.endswith(".json"):
+            if name.endswith(".json") or gt7lapfile.is_lap_file(name):
                 lf = LapFile()
                 lf.name = name
                 lf.path = os.path.join(path, name)
@@ -325,8 +324,7 @@ def load_laps_from_json(json_file):
 
     laps = []
     for lap_data in data:
-        lap = Lap()
-        lap.__dict__.update(lap_data)
+        lap = Lap.from_dict(lap_data)
         for key, value in lap_data.items():
             if key.endswith('_timestamp') and isinstance(value, str):
                 value = datetime.fromisoformat(value)
@@ -335,15 +333,45 @@ def load_laps_from_json(json_file):
 
     return laps
 
-def save_laps_to_pickle(laps: List[Lap]) -> str:
+def load_laps_from_file(path: str) -> List[Lap]:
+    """
+    Loads laps of binary lap files, JSON files or pickle files, depending on the file extension.
+    The data channels of binary lap files are mapped into memory and only read when they are used.
+    """
+    if gt7lapfile.is_lap_file(path):
+        return gt7lapfile.LapArchive(path).laps
+    if path.endswith(".json"):
+        return load_laps_from_json(path)
+    return load_laps_from_pickle(path)
+
+
+def convert_lap_file(path: str) -> str:
+    """Converts a JSON or pickle lap file to a binary lap file next to it and returns its path"""
+    laps = load_laps_from_file(path)
+    lap_file_path = os.path.splitext(path)[0] + gt7lapfile.LAP_FILE_EXTENSION
+    gt7lapfile.write_laps(lap_file_path, laps)
+    return lap_file_path
+
+
+def _new_lap_file_path(laps: List[Lap], extension: str) -> str:
     storage_folder = "data"
     local_timezone = datetime.now(timezone.utc).astimezone().tzinfo
     dt = datetime.now(tz=local_timezone)
     str_date_time = dt.strftime("%Y-%m-%d_%H_%M_%S")
-    storage_filename = "%s_%s.laps" % (str_date_time, get_safe_filename(car_name(laps[0])))
+    storage_filename = "%s_%s%s" % (str_date_time, get_safe_filename(car_name(laps[0])), extension)
     Path(storage_folder).mkdir(parents=True, exist_ok=True)
 
-    path = os.path.join(os.getcwd(), storage_folder, storage_filename)
+    return os.path.join(os.getcwd(), storage_folder, storage_filename)
+
+
+def save_laps_to_lap_file(laps: List[Lap]) -> str:
+    path = _new_lap_file_path(laps, gt7lapfile.LAP_FILE_EXTENSION)
+    gt7lapfile.write_laps(path, laps)
+    return path
+
+
+def save_laps_to_pickle(laps: List[Lap]) -> str:
+    path = _new_lap_file_path(laps, ".laps")
 
     with open(path, "wb") as f:
         pickle.dump(laps, f)
@@ -351,22 +379,21 @@ def save_laps_to_pickle(laps: List[Lap]) -> str:
     return path
 
 def save_laps_to_json(laps: List[Lap]) -> str:
-
-    storage_folder = "data"
-    local_timezone = datetime.now(timezone.utc).astimezone().tzinfo
-    dt = datetime.now(tz=local_timezone)
-    str_date_time = dt.strftime("%Y-%m-%d_%H_%M_%S")
-    storage_filename = "%s_%s.json" % (str_date_time, get_safe_filename(car_name(laps[0])))
-    Path(storage_folder).mkdir(parents=True, exist_ok=True)
-
-    path = os.path.join(os.getcwd(), storage_folder, storage_filename)
+    path = _new_lap_file_path(laps, ".json")
 
     with open(path, "w") as f:
-        json.dump([ob.__dict__ for ob in laps], f, default=str)
+        json.dump([ob.to_dict() for ob in laps], f, default=_json_default)
 
     return path
 
 
+def _json_default(value):
+    # Telemetry columns are stored as plain lists, everything else like timestamps as string
+    if isinstance(value, TelemetryColumn):
+        return value.tolist()
+    return str(value)
+
+
 def get_safe_filename(unsafe_filename: str) -> str:
     return "".join(x for x in unsafe_filename if x.isalnum() or x in "._- ").replace(" ", "_")
 
@@ -402,16 +429,49 @@ def get_last_reference_median_lap(
 
 
 def get_best_lap(laps: List[Lap]):
+    if isinstance(laps, LapCollection):
+        return laps.best_lap()
+
     if len(laps) == 0:
         return None
 
-    return sorted(laps, key=lambda x: x.lap_finish_time, reverse=False)[0]
+    # min returns the first of several best laps, like a stable sort
+    return min(laps, key=lambda x: x.lap_finish_time)
+
+
+MEDIAN_LAP_CACHE_SIZE = 8
+_median_lap_cache = OrderedDict()
+_median_lap_cache_lock = threading.Lock()
 
 
 def get_median_lap(laps: List[Lap]) -> Lap:
+    """
+    Returns a lap with the median of every attribute of the given laps.
+    The median lap is cached, it is only calculated again when the laps or their data changed.
+    The same lap is returned to every caller, it is sealed so it cannot be changed.
+    """
     if len(laps) == 0:
         raise Exception("Lap list does not contain any laps")
 
+    key = tuple(lap.cache_key for lap in laps)
+    with _median_lap_cache_lock:
+        median_lap = _median_lap_cache.get(key)
+        if median_lap is not None:
+            _median_lap_cache.move_to_end(key)
+            return median_lap
+
+    median_lap = calculate_median_lap(laps)
+    median_lap.seal()
+
+    with _median_lap_cache_lock:
+        _median_lap_cache[key] = median_lap
+        if len(_median_lap_cache) > MEDIAN_LAP_CACHE_SIZE:
+            _median_lap_cache.popitem(last=False)
+
+    return median_lap
+
+
+def calculate_median_lap(laps: List[Lap]) -> Lap:
     # Filter out too long laps, like box laps etc. use 10 Seconds of the best lap as a threshold
     best_lap = get_best_lap(laps)
     ten_seconds = 10000
@@ -423,29 +483,26 @@ def get_median_lap(laps: List[Lap]) -> Lap:
     if len(laps) == 0:
         return median_lap
 
-    for val in vars(laps[0]):
+    for val in LAP_ATTRIBUTES:
+        if val in DATA_CHANNELS:
+            median_attribute = _nan_padded_median([getattr(lap, val) for lap in laps])
+            if median_attribute is not None:
+                setattr(median_lap, val, median_attribute)
+            continue
+
         attributes = []
         for lap in laps:
-            if val == "options":
-                continue
             attr = getattr(lap, val)
             # FIXME why is it sometimes string AND int?
-            if not isinstance(attr, str) and attr != "" and attr != []:
-                attributes.append(getattr(lap, val))
+            if not isinstance(attr, str) and attr != "":
+                attributes.append(attr)
 
         if len(attributes) == 0:
             continue
         if isinstance(getattr(laps[0], val), datetime):
             continue
 
-        if isinstance(getattr(laps[0], val), list):
-            median_attribute = [
-                none_ignoring_median(k)
-                for k in itertools.zip_longest(*attributes, fillvalue=None)
-            ]
-        else:
-            median_attribute = statistics.median(attributes)
-        setattr(median_lap, val, median_attribute)
+        setattr(median_lap, val, statistics.median(attributes))
 
     median_lap.title = "Median (%d Laps): %s" % (
         len(laps),
@@ -455,6 +512,25 @@ def get_median_lap(laps: List[Lap]) -> Lap:
     return median_lap
 
 
+def _nan_padded_median(channels: list):
+    """
+    Returns the median of every tick of the given channels as TelemetryColumn.
+    Shorter channels are padded with NaN, so ticks only present in some laps use the median of those.
+    """
+    longest = max(len(channel) for channel in channels)
+    if longest == 0:
+        return None
+
+    stacked = np.full((len(channels), longest), np.nan)
+    for i, channel in enumerate(channels):
+        stacked[i, :len(channel)] = np.asarray(channel, dtype=np.float64)
+
+    with warnings.catch_warnings():
+        # Ticks without any value stay NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return TelemetryColumn(np.nanmedian(stacked, axis=0))
+
+
 def get_brake_points(lap):
     x = []
     y = []
@@ -477,56 +553,73 @@ def filter_max_min_laps(laps: List[Lap], max_lap_time=-1, min_lap_time=-1) -> Li
     return laps
 
 
-def pd_data_frame_from_lap(
-        laps: List[Lap], best_lap_time: int
-) -> pd.DataFrame:
-    df = pd.DataFrame()
-    for i, lap in enumerate(laps):
-        time_diff = ""
-        info = ""
+LAP_TABLE_FIELDS = (
+    "number",
+    "time",
+    "diff",
+    "timestamp",
+    "info",
+    "car_name",
+    "fuelconsumed",
+    "fullthrottle",
+    "throttleandbreak",
+    "fullbreak",
+    "nothrottle",
+    "tyrespinning",
+)
+
+
+def get_lap_time_diff(lap: Lap, best_lap_time: int) -> str:
+    time_diff = ""
+
+    if best_lap_time == lap.lap_finish_time:
+        # lap_color = 35 # magenta
+        # TODO add some formatting
+        pass
+    elif lap.lap_finish_time < best_lap_time:
+        # lap_finish_time cannot be smaller than last_lap, last_lap is always the smallest.
+        # This can only mean that lap.lap_finish_time is from an earlier race on a different track
+        time_diff = "-"
+    elif best_lap_time > 0:
+        time_diff = "+" + seconds_to_lap_time(
+            -1 * (best_lap_time / 1000 - lap.lap_finish_time / 1000)
+        )
 
-        if lap.is_replay:
-            info += "Replay"
+    return time_diff
 
-        if best_lap_time == lap.lap_finish_time:
-            # lap_color = 35 # magenta
-            # TODO add some formatting
-            pass
-        elif lap.lap_finish_time < best_lap_time:
-            # lap_finish_time cannot be smaller than last_lap, last_lap is always the smallest.
-            # This can only mean that lap.lap_finish_time is from an earlier race on a different track
-            time_diff = "-"
-        elif best_lap_time > 0:
-            time_diff = "+" + seconds_to_lap_time(
-                -1 * (best_lap_time / 1000 - lap.lap_finish_time / 1000)
-            )
 
-        df_add = pd.DataFrame(
-            [
-                {
-                    "number": lap.number,
-                    "time": seconds_to_lap_time(lap.lap_finish_time / 1000),
-                    "diff": time_diff,
-                    "timestamp": lap.lap_start_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    "info": info,
-                    "car_name": car_name(lap),
-                    "fuelconsumed": "%d" % lap.fuel_consumed,
-                    "fullthrottle": "%d"
-                                    % (lap.full_throttle_ticks / lap.lap_ticks * 1000),
-                    "throttleandbreak": "%d"
-                                        % (lap.throttle_and_brake_ticks / lap.lap_ticks * 1000),
-                    "fullbreak": "%d" % (lap.full_brake_ticks / lap.lap_ticks * 1000),
-                    "nothrottle": "%d"
-                                  % (lap.no_throttle_and_no_brake_ticks / lap.lap_ticks * 1000),
-                    "tyrespinning": "%d"
-                                    % (lap.tires_spinning_ticks / lap.lap_ticks * 1000),
-                }
-            ],
-            index=[i],
-        )
-        df = pd.concat([df, df_add])
+def get_lap_table_row(lap: Lap, best_lap_time: int) -> dict:
+    """Returns the row of a lap for the lap time table, with a value for every field of LAP_TABLE_FIELDS"""
+    info = ""
 
-    return df
+    if lap.is_replay:
+        info += "Replay"
+
+    return {
+        "number": lap.number,
+        "time": seconds_to_lap_time(lap.lap_finish_time / 1000),
+        "diff": get_lap_time_diff(lap, best_lap_time),
+        "timestamp": lap.lap_start_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        "info": info,
+        "car_name": car_name(lap),
+        "fuelconsumed": "%d" % lap.fuel_consumed,
+        "fullthrottle": "%d"
+                        % (lap.full_throttle_ticks / lap.lap_ticks * 1000),
+        "throttleandbreak": "%d"
+                            % (lap.throttle_and_brake_ticks / lap.lap_ticks * 1000),
+        "fullbreak": "%d" % (lap.full_brake_ticks / lap.lap_ticks * 1000),
+        "nothrottle": "%d"
+                      % (lap.no_throttle_and_no_brake_ticks / lap.lap_ticks * 1000),
+        "tyrespinning": "%d"
+                        % (lap.tires_spinning_ticks / lap.lap_ticks * 1000),
+    }
+
+
+def pd_data_frame_from_lap(
+        laps: List[Lap], best_lap_time: int
+) -> pd.DataFrame:
+    rows = [get_lap_table_row(lap, best_lap_time) for lap in laps]
+    return pd.DataFrame(rows, columns=list(LAP_TABLE_FIELDS), index=range(len(rows)))
 
 
 def pd_data_frame_from_debug_data(
@@ -558,67 +651,102 @@ RACE_LINE_THROTTLE_MODE = "RACE_LINE_THROTTLE_MODE"
 RACE_LINE_COASTING_MODE = "RACE_LINE_COASTING_MODE"
 
 
-def get_race_line_coordinates_when_mode_is_active(lap: Lap, mode: str):
-    return_y = []
-    return_x = []
-    return_z = []
-
-    for i, _ in enumerate(lap.data_braking):
-
-        if mode == RACE_LINE_BRAKING_MODE:
+def get_race_line_coordinates_for_all_modes(lap: Lap) -> dict:
+    """
+    Returns the y, x and z coordinates for the race lines of all modes, as float arrays.
+    Coordinates of ticks where a mode is not active are NaN, so the race line has gaps there.
+    """
+    braking = np.asarray(lap.data_braking, dtype=np.float64)
+    ticks = len(braking)
+    throttle = np.asarray(lap.data_throttle, dtype=np.float64)[:ticks]
+    positions = [
+        np.asarray(lap.data_position_y, dtype=np.float64)[:ticks],
+        np.asarray(lap.data_position_x, dtype=np.float64)[:ticks],
+        np.asarray(lap.data_position_z, dtype=np.float64)[:ticks],
+    ]
+
+    masks = {
+        RACE_LINE_BRAKING_MODE: braking > throttle,
+        RACE_LINE_THROTTLE_MODE: braking < throttle,
+        RACE_LINE_COASTING_MODE: (braking == 0) & (throttle == 0),
+    }
+
+    return {
+        mode: tuple(np.where(mask, position, np.nan) for position in positions)
+        for mode, mask in masks.items()
+    }
 
-            if lap.data_braking[i] > lap.data_throttle[i]:
-                return_y.append(lap.data_position_y[i])
-                return_x.append(lap.data_position_x[i])
-                return_z.append(lap.data_position_z[i])
-            else:
-                return_y.append("NaN")
-                return_x.append("NaN")
-                return_z.append("NaN")
 
-        elif mode == RACE_LINE_THROTTLE_MODE:
+def get_race_line_coordinates_when_mode_is_active(lap: Lap, mode: str):
+    return get_race_line_coordinates_for_all_modes(lap)[mode]
 
-            if lap.data_braking[i] < lap.data_throttle[i]:
-                return_y.append(lap.data_position_y[i])
-                return_x.append(lap.data_position_x[i])
-                return_z.append(lap.data_position_z[i])
-            else:
-                return_y.append("NaN")
-                return_x.append("NaN")
-                return_z.append("NaN")
 
-        if mode == RACE_LINE_COASTING_MODE:
+CARS_CSV_FILENAME = "db/cars.csv"
+TRACKS_CSV_FILENAME = "db/course.csv"
 
-            if lap.data_braking[i] == 0 and lap.data_throttle[i] == 0:
-                return_y.append(lap.data_position_y[i])
-                return_x.append(lap.data_position_x[i])
-                return_z.append(lap.data_position_z[i])
-            else:
-                return_y.append("NaN")
-                return_x.append("NaN")
-                return_z.append("NaN")
 
-    return return_y, return_x, return_z
+class CsvCatalog:
+    """
+    Id and name rows of the CSV files in db/, read once per process and indexed by id.
+    A file is read again when its modification time has changed.
+    """
 
+    def __init__(self):
+        # path -> (modification time, rows, names by id)
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def rows(self, path: str) -> List[Tuple[int, str]]:
+        entry = self._get(path)
+        if entry is None:
+            return []
+        return list(entry[1])
+
+    def name(self, path: str, row_id: int):
+        entry = self._get(path)
+        if entry is None:
+            return None
+        return entry[2].get(row_id)
+
+    def _get(self, path: str):
+        try:
+            modification_time = os.stat(path).st_mtime_ns
+        except OSError:
+            logging.info("Could not find file %s" % path)
+            self._files.pop(path, None)
+            return None
+
+        entry = self._files.get(path)
+        if entry is not None and entry[0] == modification_time:
+            return entry
+
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is None or entry[0] != modification_time:
+                entry = (modification_time,) + self._read(path)
+                self._files[path] = entry
+        return entry
+
+    @staticmethod
+    def _read(path: str):
+        rows = []
+        names = {}
+        with open(path, 'r') as csv_file:
+            csv_reader = csv.reader(csv_file, delimiter=',')
+            for row in csv_reader:
+                if row[0].isdigit():
+                    row_id = int(row[0])
+                    rows.append((row_id, row[1]))
+                    # The first row of an id wins, like for a linear search
+                    names.setdefault(row_id, row[1])
+        return rows, names
+
+
+csv_catalog = CsvCatalog()
 
-CARS_CSV_FILENAME = "db/cars.csv"
-TRACKS_CSV_FILENAME = "db/course.csv"
 
 def get_track_list() -> List[Tuple[int, str]]:
-    tracks = []
-    # check if file exists
-    if not os.path.isfile(TRACKS_CSV_FILENAME):
-        logging.info("Could not find file %s" % TRACKS_CSV_FILENAME)
-        return tracks
-
-    # read csv from file
-    with open(TRACKS_CSV_FILENAME, 'r') as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter=',')
-        for row in csv_reader:
-            if row[0].isdigit():
-                tracks.append((int(row[0]),row[1]))
-
-    return tracks
+    return csv_catalog.rows(TRACKS_CSV_FILENAME)
 
 
 def get_car_name_for_car_id(car_id: int) -> str:
@@ -626,33 +754,14 @@ def get_car_name_for_car_id(car_id: int) -> str:
     if not isinstance(car_id, int):
         raise ValueError("car_id must be an integer")
 
-    # check if file exists
-    if not os.path.isfile(CARS_CSV_FILENAME):
-        logging.info("Could not find file %s" % CARS_CSV_FILENAME)
+    name = csv_catalog.name(CARS_CSV_FILENAME, car_id)
+    if name is None:
         return "CAR-ID-%d" % car_id
+    return name
 
-    # read csv from file
-    with open(CARS_CSV_FILENAME, 'r') as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter=',')
-        for row in csv_reader:
-            if row[0] == str(car_id):
-                return row[1]
-
-    return "CAR-ID-%d" % car_id
 
 def get_car_name_list() -> List[Tuple[int, str]]:
-    cars = []
-    # check if file exists
-    if not os.path.isfile(CARS_CSV_FILENAME):
-        logging.info("Could not find file %s" % CARS_CSV_FILENAME)
-
-    # read csv from file
-    with open(CARS_CSV_FILENAME, 'r') as csv_file:
-        csv_reader = csv.reader(csv_file, delimiter=',')
-        for row in csv_reader:
-            if row[0].isdigit():
-                cars.append((int(row[0]),row[1]))
-    return cars
+    return csv_catalog.rows(CARS_CSV_FILENAME)
 
 
 def bokeh_tuple_for_list_of_lapfiles(lapfiles: List[LapFile]):
@@ -746,6 +855,9 @@ def get_fuel_on_consumption_by_relative_fuel_levels(lap: Lap) -> List[FuelMap]:
 
 def get_n_fastest_laps_within_percent_threshold_ignoring_replays(laps: List[Lap], number_of_laps: int,
                                                                  percent_threshold: float):
+    if isinstance(laps, LapCollection):
+        return laps.fastest_laps(number_of_laps, percent_threshold)
+
     # FIXME Replace later with this line
     # filtered_laps = [lap for lap in laps if not lap.is_replay]
     filtered_laps = [lap for lap in laps if not (len(lap.data_speed) == 0 or lap.is_replay)]
@@ -762,32 +874,40 @@ def get_n_fastest_laps_within_percent_threshold_ignoring_replays(laps: List[Lap]
 
 
 DEFAULT_FASTEST_LAPS_PERCENT_THRESHOLD = 0.05
-def get_variance_for_fastest_laps(laps: List[Lap], number_of_laps: int = 3, percent_threshold: float = DEFAULT_FASTEST_LAPS_PERCENT_THRESHOLD) -> (DataFrame, list[Lap]):
+# Number of distances the speed variance is calculated for, independent of the number of laps
+DEFAULT_VARIANCE_GRID_POINTS = 2000
+
+
+def get_variance_for_fastest_laps(laps: List[Lap], number_of_laps: int = 3, percent_threshold: float = DEFAULT_FASTEST_LAPS_PERCENT_THRESHOLD, number_of_points: int = DEFAULT_VARIANCE_GRID_POINTS) -> (DataFrame, list[Lap]):
     fastest_laps: list[Lap] = get_n_fastest_laps_within_percent_threshold_ignoring_replays(laps, number_of_laps, percent_threshold)
-    variance: DataFrame = get_variance_for_laps(fastest_laps)
+    variance: DataFrame = get_variance_for_laps(fastest_laps, number_of_points)
     return variance, fastest_laps
 
 
-def get_variance_for_laps(laps: List[Lap]) -> DataFrame:
+def get_variance_for_laps(laps: List[Lap], number_of_points: int = DEFAULT_VARIANCE_GRID_POINTS) -> DataFrame:
+    """
+    Returns the standard deviation of the speed of the laps at number_of_points evenly spaced distances.
+    Distances beyond the end of a lap are ignored for that lap.
+    """
+    distances = [get_x_axis_for_distance(lap) for lap in laps]
+    laps_with_data = [(lap, distance) for lap, distance in zip(laps, distances) if len(distance) > 0]
+    if len(laps_with_data) == 0:
+        return pd.DataFrame(columns=["distance", "speed_variance"])
 
-    dataframe_distance_columns = []
-    merged_df = pd.DataFrame(columns=['distance'])
-    for lap in laps:
-        d = {'speed': lap.data_speed, 'distance' : gt7helper.get_x_axis_for_distance(lap)}
-        df = pd.DataFrame(data=d)
-        dataframe_distance_columns.append(df)
-        merged_df = pd.merge(merged_df, df, on='distance', how='outer')
+    longest_distance = max(distance[-1] for _, distance in laps_with_data)
+    grid = np.linspace(0, longest_distance, number_of_points)
 
-    merged_df = merged_df.sort_values(by='distance')
-    merged_df = merged_df.set_index('distance')
+    speeds = np.empty((len(laps_with_data), number_of_points))
+    for i, (lap, distance) in enumerate(laps_with_data):
+        speed = np.asarray(lap.data_speed, dtype=np.float64)
+        speeds[i] = np.interp(grid, distance, speed, right=np.nan)
 
-    # Interpolate missing values
-    merged_df = merged_df.interpolate()
-    dbs_df = merged_df.std(axis=1).abs()
-    dbs_df = dbs_df.reset_index().rename(columns={'index': 'distance'})
-    dbs_df.columns = ["distance", "speed_variance"]
+    with warnings.catch_warnings():
+        # Distances covered by a single lap have no deviation
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        speed_variance = np.nanstd(speeds, axis=0, ddof=1)
 
-    return dbs_df
+    return pd.DataFrame({"distance": grid, "speed_variance": speed_variance})
 
 PEAK = "PEAK"
 VALLEY = "VALLEY"
@@ -1,8 +1,87 @@
+import itertools
 from datetime import datetime
 
+from gt7dashboard.gt7column import TelemetryColumn
+
+# Attributes holding one value per tick
+DATA_CHANNELS = (
+    "data_throttle",
+    "data_braking",
+    "data_braking_abs",
+    "data_steering",
+    "data_coasting",
+    "data_speed",
+    "data_time",
+    "data_rpm",
+    "data_gear",
+    "data_tires",
+    "data_position_x",
+    "data_position_y",
+    "data_position_z",
+    "data_boost",
+    "data_rotation_yaw",
+    "data_absolute_yaw_rate_per_second",
+)
+
+# Fixed set of attributes stored for a lap, see Lap.__init__ for their meaning
+LAP_ATTRIBUTES = (
+    "title",
+    "lap_ticks",
+    "lap_finish_time",
+    "lap_live_time",
+    "total_laps",
+    "number",
+    "track_id",
+    "throttle_and_brake_ticks",
+    "no_throttle_and_no_brake_ticks",
+    "full_brake_ticks",
+    "full_throttle_ticks",
+    "tires_overheated_ticks",
+    "tires_spinning_ticks",
+    "data_throttle",
+    "data_braking",
+    "data_braking_abs",
+    "data_steering",
+    "data_coasting",
+    "data_speed",
+    "data_time",
+    "data_rpm",
+    "data_gear",
+    "data_tires",
+    "data_position_x",
+    "data_position_y",
+    "data_position_z",
+    "fuel_at_start",
+    "fuel_at_end",
+    "fuel_consumed",
+    "data_boost",
+    "data_rotation_yaw",
+    "data_absolute_yaw_rate_per_second",
+    "car_id",
+    "is_replay",
+    "is_manual",
+    "lap_start_timestamp",
+    "lap_end_timestamp",
+    "EstimatedTopSpeed",
+)
+
+_VERSIONED_ATTRIBUTES = frozenset(LAP_ATTRIBUTES)
+
 
 class Lap:
+    # Attributes derived from the stored ones are cached in private slots
+    __slots__ = LAP_ATTRIBUTES + ("_uid", "_version", "_sealed", "_distance_axis")
+
+    # Unique per lap object in this process, laps loaded from files get a new one
+    _uids = itertools.count()
+
     def __init__(self):
+        self._uid = next(Lap._uids)
+        # Increased whenever an attribute is set, see __setattr__
+        self._version = 0
+        # Sealed laps are immutable, see seal()
+        self._sealed = False
+
         # Nice title for lap
         self.title = ""
         # Number of all lap ticks
@@ -26,30 +105,30 @@ class Lap:
         self.full_throttle_ticks = 0
         self.tires_overheated_ticks = 0
         self.tires_spinning_ticks = 0
-        # Data points with value for every tick
-        self.data_throttle = []
-        self.data_braking = []        
-        self.data_braking_abs = []
-        self.data_steering = []
-        self.data_coasting = []
-        self.data_speed = []
-        self.data_time = []
-        self.data_rpm = []
-        self.data_gear = []
-        self.data_tires = []
+        # Data points with value for every tick, see TelemetryColumn
+        self.data_throttle = TelemetryColumn()
+        self.data_braking = TelemetryColumn()
+        self.data_braking_abs = TelemetryColumn()
+        self.data_steering = TelemetryColumn()
+        self.data_coasting = TelemetryColumn()
+        self.data_speed = TelemetryColumn()
+        self.data_time = TelemetryColumn()
+        self.data_rpm = TelemetryColumn()
+        self.data_gear = TelemetryColumn()
+        self.data_tires = TelemetryColumn()
         # Positions on x,y,z
-        self.data_position_x = []
-        self.data_position_y = []
-        self.data_position_z = []
+        self.data_position_x = TelemetryColumn()
+        self.data_position_y = TelemetryColumn()
+        self.data_position_z = TelemetryColumn()
         # Fuel
         self.fuel_at_start = 0
         self.fuel_at_end = -1
         self.fuel_consumed = -1
         # Boost
-        self.data_boost = []
+        self.data_boost = TelemetryColumn()
         # Yaw Rate
-        self.data_rotation_yaw = []
-        self.data_absolute_yaw_rate_per_second = []
+        self.data_rotation_yaw = TelemetryColumn()
+        self.data_absolute_yaw_rate_per_second = TelemetryColumn()
         # Car
         self.car_id = 0
 
@@ -60,6 +139,95 @@ class Lap:
         self.lap_start_timestamp = datetime.now()
         self.lap_end_timestamp = -1
 
+        # Estimated top speed of the car, set when finishing the lap
+        # TODO Proper pythonic name
+        self.EstimatedTopSpeed = 0
+
+        # Distance axis calculated from data_speed, see gt7helper.get_x_axis_for_distance
+        self._distance_axis = None
+
+    def __setattr__(self, name, value):
+        if name in _VERSIONED_ATTRIBUTES:
+            if self._sealed:
+                raise AttributeError("Cannot set %s of a sealed lap" % name)
+            object.__setattr__(self, name, value)
+            object.__setattr__(self, "_version", self._version + 1)
+        else:
+            object.__setattr__(self, name, value)
+
+    def seal(self):
+        """
+        Makes the lap immutable: attributes cannot be set anymore and the data channels are frozen.
+        Sealed laps can be shared between threads and subscribers without copying them.
+        Copies and unpickled laps are not sealed.
+        """
+        for channel in DATA_CHANNELS:
+            column = getattr(self, channel)
+            if not isinstance(column, TelemetryColumn):
+                # The values stay the same, so the version is not increased
+                column = TelemetryColumn(column)
+                object.__setattr__(self, channel, column)
+            column.freeze()
+        object.__setattr__(self, "_sealed", True)
+
+    @property
+    def sealed(self) -> bool:
+        return self._sealed
+
+    def replace_channels(self, columns: dict):
+        """
+        Replaces data channels of a sealed lap by frozen columns with the same values,
+        e.g. columns stored on disk. The cache key stays the same.
+        """
+        if not self._sealed:
+            raise ValueError("Only channels of sealed laps can be replaced")
+        for channel, column in columns.items():
+            if channel not in DATA_CHANNELS:
+                raise KeyError(channel)
+            if len(column) != len(getattr(self, channel)):
+                raise ValueError("Column %s has %d instead of %d values" % (channel, len(column), len(getattr(self, channel))))
+            object.__setattr__(self, channel, column)
+        # The cached distance axis references the replaced speed column
+        object.__setattr__(self, "_distance_axis", None)
+
+    @property
+    def cache_key(self) -> tuple:
+        """
+        Identifies the current data of this lap, for caching values derived from it.
+        Changes when an attribute was set or new ticks were appended to the data channels.
+        """
+        # Channels only grow, so the total number of values changes with every append
+        return self._uid, self._version, sum(len(getattr(self, channel)) for channel in DATA_CHANNELS)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Lap":
+        """
+        Creates a lap from a dict of attributes, as stored in lap files.
+        Attributes missing in older files keep their defaults, unknown attributes are ignored.
+        """
+        lap = cls()
+        lap.update_from_dict(data)
+        return lap
+
+    def update_from_dict(self, data: dict):
+        for key, value in data.items():
+            if key in DATA_CHANNELS:
+                value = TelemetryColumn(value)
+            if key in LAP_ATTRIBUTES:
+                setattr(self, key, value)
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in LAP_ATTRIBUTES}
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        # Pickles of laps from before slots were introduced contain the instance __dict__,
+        # which might miss attributes added later on
+        self.__init__()
+        self.update_from_dict(state)
+
     def __str__(self):
         return "\n %s, %2d, %1.f, %4d, %4d, %4d" % (
             self.title,
@@ -0,0 +1,149 @@
+from bisect import bisect_left, bisect_right
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+from gt7dashboard.gt7lap import Lap
+
+
+class _SortedLaps:
+    """Laps sorted by finish time, with a parallel list of the finish times to bisect on"""
+
+    __slots__ = ("finish_times", "laps")
+
+    def __init__(self):
+        self.finish_times = []
+        self.laps: List[Lap] = []
+
+    def add(self, lap: Lap, most_recent: bool):
+        # Bisecting with a key function needs Python 3.10
+        bisect = bisect_left if most_recent else bisect_right
+        index = bisect(self.finish_times, lap.lap_finish_time)
+        self.finish_times.insert(index, lap.lap_finish_time)
+        self.laps.insert(index, lap)
+
+    def copy(self) -> "_SortedLaps":
+        sorted_laps = _SortedLaps()
+        sorted_laps.finish_times = self.finish_times.copy()
+        sorted_laps.laps = self.laps.copy()
+        return sorted_laps
+
+
+def _is_fastest_lap_candidate(lap: Lap) -> bool:
+    # Same filter as gt7helper.get_n_fastest_laps_within_percent_threshold_ignoring_replays
+    return not (len(lap.data_speed) == 0 or lap.is_replay)
+
+
+class LapCollection:
+    """
+    Laps, the most recent lap first, with indexes sorted by finish time that are updated as laps are added.
+
+    Best lap queries are O(1), top N queries O(N) instead of sorting all laps on every call.
+    Besides all laps, the laps without replays and the laps without replays of every car and track
+    are indexed. Of laps with the same finish time, the most recent lap comes first, like when sorting
+    the laps with a stable sort.
+
+    Laps must not be changed after adding them, e.g. because they are sealed.
+    Use copy() to get a snapshot that does not change when laps are added.
+    """
+
+    def __init__(self, laps: Iterable[Lap] = ()):
+        self._laps = deque()
+        self._by_finish_time = _SortedLaps()
+        # Laps with data and without replays, see _is_fastest_lap_candidate
+        self._fastest = _SortedLaps()
+        self._by_car_id: Dict[int, _SortedLaps] = {}
+        self._by_track_id: Dict[int, _SortedLaps] = {}
+        self.extend(laps)
+
+    def prepend(self, lap: Lap):
+        """Adds a lap as most recent lap"""
+        self._laps.appendleft(lap)
+        self._index(lap, most_recent=True)
+
+    def extend(self, laps: Iterable[Lap]):
+        """Adds laps as the oldest laps, keeping their order"""
+        for lap in laps:
+            self._laps.append(lap)
+            self._index(lap, most_recent=False)
+
+    def extend_first(self, laps: Iterable[Lap]):
+        """Adds laps as the most recent laps, keeping their order"""
+        for lap in reversed(list(laps)):
+            self.prepend(lap)
+
+    def _index(self, lap: Lap, most_recent: bool):
+        self._by_finish_time.add(lap, most_recent)
+        if _is_fastest_lap_candidate(lap):
+            self._fastest.add(lap, most_recent)
+            self._by_car_id.setdefault(lap.car_id, _SortedLaps()).add(lap, most_recent)
+            self._by_track_id.setdefault(lap.track_id, _SortedLaps()).add(lap, most_recent)
+
+    def best_lap(self) -> Optional[Lap]:
+        """Returns the lap with the lowest finish time, including replays, like gt7helper.get_best_lap"""
+        laps = self._by_finish_time.laps
+        return laps[0] if laps else None
+
+    def fastest_laps(self, number_of_laps: int, percent_threshold: float = None) -> List[Lap]:
+        """
+        Returns up to number_of_laps laps without replays, the fastest first.
+        With a percent_threshold, only laps at most this much slower than the fastest lap are returned.
+        """
+        fastest_laps = self._fastest.laps[:number_of_laps]
+        if percent_threshold is None or len(fastest_laps) == 0:
+            return fastest_laps
+        max_finish_time = fastest_laps[0].lap_finish_time * (1 + percent_threshold)
+        return [lap for lap in fastest_laps if lap.lap_finish_time <= max_finish_time]
+
+    def best_lap_of_car(self, car_id: int) -> Optional[Lap]:
+        """Returns the fastest lap without replays of a car"""
+        laps = self._by_car_id.get(car_id)
+        return laps.laps[0] if laps else None
+
+    def best_lap_of_track(self, track_id: int) -> Optional[Lap]:
+        """Returns the fastest lap without replays on a track"""
+        laps = self._by_track_id.get(track_id)
+        return laps.laps[0] if laps else None
+
+    def best_laps_per_car(self) -> Dict[int, Lap]:
+        return {car_id: laps.laps[0] for car_id, laps in self._by_car_id.items()}
+
+    def best_laps_per_track(self) -> Dict[int, Lap]:
+        return {track_id: laps.laps[0] for track_id, laps in self._by_track_id.items()}
+
+    def copy(self) -> "LapCollection":
+        """Returns a copy of the laps and indexes in O(n), without sorting again"""
+        collection = LapCollection()
+        collection._laps = self._laps.copy()
+        collection._by_finish_time = self._by_finish_time.copy()
+        collection._fastest = self._fastest.copy()
+        collection._by_car_id = {car_id: laps.copy() for car_id, laps in self._by_car_id.items()}
+        collection._by_track_id = {track_id: laps.copy() for track_id, laps in self._by_track_id.items()}
+        return collection
+
+    def to_list(self) -> List[Lap]:
+        return list(self._laps)
+
+    def __len__(self):
+        return len(self._laps)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_list()[index]
+        return self._laps[index]
+
+    def __iter__(self):
+        return iter(self._laps)
+
+    def __reversed__(self):
+        return reversed(self._laps)
+
+    def __eq__(self, other):
+        # Laps are compared by identity, like lists of laps
+        if isinstance(other, (LapCollection, list, tuple)):
+            return len(self) == len(other) and all(a is b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "LapCollection(%d laps)" % len(self._laps)
@@ -0,0 +1,238 @@
+"""
+Binary lap files storing the data channels of every lap as contiguous little-endian columns.
+
+Layout of a file, all numbers little-endian:
+
+    file header:  magic b"GT7LAPS\\0", uint16 version, uint16 reserved, uint32 number of laps
+    per lap:      uint64 size of the lap in bytes after this field, uint32 size of the metadata
+                  metadata as UTF-8 JSON: {"attributes": {...}, "columns": [[channel, dtype, count], ...]}
+                  zero padding to a multiple of 8 bytes
+                  one block per column in the order of "columns", each padded to a multiple of 8 bytes
+
+Attributes are all lap attributes besides the data channels, timestamps as ISO 8601 strings.
+Columns are read into NumPy arrays without parsing them. Since the game sends float32,
+channels are stored as float32, except for integral channels stored as int16.
+
+read_laps reads all columns into memory, LapArchive maps the file and only reads the pages
+of the columns that are used.
+"""
+import json
+import mmap
+import struct
+from datetime import datetime
+from typing import BinaryIO, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from gt7dashboard.gt7column import TelemetryColumn
+from gt7dashboard.gt7lap import Lap, LAP_ATTRIBUTES, DATA_CHANNELS
+
+LAP_FILE_MAGIC = b"GT7LAPS\0"
+LAP_FILE_VERSION = 1
+LAP_FILE_EXTENSION = ".gt7laps"
+
+FILE_HEADER = struct.Struct("<8sHHI")
+LAP_HEADER = struct.Struct("<QI")
+
+ALIGNMENT = 8
+
+DEFAULT_CHANNEL_DTYPE = "<f4"
+CHANNEL_DTYPES = {
+    "data_coasting": "<i2",
+    "data_gear": "<i2",
+}
+
+
+def _padding(offset: int) -> int:
+    return -offset % ALIGNMENT
+
+
+def write_laps(path: str, laps: List[Lap]):
+    with open(path, "wb") as f:
+        f.write(FILE_HEADER.pack(LAP_FILE_MAGIC, LAP_FILE_VERSION, 0, len(laps)))
+        for lap in laps:
+            _write_lap(f, lap)
+
+
+def _write_lap(f: BinaryIO, lap: Lap):
+    columns = []
+    blocks = []
+    for channel in DATA_CHANNELS:
+        dtype = CHANNEL_DTYPES.get(channel, DEFAULT_CHANNEL_DTYPE)
+        values = np.asarray(getattr(lap, channel)).astype(dtype, copy=False)
+        columns.append([channel, dtype, len(values)])
+        blocks.append(values)
+
+    attributes = {key: getattr(lap, key) for key in LAP_ATTRIBUTES if key not in DATA_CHANNELS}
+    metadata = json.dumps({"attributes": attributes, "columns": columns}, default=_json_default).encode("utf-8")
+
+    # Blocks are aligned relative to the file, so they can be mapped into memory as well
+    metadata_start = f.tell() + LAP_HEADER.size
+    metadata_padding = _padding(metadata_start + len(metadata))
+    size = LAP_HEADER.size - 8 + len(metadata) + metadata_padding
+    size += sum(block.nbytes + _padding(block.nbytes) for block in blocks)
+
+    f.write(LAP_HEADER.pack(size, len(metadata)))
+    f.write(metadata)
+    f.write(bytes(metadata_padding))
+    for block in blocks:
+        f.write(block.tobytes())
+        f.write(bytes(_padding(block.nbytes)))
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def read_file_header(f: BinaryIO) -> Tuple[int, int]:
+    """Returns version and number of laps of a lap file, raises ValueError for other files"""
+    data = f.read(FILE_HEADER.size)
+    if len(data) < FILE_HEADER.size:
+        raise ValueError("Not a lap file, it is too short")
+    magic, version, _, number_of_laps = FILE_HEADER.unpack(data)
+    if magic != LAP_FILE_MAGIC:
+        raise ValueError("Not a lap file, magic is %r" % magic)
+    if version > LAP_FILE_VERSION:
+        raise ValueError("Lap file version %d is not supported, update the dashboard" % version)
+    return version, number_of_laps
+
+
+def lap_from_metadata(metadata: dict) -> Lap:
+    """Creates a lap with the attributes of the metadata, without data channels"""
+    attributes = metadata["attributes"]
+    lap = Lap.from_dict(attributes)
+    for key, value in attributes.items():
+        if key.endswith("_timestamp") and isinstance(value, str):
+            setattr(lap, key, datetime.fromisoformat(value))
+    return lap
+
+
+def column_offsets(metadata_end: int, columns: list) -> List[Tuple[str, np.dtype, int, int]]:
+    """Returns channel, dtype, count and file offset of the columns of a lap whose metadata ends at metadata_end"""
+    offset = metadata_end + _padding(metadata_end)
+    offsets = []
+    for channel, dtype, count in columns:
+        dtype = np.dtype(dtype)
+        offsets.append((channel, dtype, count, offset))
+        nbytes = dtype.itemsize * count
+        offset += nbytes + _padding(nbytes)
+    return offsets
+
+
+def read_laps(path: str) -> List[Lap]:
+    laps = []
+    with open(path, "rb") as f:
+        _, number_of_laps = read_file_header(f)
+        for _ in range(number_of_laps):
+            header_start = f.tell()
+            size, metadata_size = LAP_HEADER.unpack(f.read(LAP_HEADER.size))
+            metadata = json.loads(f.read(metadata_size))
+
+            lap = lap_from_metadata(metadata)
+            for channel, dtype, count, offset in column_offsets(f.tell(), metadata["columns"]):
+                if channel not in DATA_CHANNELS:
+                    # Channels of newer versions are skipped
+                    continue
+                f.seek(offset)
+                values = np.frombuffer(f.read(dtype.itemsize * count), dtype=dtype)
+                setattr(lap, channel, TelemetryColumn(values))
+            laps.append(lap)
+
+            f.seek(header_start + 8 + size)
+    return laps
+
+
+class MappedColumn(TelemetryColumn):
+    """A frozen column wrapping values mapped from a lap file, their pages are read when the values are used"""
+
+    __slots__ = ()
+
+    @property
+    def nbytes(self) -> int:
+        # Mapped pages belong to the page cache of the file and are not kept in memory by the dashboard
+        return 0
+
+    def __reduce__(self):
+        # Copies and pickles are regular columns, independent of the mapped file
+        return TelemetryColumn, (np.array(self.view()), self.view().dtype)
+
+
+class LapInfo(NamedTuple):
+    """Metadata of a lap in a LapArchive"""
+    index: int
+    number: int
+    lap_finish_time: int
+    car_id: int
+    track_id: int
+    ticks: int
+
+
+class LapArchive:
+    """
+    The laps of a lap file, with their data channels mapped into memory instead of reading them.
+
+    Opening the archive only reads the file header and the metadata of every lap, see infos.
+    Laps are created on first access, their data channels are MappedColumns whose pages are
+    read when the lap is plotted.
+
+    The file must not be changed while the archive or one of its laps is used. The mapping is
+    released when neither the archive nor any of its columns are referenced anymore.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            _, number_of_laps = read_file_header(f)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.infos: List[LapInfo] = []
+        self._metadata = []
+        self._laps: List[Optional[Lap]] = [None] * number_of_laps
+
+        offset = FILE_HEADER.size
+        for index in range(number_of_laps):
+            size, metadata_size = LAP_HEADER.unpack_from(self._mmap, offset)
+            metadata_start = offset + LAP_HEADER.size
+            metadata = json.loads(self._mmap[metadata_start:metadata_start + metadata_size])
+            self._metadata.append((metadata_start + metadata_size, metadata))
+
+            attributes = metadata["attributes"]
+            ticks = next((count for channel, _, count in metadata["columns"] if channel == "data_speed"), 0)
+            self.infos.append(LapInfo(index, attributes.get("number", 0), attributes.get("lap_finish_time", 0),
+                                      attributes.get("car_id", 0), attributes.get("track_id", -1), ticks))
+
+            offset += 8 + size
+
+    def lap(self, index: int) -> Lap:
+        lap = self._laps[index]
+        if lap is None:
+            metadata_end, metadata = self._metadata[index]
+            lap = lap_from_metadata(metadata)
+            for channel, dtype, count, offset in column_offsets(metadata_end, metadata["columns"]):
+                if channel in DATA_CHANNELS:
+                    values = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+                    setattr(lap, channel, MappedColumn(values))
+            self._laps[index] = lap
+        return lap
+
+    @property
+    def laps(self) -> List[Lap]:
+        """All laps of the archive, without reading their data channels"""
+        return [self.lap(index) for index in range(len(self._laps))]
+
+    def __len__(self):
+        return len(self._laps)
+
+    def __getitem__(self, index: int) -> Lap:
+        return self.lap(index)
+
+    def __iter__(self):
+        return iter(self.laps)
+
+
+def is_lap_file(path: str) -> bool:
+    return path.endswith(LAP_FILE_EXTENSION)
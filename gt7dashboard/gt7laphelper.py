@@ -1,3 +1,8 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
 from gt7dashboard import gt7helper
 
 def get_speed_peaks_and_valleys(Lap):
@@ -21,28 +26,33 @@ def car_name(self) -> str:
             return "Car not logged"
         return gt7helper.get_car_name_for_car_id(self.car_id)
 
-def get_data_dict(self, distance_mode=True) -> dict[str, list]:
+def _channel(values) -> np.ndarray:
+    # Zero-copy for telemetry columns, missing values of median laps become NaN
+    return np.asarray(values, dtype=np.float64)
 
-    raceline_y_throttle, raceline_x_throttle, raceline_z_throttle = gt7helper.get_race_line_coordinates_when_mode_is_active(self, mode=gt7helper.RACE_LINE_THROTTLE_MODE)
-    raceline_y_braking, raceline_x_braking, raceline_z_braking = gt7helper.get_race_line_coordinates_when_mode_is_active(self, mode=gt7helper.RACE_LINE_BRAKING_MODE)
-    raceline_y_coasting, raceline_x_coasting, raceline_z_coasting = gt7helper.get_race_line_coordinates_when_mode_is_active(self, mode=gt7helper.RACE_LINE_COASTING_MODE)
+def _build_data_dict(self, distance_mode=True) -> dict[str, list]:
+
+    race_lines = gt7helper.get_race_line_coordinates_for_all_modes(self)
+    raceline_y_throttle, raceline_x_throttle, raceline_z_throttle = race_lines[gt7helper.RACE_LINE_THROTTLE_MODE]
+    raceline_y_braking, raceline_x_braking, raceline_z_braking = race_lines[gt7helper.RACE_LINE_BRAKING_MODE]
+    raceline_y_coasting, raceline_x_coasting, raceline_z_coasting = race_lines[gt7helper.RACE_LINE_COASTING_MODE]
 
     data = {
-        "throttle": self.data_throttle,
-        "brake": self.data_braking,
-        "brake_abs": self.data_braking_abs,
-        "speed": self.data_speed,
-        "time": self.data_time,
-        "tires": self.data_tires,
-        "rpm": self.data_rpm,
-        "boost": self.data_boost,
-        "yaw_rate": self.data_absolute_yaw_rate_per_second,
-        "gear": self.data_gear,
-        "ticks": list(range(len(self.data_speed))),
-        "coast": self.data_coasting,
-        "raceline_y": self.data_position_y,
-        "raceline_x": self.data_position_x,
-        "raceline_z": self.data_position_z,
+        "throttle": _channel(self.data_throttle),
+        "brake": _channel(self.data_braking),
+        "brake_abs": _channel(self.data_braking_abs),
+        "speed": _channel(self.data_speed),
+        "time": _channel(self.data_time),
+        "tires": _channel(self.data_tires),
+        "rpm": _channel(self.data_rpm),
+        "boost": _channel(self.data_boost),
+        "yaw_rate": _channel(self.data_absolute_yaw_rate_per_second),
+        "gear": _channel(self.data_gear),
+        "ticks": np.arange(len(self.data_speed)),
+        "coast": _channel(self.data_coasting),
+        "raceline_y": _channel(self.data_position_y),
+        "raceline_x": _channel(self.data_position_x),
+        "raceline_z": _channel(self.data_position_z),
         # For a raceline when throttle is engaged
         "raceline_y_throttle": raceline_y_throttle,
         "raceline_x_throttle": raceline_x_throttle,
@@ -59,4 +69,80 @@ def get_data_dict(self, distance_mode=True) -> dict[str, list]:
         "distance": gt7helper.get_x_axis_depending_on_mode(self, distance_mode),
     }
 
-    return data
\ No newline at end of file
+    return data
+
+
+class LapDataCache:
+    """
+    Least recently used cache of the data dicts of laps, shared by all sessions of the process.
+
+    Entries are keyed by Lap.cache_key and the distance mode, so a lap is computed again
+    after its data changed. The cache is bounded by the bytes of the cached columns.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, lap, distance_mode=True) -> dict:
+        key = (lap.cache_key, distance_mode)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                # Callers may add or replace columns of their copy
+                return dict(entry[0])
+            self.misses += 1
+
+        data = _build_data_dict(lap, distance_mode)
+        size = _data_dict_size(data)
+
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (data, size)
+                self.size_bytes += size
+                while self.size_bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self.size_bytes -= evicted_size
+
+        return dict(data)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __str__(self):
+        return "LapDataCache: %d entries, %s, %d hits, %d misses" % (
+            len(self._entries),
+            gt7helper.human_readable_size(self.size_bytes),
+            self.hits,
+            self.misses,
+        )
+
+
+def _data_dict_size(data: dict) -> int:
+    size = 0
+    for values in data.values():
+        if isinstance(values, np.ndarray):
+            # Cached arrays are shared between callers
+            values.flags.writeable = False
+            size += values.nbytes
+        else:
+            size += 8 * len(values)
+    return size
+
+
+lap_data_cache = LapDataCache()
+
+
+def get_data_dict(self, distance_mode=True) -> dict[str, list]:
+    return lap_data_cache.get(self, distance_mode)
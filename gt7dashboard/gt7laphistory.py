@@ -0,0 +1,240 @@
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from gt7dashboard.gt7column import TelemetryColumn
+from gt7dashboard.gt7lap import Lap, DATA_CHANNELS
+from gt7dashboard.gt7lapcollection import LapCollection
+
+# Number of laps kept in memory, the data channels of older laps are spilled to disk
+DEFAULT_MAX_LAPS_IN_MEMORY = 50
+# Bytes of data channels kept in memory, about 100 laps of 2 minutes
+DEFAULT_MAX_BYTES_IN_MEMORY = 256 * 1024 * 1024
+# Bytes of spilled columns kept in memory after reading them again, e.g. for a selected reference lap
+DEFAULT_MAX_RELOADED_BYTES = 64 * 1024 * 1024
+
+
+class SpilledColumn(TelemetryColumn):
+    """
+    A frozen telemetry column whose values are stored in a LapSpillFile.
+
+    The values are read from the file on first access and dropped again by the spill file
+    when other columns are read, so only the length of the column is always kept in memory.
+    """
+
+    __slots__ = ("_spill_file", "_offset", "_dtype", "_loaded")
+
+    def __init__(self, spill_file: "LapSpillFile", offset: int, length: int, dtype: np.dtype):
+        self._spill_file = spill_file
+        self._offset = offset
+        self._length = length
+        self._dtype = dtype
+        self._loaded = None
+
+    @property
+    def _values(self) -> np.ndarray:
+        values = self._loaded
+        if values is None:
+            values = self._spill_file.load(self)
+        return values
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded is not None
+
+    def freeze(self):
+        pass
+
+    @property
+    def frozen(self) -> bool:
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        # Only values read from the spill file use memory
+        values = self._loaded
+        return 0 if values is None else values.nbytes
+
+    def __reduce__(self):
+        # Copies and pickles are regular columns, independent of the spill file
+        return TelemetryColumn, (self.view(), self._dtype)
+
+
+class LapSpillFile:
+    """
+    A temporary file storing the data channels of laps column by column.
+
+    The file is created on the first write and deleted when it is closed or garbage collected.
+    Columns read from the file are kept up to max_reloaded_bytes, least recently read columns
+    are dropped first.
+    """
+
+    def __init__(self, max_reloaded_bytes: int = DEFAULT_MAX_RELOADED_BYTES, directory: Optional[str] = None):
+        self.max_reloaded_bytes = max_reloaded_bytes
+        self._directory = directory
+        self._file = None
+        self._size = 0
+        self._lock = threading.Lock()
+        self._reloaded = OrderedDict()
+        self._reloaded_bytes = 0
+
+    def write(self, values: np.ndarray) -> SpilledColumn:
+        values = np.ascontiguousarray(values)
+        with self._lock:
+            if self._file is None:
+                self._file = tempfile.TemporaryFile(prefix="gt7laps_", suffix=".spill", dir=self._directory)
+            offset = self._size
+            self._file.seek(offset)
+            self._file.write(values.tobytes())
+            self._size += values.nbytes
+        return SpilledColumn(self, offset, len(values), values.dtype)
+
+    def load(self, column: SpilledColumn) -> np.ndarray:
+        with self._lock:
+            if column._loaded is not None:
+                self._reloaded.move_to_end(id(column))
+                return column._loaded
+
+            self._file.seek(column._offset)
+            data = self._file.read(column._length * column._dtype.itemsize)
+            # Arrays of bytes are read-only, like the frozen columns they replace
+            values = np.frombuffer(data, dtype=column._dtype)
+            column._loaded = values
+
+            self._reloaded[id(column)] = column
+            self._reloaded_bytes += values.nbytes
+            while self._reloaded_bytes > self.max_reloaded_bytes and len(self._reloaded) > 1:
+                _, dropped = self._reloaded.popitem(last=False)
+                self._reloaded_bytes -= dropped._loaded.nbytes
+                # Callers still holding the values keep them, only this reference is dropped
+                dropped._loaded = None
+            return values
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class LapHistory(LapCollection):
+    """
+    The finished laps of a session, the most recent lap first, indexed like a LapCollection.
+
+    Prepending a lap is O(1) besides updating the indexes. Laps are sealed when they are added.
+    The data channels of laps beyond max_laps_in_memory or max_bytes_in_memory are spilled to
+    a LapSpillFile, their Lap objects stay in the history and read their channels from disk
+    again when they are used, e.g. when the lap is selected as reference lap.
+
+    Iterating, slicing and snapshot() work on a copy, so laps can be added by the processing thread
+    while the dashboard is reading them.
+    """
+
+    def __init__(self, laps: Iterable[Lap] = (), max_laps_in_memory: int = DEFAULT_MAX_LAPS_IN_MEMORY,
+                 max_bytes_in_memory: int = DEFAULT_MAX_BYTES_IN_MEMORY, spill_file: LapSpillFile = None):
+        self.max_laps_in_memory = max_laps_in_memory
+        self.max_bytes_in_memory = max_bytes_in_memory
+        self.spill_file = spill_file if spill_file is not None else LapSpillFile()
+
+        self._lock = threading.Lock()
+        # Ids of the laps whose channels were spilled, laps cannot be referenced weakly
+        self._spilled = set()
+        LapCollection.__init__(self, laps)
+
+    def prepend(self, lap: Lap):
+        """Adds a lap as most recent lap"""
+        if not lap.sealed:
+            lap.seal()
+        with self._lock:
+            LapCollection.prepend(self, lap)
+            self._spill_over_budget()
+
+    def extend(self, laps: Iterable[Lap]):
+        """Adds laps as the oldest laps, keeping their order"""
+        laps = _sealed(laps)
+        with self._lock:
+            LapCollection.extend(self, laps)
+            self._spill_over_budget()
+
+    def extend_first(self, laps: Iterable[Lap]):
+        """Adds laps as the most recent laps, keeping their order"""
+        laps = _sealed(laps)
+        with self._lock:
+            for lap in reversed(laps):
+                LapCollection.prepend(self, lap)
+            self._spill_over_budget()
+
+    def is_spilled(self, lap: Lap) -> bool:
+        return id(lap) in self._spilled
+
+    def snapshot(self) -> LapCollection:
+        """Returns the laps and their indexes as they are now"""
+        with self._lock:
+            return LapCollection.copy(self)
+
+    copy = snapshot
+
+    def to_list(self) -> List[Lap]:
+        with self._lock:
+            return list(self._laps)
+
+    def close(self):
+        """Deletes the spill file, spilled laps cannot be read afterwards"""
+        self.spill_file.close()
+
+    def _spill_over_budget(self):
+        # The most recent laps are kept in memory, at least the first one
+        laps_in_memory = 0
+        bytes_in_memory = 0
+        for lap in self._laps:
+            if id(lap) in self._spilled:
+                continue
+            lap_bytes = sum(getattr(lap, channel).nbytes for channel in DATA_CHANNELS)
+            if lap_bytes == 0:
+                # Nothing to free, e.g. for laps mapped from a lap file
+                continue
+            if laps_in_memory == 0 or (laps_in_memory < self.max_laps_in_memory
+                                       and bytes_in_memory + lap_bytes <= self.max_bytes_in_memory):
+                laps_in_memory += 1
+                bytes_in_memory += lap_bytes
+            else:
+                self._spill(lap)
+
+    def _spill(self, lap: Lap):
+        lap.replace_channels({
+            channel: self.spill_file.write(getattr(lap, channel).view()) for channel in DATA_CHANNELS
+        })
+        self._spilled.add(id(lap))
+
+    def __len__(self):
+        return len(self._laps)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_list()[index]
+        with self._lock:
+            return self._laps[index]
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __reversed__(self):
+        return reversed(self.to_list())
+
+    def __repr__(self):
+        return "LapHistory(%d laps, %d spilled)" % (len(self._laps), len(self._spilled))
+
+
+def _sealed(laps: Iterable[Lap]) -> List[Lap]:
+    laps = list(laps)
+    for lap in laps:
+        if not lap.sealed:
+            lap.seal()
+    return laps
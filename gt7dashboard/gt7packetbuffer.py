@@ -0,0 +1,101 @@
+import socket
+import threading
+import time
+from typing import List, Tuple
+
+# Packets of all heartbeat variants are smaller
+MAX_PACKET_SIZE = 0x200
+
+
+class PacketRingBuffer:
+    """
+    A bounded buffer of received packets between one receiving and one processing thread.
+
+    All memory is allocated up front, packets are received directly into their slot.
+    When the buffer is full, newly received packets are dropped and counted as overflows,
+    so the receiving thread never blocks on the processing thread.
+    """
+
+    def __init__(self, capacity: int = 4096, max_packet_size: int = MAX_PACKET_SIZE):
+        self.capacity = capacity
+        self.max_packet_size = max_packet_size
+
+        self._memory = bytearray(capacity * max_packet_size)
+        self._slots = [
+            memoryview(self._memory)[i * max_packet_size:(i + 1) * max_packet_size]
+            for i in range(capacity)
+        ]
+        self._lengths = [0] * capacity
+        self._arrival_times = [0.0] * capacity
+        # Packets that do not fit are received here and dropped
+        self._overflow_slot = memoryview(bytearray(max_packet_size))
+
+        # Number of packets ever written and read, the difference is the number of buffered packets
+        self._written = 0
+        self._read = 0
+        self._condition = threading.Condition()
+
+        self.overflows = 0
+        self.high_watermark = 0
+
+    def receive_from(self, s: socket.socket) -> Tuple[float, memoryview]:
+        """
+        Receives the next packet of the socket into the buffer and returns its arrival time and data.
+        The data stays valid until the next packet is received, it is also returned for dropped packets.
+        Raises the exceptions of the socket, e.g. on timeouts.
+        """
+        if self._written - self._read >= self.capacity:
+            size = s.recv_into(self._overflow_slot)
+            with self._condition:
+                self.overflows += 1
+            return time.time(), self._overflow_slot[:size]
+
+        index = self._written % self.capacity
+        size = s.recv_into(self._slots[index])
+        arrival_time = time.time()
+        self._commit(index, size, arrival_time)
+        return arrival_time, self._slots[index][:size]
+
+    def put(self, data: bytes, arrival_time: float = None) -> bool:
+        """Copies a packet into the buffer, returns False if it was dropped because the buffer is full"""
+        if self._written - self._read >= self.capacity:
+            with self._condition:
+                self.overflows += 1
+            return False
+
+        index = self._written % self.capacity
+        size = min(len(data), self.max_packet_size)
+        self._slots[index][:size] = data[:size]
+        self._commit(index, size, arrival_time)
+        return True
+
+    def _commit(self, index: int, size: int, arrival_time: float = None):
+        self._lengths[index] = size
+        self._arrival_times[index] = time.time() if arrival_time is None else arrival_time
+        with self._condition:
+            self._written += 1
+            self.high_watermark = max(self.high_watermark, self._written - self._read)
+            self._condition.notify()
+
+    def get_batch(self, max_packets: int = 64, timeout: float = 0) -> List[Tuple[float, bytes]]:
+        """
+        Removes up to max_packets packets from the buffer and returns their arrival time and data.
+        Waits up to timeout seconds for a packet if the buffer is empty, returns an empty list after that.
+        """
+        with self._condition:
+            if self._written == self._read and timeout > 0:
+                self._condition.wait(timeout)
+            available = min(self._written - self._read, max_packets)
+
+        batch = []
+        for i in range(self._read, self._read + available):
+            index = i % self.capacity
+            batch.append((self._arrival_times[index], bytes(self._slots[index][:self._lengths[index]])))
+
+        # Free the slots only after copying, the receiving thread writes into them afterwards
+        with self._condition:
+            self._read += available
+        return batch
+
+    def __len__(self):
+        return self._written - self._read
@@ -0,0 +1,264 @@
+import argparse
+import logging
+import math
+import os
+import random
+import socket
+import time
+from threading import Thread
+from typing import Iterator, List, Optional
+
+from Crypto.Cipher import Salsa20
+
+from gt7dashboard.gt7communication import HeartbeatCheckMode, SALSA20_KEY, get_iv_for_heartbeat_check_mode, \
+    get_nonce
+from gt7dashboard.gt7data import encode_packet, PACKET_SIZE_A, PACKET_SIZE_B, PACKET_SIZE_TILDE
+from gt7dashboard.gt7lap import Lap
+
+logger = logging.getLogger('gt7simulator.py')
+
+PACKET_SIZES = {
+    HeartbeatCheckMode.A: PACKET_SIZE_A,
+    HeartbeatCheckMode.B: PACKET_SIZE_B,
+    HeartbeatCheckMode.Tilde: PACKET_SIZE_TILDE,
+}
+
+# The game sends telemetry with 60 ticks per second, lap times are based on these ticks
+GAME_TICKS_PER_SECOND = 60
+
+# The game stops sending packets, when no heartbeat was received for this many seconds
+HEARTBEAT_TIMEOUT = 10
+
+
+def salsa20_enc(ddata: bytes, heartbeat_check_mode: HeartbeatCheckMode, iv1: int) -> bytes:
+    """
+    Encrypts a decrypted packet like the game does. The seed of the IV is stored
+    unencrypted at 0x40, where the receiver reads it from before decrypting.
+    """
+    iv2 = get_iv_for_heartbeat_check_mode(iv1, heartbeat_check_mode)
+    cipher = Salsa20.new(SALSA20_KEY, get_nonce(iv1, iv2))
+    data = bytearray(cipher.encrypt(ddata))
+    data[0x40:0x44] = iv1.to_bytes(4, 'little')
+    return bytes(data)
+
+
+def synthesize_ticks(ticks_per_lap: int = 60 * GAME_TICKS_PER_SECOND, car_id: int = 1448) -> Iterator[dict]:
+    """
+    Yields the raw packet values of an endless race on a circular track,
+    with a slower section in every lap that is braked for.
+    """
+    radius = 300.0
+    lap = 1
+    last_lap_time = -1
+    best_lap_time = -1
+    while True:
+        for tick in range(ticks_per_lap):
+            progress = tick / ticks_per_lap
+            angle = 2 * math.pi * progress
+            # Slow down in the second half of the lap, faster towards the end of it
+            speed_factor = 1 - 0.5 * max(0.0, math.sin(2 * angle))
+            braking = math.cos(2 * angle) < -0.5 and progress < 0.5
+            yield {
+                "position_x": radius * math.cos(angle),
+                "position_y": 0.0,
+                "position_z": radius * math.sin(angle),
+                "rotation_yaw": (angle / math.pi) % 2 - 1,
+                "ride_height": 0.08,
+                "rpm": 3000 + 4000 * speed_factor,
+                "current_fuel": 100.0 - lap,
+                "fuel_capacity": 100.0,
+                "car_speed": 60 * speed_factor,
+                "boost": 1.0,
+                "water_temp": 85.0,
+                "oil_temp": 110.0,
+                "tyre_temp_FL": 80.0,
+                "tyre_temp_FR": 80.0,
+                "tyre_temp_rl": 80.0,
+                "tyre_temp_rr": 80.0,
+                "current_lap": lap,
+                "best_lap": best_lap_time,
+                "last_lap": last_lap_time,
+                "estimated_top_speed": 250,
+                "flags": 0b00000001,
+                "gears": 0x34 if braking else 0x45,
+                "throttle": 0 if braking else 255,
+                "brake": 200 if braking else 0,
+                "filtered_brake": 200 if braking else 0,
+                "car_id": car_id,
+            }
+
+        # Vary the lap times a little, so there is a best lap
+        last_lap_time = round(ticks_per_lap * 1000 / GAME_TICKS_PER_SECOND) + random.randint(0, 500)
+        if best_lap_time < 0 or last_lap_time < best_lap_time:
+            best_lap_time = last_lap_time
+        lap += 1
+
+
+def _value_at(channel, i: int, default=0.0):
+    # Lap files of older versions do not contain all channels
+    return channel[i] if i < len(channel) else default
+
+
+def replay_ticks(laps: List[Lap]) -> Iterator[dict]:
+    """
+    Yields the raw packet values of the recorded laps, oldest lap first, over and over again.
+    Values that are not part of laps are left out. Raises ValueError if none of the laps has any ticks.
+    """
+    if not any(len(lap.data_speed) > 0 for lap in laps):
+        raise ValueError("None of the %d laps has any ticks to replay" % len(laps))
+    return _replay_ticks(sorted(laps, key=lambda lap: lap.lap_start_timestamp))
+
+
+def _replay_ticks(laps: List[Lap]) -> Iterator[dict]:
+    # Separate generator, so replay_ticks raises when it is called and not on the first tick
+    lap_number = 1
+    last_lap_time = -1
+    best_lap_time = -1
+    while True:
+        for lap in laps:
+            for i in range(len(lap.data_speed)):
+                throttle = round(min(255, _value_at(lap.data_throttle, i) * 2.55))
+                brake = round(min(254, _value_at(lap.data_braking, i) * 2.55))
+                yield {
+                    "position_x": _value_at(lap.data_position_x, i),
+                    "position_y": _value_at(lap.data_position_y, i),
+                    "position_z": _value_at(lap.data_position_z, i),
+                    "rotation_yaw": _value_at(lap.data_rotation_yaw, i),
+                    "rpm": _value_at(lap.data_rpm, i),
+                    "current_fuel": 100.0,
+                    "fuel_capacity": 100.0,
+                    "car_speed": lap.data_speed[i] / 3.6,
+                    "boost": _value_at(lap.data_boost, i) + 1,
+                    "current_lap": lap_number,
+                    "best_lap": best_lap_time,
+                    "last_lap": last_lap_time,
+                    "flags": 0b00000001,
+                    "gears": int(_value_at(lap.data_gear, i, 0)),
+                    "throttle": throttle,
+                    "brake": brake,
+                    "filtered_brake": brake,
+                    "wheel_rotation": _value_at(lap.data_steering, i) * math.pi / 180,
+                    "car_id": lap.car_id,
+                }
+
+            last_lap_time = round(lap.lap_finish_time)
+            if best_lap_time < 0 or last_lap_time < best_lap_time:
+                best_lap_time = last_lap_time
+            lap_number += 1
+
+
+class GT7Simulator(Thread):
+    """
+    Stands in for the PlayStation: listens for heartbeats and replies with encrypted telemetry packets.
+
+    Every client that sent a heartbeat within HEARTBEAT_TIMEOUT receives packets of the size
+    of its heartbeat mode on client_port, at packets_per_second. Packets are synthesized,
+    or replayed from laps if given.
+    """
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 33739, client_port: int = 33740,
+                 packets_per_second: float = GAME_TICKS_PER_SECOND, laps: Optional[List[Lap]] = None,
+                 ticks_per_lap: int = 60 * GAME_TICKS_PER_SECOND):
+        Thread.__init__(self)
+        self.daemon = True
+        self._shall_run = True
+
+        self.host = host
+        self.port = port
+        self.client_port = client_port
+        self.packets_per_second = packets_per_second
+
+        if laps:
+            self.ticks = replay_ticks(laps)
+        else:
+            self.ticks = synthesize_ticks(ticks_per_lap)
+
+        self.packets_sent = 0
+        # Heartbeat mode and time of the last heartbeat by client ip
+        self._clients = {}
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind((self.host, self.port))
+        self._socket.setblocking(False)
+
+    def stop(self):
+        self._shall_run = False
+
+    def run(self):
+        package_id = 0
+        next_send_time = time.perf_counter()
+        try:
+            while self._shall_run:
+                self._receive_heartbeats()
+                clients = self._get_active_clients()
+                if len(clients) == 0:
+                    time.sleep(0.01)
+                    next_send_time = time.perf_counter()
+                    continue
+
+                package_id += 1
+                values = next(self.ticks)
+                values["package_id"] = package_id
+                values["time_on_track"] = round(package_id * 1000 / GAME_TICKS_PER_SECOND)
+
+                iv1 = random.getrandbits(32)
+                for ip, heartbeat_check_mode in clients:
+                    ddata = encode_packet(values, PACKET_SIZES[heartbeat_check_mode])
+                    self._socket.sendto(salsa20_enc(ddata, heartbeat_check_mode, iv1), (ip, self.client_port))
+                self.packets_sent += 1
+
+                # Sleep only if ahead of time, send without pause to catch up otherwise
+                next_send_time += 1 / self.packets_per_second
+                delay = next_send_time - time.perf_counter()
+                if delay > 0.001:
+                    time.sleep(delay)
+        finally:
+            self._socket.close()
+
+    def _receive_heartbeats(self):
+        while True:
+            try:
+                data, address = self._socket.recvfrom(64)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                # e.g. port unreachable of a client that went away
+                logger.debug("Error while receiving heartbeat: %s" % e)
+                continue
+
+            try:
+                heartbeat_check_mode = HeartbeatCheckMode(data.decode('utf-8'))
+            except ValueError:
+                logger.info("Ignoring unknown heartbeat %s from %s" % (data, address[0]))
+                continue
+
+            self._clients[address[0]] = (heartbeat_check_mode, time.monotonic())
+
+    def _get_active_clients(self):
+        now = time.monotonic()
+        return [
+            (ip, heartbeat_check_mode)
+            for ip, (heartbeat_check_mode, last_heartbeat) in self._clients.items()
+            if now - last_heartbeat <= HEARTBEAT_TIMEOUT
+        ]
+
+
+def main():
+    from gt7dashboard import gt7helper
+
+    parser = argparse.ArgumentParser(description="Simulates the telemetry of a PlayStation running GT7")
+    parser.add_argument("--host", default=os.environ.get("GT7_SIMULATOR_HOST", "0.0.0.0"))
+    parser.add_argument("--rate", type=float, default=GAME_TICKS_PER_SECOND, help="Packets per second")
+    parser.add_argument("--laps", help="Lap file (.gt7laps or .json) to replay instead of synthesized laps")
+    parser.add_argument("--ticks-per-lap", type=int, default=60 * GAME_TICKS_PER_SECOND)
+    args = parser.parse_args()
+
+    laps = gt7helper.load_laps_from_file(args.laps) if args.laps else None
+    simulator = GT7Simulator(host=args.host, packets_per_second=args.rate, laps=laps, ticks_per_lap=args.ticks_per_lap)
+    simulator.daemon = False
+    simulator.start()
+    print("Simulating GT7 telemetry on %s:%d with %.0f packets per second" % (args.host, simulator.port, args.rate))
+
+
+if __name__ == "__main__":
+    main()
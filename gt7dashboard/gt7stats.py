@@ -0,0 +1,146 @@
+import threading
+from typing import List, Tuple
+
+import numpy as np
+
+# Number of recent samples the rolling histograms are calculated of, about 30 seconds of packets
+ROLLING_WINDOW = 2000
+
+# Bucket edges in ms of the histograms of inter-arrival and processing times
+INTER_ARRIVAL_BUCKETS_MS = (0, 8, 16, 17, 20, 33, 50, 100, 1000)
+PROCESSING_BUCKETS_MS = (0, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 5)
+
+
+class RollingHistogram:
+    """Keeps the last window samples in a ring and calculates histogram and percentiles of them on demand"""
+
+    def __init__(self, bucket_edges: Tuple[float, ...], window: int = ROLLING_WINDOW):
+        self.bucket_edges = bucket_edges
+        self._samples = np.zeros(window)
+        self._count = 0
+
+    def add(self, value: float):
+        self._samples[self._count % len(self._samples)] = value
+        self._count += 1
+
+    def samples(self) -> np.ndarray:
+        return self._samples[:min(self._count, len(self._samples))]
+
+    def __len__(self):
+        return min(self._count, len(self._samples))
+
+    def histogram(self) -> List[int]:
+        """
+        Returns the number of samples per bucket. The first bucket counts samples below the first edge,
+        the last one samples above the last edge.
+        """
+        indices = np.searchsorted(self.bucket_edges, self.samples(), side="right")
+        return np.bincount(indices, minlength=len(self.bucket_edges) + 1).tolist()
+
+    def percentile(self, percent: float) -> float:
+        if len(self) == 0:
+            return float("nan")
+        return float(np.percentile(self.samples(), percent))
+
+    def std(self) -> float:
+        if len(self) < 2:
+            return float("nan")
+        return float(np.std(self.samples(), ddof=1))
+
+
+class ReceiveStats:
+    """
+    Statistics of the packets of one connection to the PlayStation.
+
+    Counters are updated by the processing, histograms cover the last ROLLING_WINDOW packets.
+    Times are in ms.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.packets_received = 0
+        self.packets_processed = 0
+        # Packets with a package id not greater than the one of the last packet
+        self.packets_out_of_order = 0
+        # Packets that could not be decrypted, e.g. because of a wrong heartbeat mode
+        self.packets_bad_magic = 0
+        # Packets whose processing raised an exception
+        self.packets_failed = 0
+        # Package ids that were skipped, the game sends every package id once
+        self.gaps = 0
+        self.packets_missing = 0
+
+        self._last_package_id = 0
+        self._last_arrival_time = None
+
+        self.inter_arrival_ms = RollingHistogram(INTER_ARRIVAL_BUCKETS_MS)
+        self.decrypt_ms = RollingHistogram(PROCESSING_BUCKETS_MS)
+        self.decode_ms = RollingHistogram(PROCESSING_BUCKETS_MS)
+        self.log_data_ms = RollingHistogram(PROCESSING_BUCKETS_MS)
+
+    def add_arrival(self, arrival_time: float):
+        with self._lock:
+            self.packets_received += 1
+            if self._last_arrival_time is not None:
+                self.inter_arrival_ms.add((arrival_time - self._last_arrival_time) * 1000)
+            self._last_arrival_time = arrival_time
+
+    def add_bad_magic(self, decrypt_ms: float):
+        with self._lock:
+            self.packets_bad_magic += 1
+            self.decrypt_ms.add(decrypt_ms)
+
+    def add_failed(self):
+        with self._lock:
+            self.packets_failed += 1
+
+    def add_out_of_order(self):
+        with self._lock:
+            self.packets_out_of_order += 1
+
+    def add_processed(self, package_id: int, decrypt_ms: float, decode_ms: float, log_data_ms: float):
+        with self._lock:
+            self.packets_processed += 1
+            if self._last_package_id > 0 and package_id > self._last_package_id + 1:
+                self.gaps += 1
+                self.packets_missing += package_id - self._last_package_id - 1
+            self._last_package_id = package_id
+
+            self.decrypt_ms.add(decrypt_ms)
+            self.decode_ms.add(decode_ms)
+            self.log_data_ms.add(log_data_ms)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            stats = {
+                "packets_received": self.packets_received,
+                "packets_processed": self.packets_processed,
+                "packets_out_of_order": self.packets_out_of_order,
+                "packets_bad_magic": self.packets_bad_magic,
+                "packets_failed": self.packets_failed,
+                "gaps": self.gaps,
+                "packets_missing": self.packets_missing,
+                "jitter_ms": self.inter_arrival_ms.std(),
+            }
+            for name in ("inter_arrival_ms", "decrypt_ms", "decode_ms", "log_data_ms"):
+                histogram: RollingHistogram = getattr(self, name)
+                stats[name] = {
+                    "p50": histogram.percentile(50),
+                    "p99": histogram.percentile(99),
+                    "bucket_edges": list(histogram.bucket_edges),
+                    "histogram": histogram.histogram(),
+                }
+        return stats
+
+
+def flatten_stats(stats: dict, prefix: str = "") -> List[Tuple[str, str]]:
+    """Returns name and formatted value of every statistic, e.g. for a table"""
+    rows = []
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            rows.extend(flatten_stats(value, prefix + name + "."))
+        elif isinstance(value, float):
+            rows.append((prefix + name, "%.3f" % value))
+        else:
+            rows.append((prefix + name, str(value)))
+    return rows
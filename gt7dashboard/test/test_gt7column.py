@@ -0,0 +1,103 @@
+import copy
+import pickle
+import unittest
+
+import numpy as np
+
+from gt7dashboard.gt7column import TelemetryColumn
+from gt7dashboard.gt7lap import Lap
+
+
+class TestTelemetryColumn(unittest.TestCase):
+    def test_append_grows_capacity(self):
+        column = TelemetryColumn()
+        for i in range(TelemetryColumn.INITIAL_CAPACITY + 1):
+            column.append(i)
+        self.assertEqual(TelemetryColumn.INITIAL_CAPACITY + 1, len(column))
+        self.assertEqual(2 * TelemetryColumn.INITIAL_CAPACITY * 8, column.nbytes)
+        self.assertEqual(TelemetryColumn.INITIAL_CAPACITY, column[-1])
+
+    def test_reads_like_a_list(self):
+        column = TelemetryColumn([1, 2, 3])
+        column.extend([4, 5])
+        self.assertEqual([1, 2, 3, 4, 5], column)
+        self.assertEqual([2.0, 3.0], list(column[1:3]))
+        self.assertEqual(15, sum(column))
+        self.assertEqual("[1.0, 2.0, 3.0, 4.0, 5.0]", repr(column))
+
+    def test_asarray_does_not_copy(self):
+        column = TelemetryColumn([1, 2, 3])
+        self.assertTrue(np.shares_memory(np.asarray(column), column.view()))
+
+    def test_wraps_arrays_without_copying(self):
+        values = np.arange(3, dtype=np.float32)
+        column = TelemetryColumn(values)
+        self.assertTrue(np.shares_memory(column.view(), values))
+        self.assertEqual(np.float32, column.view().dtype)
+
+        column.append(3)
+        self.assertEqual([0, 1, 2], values.tolist())
+        self.assertEqual([0, 1, 2, 3], column)
+
+    def test_pickle_and_copy(self):
+        column = TelemetryColumn()
+        column.extend([1, 2, 3])
+        self.assertEqual(column, pickle.loads(pickle.dumps(column)))
+        copied = copy.deepcopy(column)
+        copied.append(4)
+        self.assertEqual([1, 2, 3], column)
+
+    def test_frozen_column_is_read_only(self):
+        column = TelemetryColumn()
+        column.extend([1, 2, 3])
+        column.freeze()
+        self.assertTrue(column.frozen)
+
+        # Within and beyond the capacity
+        with self.assertRaises(ValueError):
+            column.append(4)
+        with self.assertRaises(ValueError):
+            column.extend(range(TelemetryColumn.INITIAL_CAPACITY))
+        with self.assertRaises(ValueError):
+            column.view()[0] = 0
+        self.assertEqual([1, 2, 3], column)
+
+        # Copies are not frozen
+        copied = copy.deepcopy(column)
+        copied.append(4)
+        self.assertFalse(copied.frozen)
+
+
+class TestLapColumns(unittest.TestCase):
+    def test_lap_channels_are_columns(self):
+        lap = Lap()
+        lap.data_speed.append(100)
+        self.assertIsInstance(lap.data_speed, TelemetryColumn)
+        self.assertEqual([100], lap.data_speed)
+
+    def test_from_dict_converts_channels(self):
+        lap = Lap.from_dict({"data_speed": [100, 110.5], "title": "Lap"})
+        self.assertIsInstance(lap.data_speed, TelemetryColumn)
+        self.assertEqual([100, 110.5], lap.data_speed)
+        self.assertEqual("Lap", lap.title)
+
+    def test_sealed_lap_is_immutable(self):
+        lap = Lap()
+        lap.data_speed.append(100)
+        lap.data_throttle = [50]
+        lap.seal()
+        cache_key = lap.cache_key
+
+        self.assertTrue(lap.sealed)
+        with self.assertRaises(AttributeError):
+            lap.title = "Changed"
+        with self.assertRaises(ValueError):
+            lap.data_speed.append(110)
+        with self.assertRaises(ValueError):
+            lap.data_throttle.append(60)
+        self.assertEqual(cache_key, lap.cache_key)
+
+        copied = copy.deepcopy(lap)
+        self.assertFalse(copied.sealed)
+        copied.data_speed.append(110)
+        self.assertEqual([100], lap.data_speed)
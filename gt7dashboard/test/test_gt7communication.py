@@ -1,8 +1,13 @@
+import asyncio
 import os
+import socket
+import tempfile
+import threading
 import time
 import unittest
 
-from gt7dashboard import gt7communication
+from gt7dashboard import gt7asynccommunication, gt7capture, gt7communication, gt7events, gt7simulator
+from gt7dashboard.gt7data import GTData, encode_packet
 from gt7dashboard.gt7lap import Lap
 
 PLAYSTATION_IP = "ps5wifi"
@@ -67,3 +72,300 @@ class GT7CommunicationTest(unittest.TestCase):
         self.gt7comm.load_laps(laps, replace_other_laps=True)
         self.assertEqual(2, len(self.gt7comm.laps))
         self.assertEqual(1, self.gt7comm.laps[0].number)
+
+
+def get_free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get_encrypted_packet(package_id: int, **values) -> bytes:
+    values = {"package_id": package_id, "car_speed": 50.0, **values}
+    ddata = encode_packet(values, gt7simulator.PACKET_SIZES[gt7communication.HeartbeatCheckMode.A])
+    return gt7simulator.salsa20_enc(ddata, gt7communication.HeartbeatCheckMode.A, package_id)
+
+
+class GT7TelemetryProcessorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.processor = gt7communication.GT7TelemetryProcessor("127.0.0.1")
+        self.processor._heartbeat_check_mode = gt7communication.HeartbeatCheckMode.A
+
+    def test_frames(self):
+        sequence, _ = self.processor.get_last_frame()
+        self.assertEqual(0, sequence)
+
+        self.assertTrue(self.processor._process_datagram(get_encrypted_packet(1)))
+        sequence, data = self.processor.get_last_frame()
+        self.assertEqual(1, sequence)
+        self.assertEqual(1, data.package_id)
+        self.assertIs(data, self.processor.get_last_data(timeout=0))
+
+        # Times out with the current frame
+        self.assertEqual((1, data), self.processor.wait_for_next_frame(1, timeout=0.01))
+
+        processing = threading.Timer(0.05, self.processor._process_datagram, args=(get_encrypted_packet(2),))
+        processing.start()
+        sequence, data = self.processor.wait_for_next_frame(1, timeout=5)
+        processing.join()
+        self.assertEqual(2, sequence)
+        self.assertEqual(2, data.package_id)
+
+    def test_dropped_packets_are_counted(self):
+        self.processor._process_datagram(get_encrypted_packet(2))
+        self.assertFalse(self.processor._process_datagram(get_encrypted_packet(1)))
+        self.assertFalse(self.processor._process_datagram(b"\x00" * 0x128))
+
+        self.assertEqual(1, self.processor.stats.packets_out_of_order)
+        self.assertEqual(1, self.processor.stats.packets_bad_magic)
+        self.assertEqual(1, self.processor.get_last_frame()[0])
+
+    def test_receive_stats(self):
+        for package_id, arrival_time in ((1, 100.0), (2, 100.017), (5, 100.05), (6, 100.066)):
+            self.processor.stats.add_arrival(arrival_time)
+            self.processor._process_datagram(get_encrypted_packet(package_id), arrival_time)
+
+        stats = self.processor.get_receive_stats()
+        self.assertEqual(4, stats["packets_received"])
+        self.assertEqual(4, stats["packets_processed"])
+        self.assertEqual(1, stats["gaps"])
+        self.assertEqual(2, stats["packets_missing"])
+        self.assertAlmostEqual(17, stats["inter_arrival_ms"]["p50"], delta=0.5)
+        self.assertEqual(3, sum(stats["inter_arrival_ms"]["histogram"]))
+        self.assertEqual(4, sum(stats["decrypt_ms"]["histogram"]))
+
+    def test_manual_lap_waits_for_logging(self):
+        swapped_while_logging = []
+        manual_laps = []
+
+        class Processor(gt7communication.GT7TelemetryProcessor):
+            def _log_data(self, data):
+                lap = self.current_lap
+                # 'Log Lap' of the dashboard while the packet is logged
+                manual_lap = threading.Thread(target=self.finish_lap, kwargs={"manual": True})
+                manual_lap.start()
+                manual_lap.join(timeout=0.05)
+                manual_laps.append(manual_lap)
+                swapped_while_logging.append(lap is not self.current_lap)
+                gt7communication.GT7TelemetryProcessor._log_data(self, data)
+
+        processor = Processor("127.0.0.1")
+        processor._heartbeat_check_mode = gt7communication.HeartbeatCheckMode.A
+        for package_id in range(1, 4):
+            processor._process_datagram(get_encrypted_packet(package_id, current_lap=1, flags=1))
+        for manual_lap in manual_laps:
+            manual_lap.join()
+
+        self.assertEqual([False, False, False], swapped_while_logging)
+
+
+class GT7CommunicationProcessingTest(unittest.TestCase):
+    def test_processing_continues_after_failing_packet(self):
+        processed = []
+
+        class Communication(gt7communication.GT7Communication):
+            def _process_datagram(self, data, arrival_time=None):
+                if data == b"fail":
+                    raise ValueError("Broken packet")
+                processed.append(data)
+                return True
+
+        gt7comm = Communication("127.0.0.1")
+        for data in (b"first", b"fail", b"last"):
+            gt7comm.packet_buffer.put(data, time.time())
+
+        processing = threading.Thread(target=gt7comm._process_packets)
+        with self.assertLogs("gt7communication.py"):
+            processing.start()
+            deadline = time.monotonic() + 5
+            while len(processed) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        gt7comm.stop()
+        processing.join()
+
+        self.assertEqual([b"first", b"last"], [bytes(data) for data in processed])
+        self.assertEqual(1, gt7comm.stats.packets_failed)
+
+
+class GT7SimulatorTest(unittest.TestCase):
+    def test_encrypted_packet_can_be_decrypted(self):
+        for heartbeat_check_mode, packet_size in gt7simulator.PACKET_SIZES.items():
+            gt7comm = gt7communication.GT7Communication("127.0.0.1")
+            gt7comm._heartbeat_check_mode = heartbeat_check_mode
+
+            ddata = encode_packet({"package_id": 42, "car_speed": 50.0, "flags": 1}, packet_size)
+            data = gt7simulator.salsa20_enc(ddata, heartbeat_check_mode, 0x12345678)
+            self.assertNotEqual(ddata, data)
+
+            decrypted = GTData(gt7communication.salsa20_dec(gt7comm, data))
+            self.assertEqual(42, decrypted.package_id)
+            self.assertAlmostEqual(180, decrypted.car_speed, places=3)
+            self.assertTrue(decrypted.in_race)
+
+    def test_replay_laps_without_ticks(self):
+        with self.assertRaises(ValueError):
+            gt7simulator.replay_ticks([])
+        with self.assertRaises(ValueError):
+            gt7simulator.replay_ticks([Lap(), Lap()])
+
+        lap = Lap()
+        lap.data_speed.extend([36.0, 72.0])
+        ticks = gt7simulator.replay_ticks([Lap(), lap])
+        self.assertEqual([10.0, 20.0, 10.0], [next(ticks)["car_speed"] for _ in range(3)])
+
+    def test_receive_laps_from_simulator(self):
+        simulator = gt7simulator.GT7Simulator(host="127.0.0.1", port=get_free_udp_port(),
+                                              client_port=get_free_udp_port(),
+                                              packets_per_second=3000, ticks_per_lap=300)
+        gt7comm = gt7communication.GT7Communication("127.0.0.1")
+        gt7comm.send_port = simulator.port
+        gt7comm.receive_port = simulator.client_port
+        finished_laps = []
+        connection_changes = []
+        gt7comm.events.subscribe(gt7events.LAP_FINISHED, finished_laps.append)
+        gt7comm.events.subscribe(gt7events.CONNECTION_CHANGED, connection_changes.append)
+
+        simulator.start()
+        gt7comm.start()
+        try:
+            timeout = time.time() + 10
+            while len(gt7comm.get_laps()) < 2 and time.time() < timeout:
+                time.sleep(0.05)
+        finally:
+            gt7comm.stop()
+            simulator.stop()
+
+        laps = gt7comm.get_laps()
+        self.assertGreaterEqual(len(laps), 2)
+        self.assertTrue(gt7comm.is_connected())
+        self.assertEqual(1448, laps[-1].car_id)
+        self.assertEqual(1, laps[-1].number)
+        # Ticks can be lost on the loopback device, but not many
+        self.assertAlmostEqual(300, len(laps[-1].data_speed), delta=30)
+        self.assertGreaterEqual(laps[-1].lap_finish_time, 5000)
+        self.assertIs(laps[-1], finished_laps[0])
+        self.assertTrue(finished_laps[0].sealed)
+        self.assertEqual(True, connection_changes[0])
+        stats = gt7comm.get_receive_stats()
+        self.assertGreater(stats["packets_processed"], 0)
+        self.assertEqual(0, stats["buffer_overflows"])
+
+    def test_connects_within_a_second(self):
+        simulator = gt7simulator.GT7Simulator(host="127.0.0.1", port=get_free_udp_port(),
+                                              client_port=get_free_udp_port())
+        gt7comm = gt7communication.GT7Communication("127.0.0.1")
+        gt7comm.send_port = simulator.port
+        gt7comm.receive_port = simulator.client_port
+
+        simulator.start()
+        start = time.monotonic()
+        gt7comm.start()
+        try:
+            sequence, _ = gt7comm.wait_for_next_frame(0, timeout=5)
+            first_packet_latency = time.monotonic() - start
+
+            # A restart reconnects right away
+            gt7comm.restart()
+            time.sleep(0.1)
+            restart = time.monotonic()
+            gt7comm.wait_for_next_frame(gt7comm.get_last_frame()[0], timeout=5)
+            restart_latency = time.monotonic() - restart
+        finally:
+            gt7comm.stop()
+            simulator.stop()
+
+        self.assertGreaterEqual(sequence, 1)
+        self.assertLess(first_packet_latency, 1)
+        self.assertLess(restart_latency, 1)
+
+
+    def test_receive_laps_from_simulator_async(self):
+        simulator = gt7simulator.GT7Simulator(host="127.0.0.1", port=get_free_udp_port(),
+                                              client_port=get_free_udp_port(),
+                                              packets_per_second=3000, ticks_per_lap=300)
+        gt7comm = gt7asynccommunication.GT7AsyncCommunication("127.0.0.1")
+        gt7comm.send_port = simulator.port
+        gt7comm.receive_port = simulator.client_port
+
+        async def receive_laps():
+            await gt7comm.start()
+            try:
+                first_lap = await gt7comm.wait_for_lap(timeout=10)
+                second_lap = await gt7comm.wait_for_lap(timeout=10)
+                return first_lap, second_lap
+            finally:
+                gt7comm.stop()
+
+        simulator.start()
+        try:
+            first_lap, second_lap = asyncio.run(receive_laps())
+        finally:
+            simulator.stop()
+
+        self.assertFalse(gt7comm.is_receiving())
+        self.assertEqual([second_lap, first_lap], gt7comm.get_laps()[:2])
+        self.assertEqual(first_lap.number + 1, second_lap.number)
+        self.assertAlmostEqual(300, len(second_lap.data_speed), delta=30)
+
+
+class GT7CaptureTest(unittest.TestCase):
+    def test_record_and_replay(self):
+        simulator = gt7simulator.GT7Simulator(host="127.0.0.1", port=get_free_udp_port(),
+                                              client_port=get_free_udp_port(),
+                                              packets_per_second=3000, ticks_per_lap=300)
+        gt7comm = gt7communication.GT7Communication("127.0.0.1")
+        gt7comm.send_port = simulator.port
+        gt7comm.receive_port = simulator.client_port
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "session.gt7cap")
+            gt7comm.start_recording(path)
+            simulator.start()
+            gt7comm.start()
+            try:
+                timeout = time.time() + 10
+                while len(gt7comm.get_laps()) < 2 and time.time() < timeout:
+                    time.sleep(0.05)
+
+                with self.assertRaises(RuntimeError):
+                    gt7comm.replay_capture(path)
+            finally:
+                gt7comm.stop_recording()
+                gt7comm.stop()
+                simulator.stop()
+
+            reader = gt7capture.PacketCaptureReader(path)
+            self.assertEqual("A", reader.heartbeat_mode)
+            arrival_times = [arrival_time for arrival_time, _ in reader]
+            self.assertGreater(len(arrival_times), 600)
+            self.assertEqual(sorted(arrival_times), arrival_times)
+
+            replayed_comm = gt7communication.GT7Communication("127.0.0.1")
+            replayed_comm.replay_capture(path)
+            # Replays are deterministic
+            replayed_again_comm = gt7communication.GT7Communication("127.0.0.1")
+            replayed_again_comm.replay_capture(path)
+
+        recorded_laps = gt7comm.get_laps()
+        replayed_laps = replayed_comm.get_laps()
+        self.assertGreaterEqual(len(replayed_laps), 2)
+        for recorded_lap, replayed_lap in zip(recorded_laps[-2:], replayed_laps[-2:]):
+            self.assertEqual(recorded_lap.lap_finish_time, replayed_lap.lap_finish_time)
+            self.assertEqual(recorded_lap.data_speed, replayed_lap.data_speed)
+        for replayed_lap, replayed_again_lap in zip(replayed_laps, replayed_again_comm.get_laps()):
+            self.assertEqual(replayed_lap.to_dict(), replayed_again_lap.to_dict())
+        self.assertLessEqual(arrival_times[0], replayed_laps[-1].lap_end_timestamp.timestamp())
+        self.assertGreaterEqual(arrival_times[-1], replayed_laps[0].lap_end_timestamp.timestamp())
+
+    def test_truncated_capture(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "session.gt7cap")
+            with gt7capture.PacketCaptureWriter(path, "B") as writer:
+                writer.write(b"1234", 1.0)
+                writer.write(b"5678", 2.0)
+            with open(path, "r+b") as f:
+                f.truncate(os.path.getsize(path) - 1)
+
+            reader = gt7capture.PacketCaptureReader(path)
+            self.assertEqual("B", reader.heartbeat_mode)
+            self.assertEqual([(1.0, b"1234")], list(reader))
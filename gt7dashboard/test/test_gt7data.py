@@ -0,0 +1,96 @@
+import struct
+import unittest
+
+from gt7dashboard.gt7data import GTData, LazyGTData, PACKET_SIZE_A, PACKET_SIZE_B, PACKET_SIZE_TILDE
+
+
+def get_test_packet(packet_size: int) -> bytes:
+    ddata = bytearray(packet_size)
+    struct.pack_into('<i', ddata, 0x00, 0x47375330)  # magic
+    struct.pack_into('<fff', ddata, 0x04, 1.5, 2.5, 3.5)  # position
+    struct.pack_into('<f', ddata, 0x38, 0.08)  # ride height
+    struct.pack_into('<f', ddata, 0x3C, 7200)  # rpm
+    struct.pack_into('<ff', ddata, 0x44, 42, 100)  # fuel, fuel capacity
+    struct.pack_into('<ff', ddata, 0x4C, 50, 1.5)  # speed in m/s, boost
+    struct.pack_into('<f', ddata, 0x58, 85)  # water temp
+    struct.pack_into('<ihhiii', ddata, 0x70, 1234, 3, 5, 90000, 91000, 3600000)
+    struct.pack_into('<B', ddata, 0x8E, 0b00000001)  # in race, not paused
+    struct.pack_into('<BBB', ddata, 0x90, 0x43, 255, 51)  # gears, throttle, brake
+    struct.pack_into('<ffff', ddata, 0xA4, 20, 20, 20, 20)  # wheel rps
+    struct.pack_into('<ffff', ddata, 0xB4, 0.3, 0.3, 0.3, 0.3)  # tyre diameter
+    struct.pack_into('<i', ddata, 0x124, 1448)  # car id
+    if packet_size >= PACKET_SIZE_B:
+        struct.pack_into('<f', ddata, 0x128, 3.141592653589793)  # wheel rotation
+    if packet_size >= PACKET_SIZE_TILDE:
+        struct.pack_into('<BB', ddata, 0x13C, 255, 0)  # filtered throttle, filtered brake
+    return bytes(ddata)
+
+
+class TestGTData(unittest.TestCase):
+    def test_empty_data(self):
+        data = GTData(None)
+        self.assertEqual(0, data.package_id)
+        self.assertFalse(data.in_race)
+
+    def test_decode_packet(self):
+        data = GTData(get_test_packet(PACKET_SIZE_A))
+        self.assertEqual(1234, data.package_id)
+        self.assertEqual(3, data.current_lap)
+        self.assertEqual(5, data.total_laps)
+        self.assertEqual(90000, data.best_lap)
+        self.assertEqual(91000, data.last_lap)
+        self.assertEqual(3600, data.time_on_track.total_seconds())
+        self.assertEqual(1448, data.car_id)
+        self.assertEqual(3, data.current_gear)
+        self.assertEqual(4, data.suggested_gear)
+        self.assertAlmostEqual(100, data.throttle)
+        self.assertAlmostEqual(20, data.brake)
+        self.assertAlmostEqual(180, data.car_speed, places=3)
+        self.assertAlmostEqual(0.5, data.boost)
+        self.assertAlmostEqual(80, data.ride_height, places=3)
+        self.assertAlmostEqual(3.6 * 0.3 * 20, data.type_speed_FL, places=3)
+        self.assertEqual(85, data.water_temp)
+        self.assertEqual(1.5, data.position_x)
+        self.assertTrue(data.in_race)
+        self.assertFalse(data.is_paused)
+        # Not part of packets of heartbeat 'A'
+        self.assertEqual(0, data.wheel_rotation)
+
+    def test_decode_packet_variants(self):
+        data_b = GTData(get_test_packet(PACKET_SIZE_B))
+        self.assertAlmostEqual(180, data_b.wheel_rotation, places=3)
+        self.assertEqual(0, data_b.filtered_throttle)
+
+        data_tilde = GTData(get_test_packet(PACKET_SIZE_TILDE))
+        self.assertAlmostEqual(180, data_tilde.wheel_rotation, places=3)
+        self.assertAlmostEqual(100, data_tilde.filtered_throttle)
+        self.assertAlmostEqual(20, data_tilde.brake_abs)
+
+    def test_decode_too_short_packet(self):
+        with self.assertRaises(ValueError):
+            GTData(bytes(PACKET_SIZE_A - 1))
+
+
+class TestLazyGTData(unittest.TestCase):
+    def test_lazy_fields_match_decoded_fields(self):
+        for packet_size in (PACKET_SIZE_A, PACKET_SIZE_B, PACKET_SIZE_TILDE):
+            packet = get_test_packet(packet_size)
+            data = GTData(packet)
+            lazy_data = LazyGTData(packet)
+            for name in GTData.get_attributes():
+                if name == "date_time":
+                    continue
+                self.assertEqual(getattr(data, name), getattr(lazy_data, name), name)
+
+    def test_decodes_only_accessed_fields(self):
+        lazy_data = LazyGTData(get_test_packet(PACKET_SIZE_TILDE))
+        self.assertEqual(1234, lazy_data.package_id)
+        self.assertIn("package_id", vars(lazy_data))
+        self.assertNotIn("gear_1", vars(lazy_data))
+
+    def test_materialize(self):
+        lazy_data = LazyGTData(get_test_packet(PACKET_SIZE_B))
+        data = lazy_data.materialize()
+        self.assertIs(type(data), GTData)
+        self.assertEqual(lazy_data.date_time, data.date_time)
+        self.assertEqual(lazy_data.car_id, data.car_id)
@@ -169,6 +169,29 @@ class TestHelper(unittest.TestCase):
         output_file(out_file)
         save(rt.t_lap_times)
 
+    def test_race_table_incremental_update(self):
+        laps = [Lap(), Lap(), Lap()]
+        for i, lap in enumerate(laps):
+            lap.number = 3 - i
+            lap.lap_finish_time = 60000 + i * 1000
+
+        rt = gt7diagrams.RaceTimeTable()
+        rt.show_laps(laps[1:])
+        self.assertEqual([1, 2], rt.lap_times_source.data["number"])
+        self.assertEqual(["+0:01.000", ""], rt.lap_times_source.data["diff"])
+
+        # A new lap is streamed and patches the diffs, because it is the new best lap
+        source_data = rt.lap_times_source.data
+        rt.show_laps(laps)
+        self.assertIs(source_data, rt.lap_times_source.data)
+        self.assertEqual([1, 2, 3], rt.lap_times_source.data["number"])
+        self.assertEqual(["+0:02.000", "+0:01.000", ""], rt.lap_times_source.data["diff"])
+        self.assertIs(laps[0], rt.get_lap(2))
+
+        # Different laps replace the table
+        rt.show_laps([Lap()])
+        self.assertEqual([0], rt.lap_times_source.data["number"])
+
     def test_display_variance(self):
         rd = self.helper_get_race_diagram()
         rd.update_fastest_laps_variance(self.test_laps)
@@ -178,9 +201,9 @@ class TestHelper(unittest.TestCase):
         output_file(out_file)
         save(rd.get_layout())
 
-        # get file size, should be about 5MB
+        # get file size, distance axes are serialized as binary arrays
         file_size = os.path.getsize(out_file)
-        self.assertAlmostEqual(file_size, 3000000, delta=1000000)
+        self.assertAlmostEqual(file_size, 2000000, delta=1000000)
 
     def test_display_flat_line_variance(self):
         rd = self.helper_get_race_diagram()
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import unittest
+
+from gt7dashboard import gt7events
+from gt7dashboard.gt7communication import GT7TelemetryProcessor
+from gt7dashboard.gt7events import EventBus
+from gt7dashboard.gt7lap import Lap
+
+
+class TestEventBus(unittest.TestCase):
+    def test_subscribe_and_unsubscribe(self):
+        events = EventBus()
+        received = []
+        unsubscribe = events.subscribe(gt7events.LAP_FINISHED, received.append)
+
+        events.publish(gt7events.LAP_FINISHED, 1)
+        events.publish(gt7events.SESSION_CHANGED, 2)
+        unsubscribe()
+        events.publish(gt7events.LAP_FINISHED, 3)
+
+        self.assertEqual([1], received)
+
+    def test_failing_subscriber_does_not_stop_others(self):
+        events = EventBus()
+        received = []
+
+        def fail(payload):
+            raise ValueError(payload)
+
+        events.subscribe(gt7events.LAP_FINISHED, fail)
+        events.subscribe(gt7events.LAP_FINISHED, received.append)
+        with self.assertLogs("gt7events.py"):
+            events.publish(gt7events.LAP_FINISHED, 1)
+
+        self.assertEqual([1], received)
+
+    def test_wait_for_event_of_other_thread(self):
+        events = EventBus()
+
+        async def wait():
+            waiting = asyncio.ensure_future(events.wait_for(gt7events.CONNECTION_CHANGED, timeout=5))
+            # Let the waiter subscribe
+            await asyncio.sleep(0)
+            threading.Thread(target=events.publish, args=(gt7events.CONNECTION_CHANGED, True)).start()
+            return await waiting
+
+        self.assertTrue(asyncio.run(wait()))
+
+    def test_wait_for_timeout(self):
+        events = EventBus()
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(events.wait_for(gt7events.LAP_FINISHED, timeout=0.01))
+
+    def test_subscribe_document(self):
+        class Document:
+            def __init__(self):
+                self.next_tick_callbacks = []
+                self.session_destroyed_callbacks = []
+
+            def add_next_tick_callback(self, callback):
+                self.next_tick_callbacks.append(callback)
+
+            def on_session_destroyed(self, callback):
+                self.session_destroyed_callbacks.append(callback)
+
+        events = EventBus()
+        doc = Document()
+        received = []
+        events.subscribe_document(doc, gt7events.LAP_FINISHED, received.append)
+
+        events.publish(gt7events.LAP_FINISHED, 1)
+        self.assertEqual([], received)
+        doc.next_tick_callbacks[0]()
+        self.assertEqual([1], received)
+
+        doc.session_destroyed_callbacks[0](None)
+        events.publish(gt7events.LAP_FINISHED, 2)
+        self.assertEqual(1, len(doc.next_tick_callbacks))
+
+
+class TestTelemetryProcessorEvents(unittest.TestCase):
+    def test_laps_changed(self):
+        processor = GT7TelemetryProcessor("127.0.0.1")
+        received = []
+        processor.events.subscribe(gt7events.LAPS_CHANGED, received.append)
+
+        laps = [Lap()]
+        processor.load_laps(laps, replace_other_laps=True)
+        processor.reset()
+
+        self.assertEqual([laps, []], received)
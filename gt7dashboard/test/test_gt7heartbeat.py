@@ -0,0 +1,52 @@
+import unittest
+
+from gt7dashboard.gt7heartbeat import HeartbeatScheduler, RECONNECT_BACKOFF_MAX, RECONNECT_BACKOFF_MIN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestHeartbeatScheduler(unittest.TestCase):
+    def test_interval(self):
+        clock = FakeClock()
+        scheduler = HeartbeatScheduler(interval=1.0, jitter=0, clock=clock)
+        self.assertTrue(scheduler.is_due())
+
+        scheduler.sent()
+        self.assertFalse(scheduler.is_due())
+        self.assertEqual(1.0, scheduler.next_heartbeat_in())
+
+        clock.now += 0.6
+        self.assertAlmostEqual(0.4, scheduler.next_heartbeat_in())
+        clock.now += 0.5
+        self.assertTrue(scheduler.is_due())
+        self.assertEqual(0, scheduler.next_heartbeat_in())
+
+    def test_jitter(self):
+        clock = FakeClock()
+        scheduler = HeartbeatScheduler(interval=1.0, jitter=0.2, clock=clock)
+        for _ in range(100):
+            scheduler.sent()
+            self.assertTrue(0.8 <= scheduler.next_heartbeat_in() <= 1.2)
+
+    def test_reset(self):
+        scheduler = HeartbeatScheduler(clock=FakeClock())
+        scheduler.sent()
+        scheduler.reset()
+        self.assertTrue(scheduler.is_due())
+
+    def test_reconnect_backoff(self):
+        scheduler = HeartbeatScheduler(clock=FakeClock())
+        delays = [scheduler.connection_failed() for _ in range(10)]
+
+        self.assertEqual(RECONNECT_BACKOFF_MIN, delays[0])
+        self.assertEqual(2 * RECONNECT_BACKOFF_MIN, delays[1])
+        self.assertEqual(RECONNECT_BACKOFF_MAX, delays[-1])
+
+        scheduler.connected()
+        self.assertEqual(RECONNECT_BACKOFF_MIN, scheduler.connection_failed())
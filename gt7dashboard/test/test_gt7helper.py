@@ -1,7 +1,10 @@
 import pickle
+import tempfile
 import unittest
 import os
 
+import numpy as np
+
 from gt7dashboard.gt7helper import calculate_remaining_fuel, format_laps_to_table, calculate_time_diff_by_distance, \
     get_n_fastest_laps_within_percent_threshold_ignoring_replays
 from gt7dashboard.gt7lap import Lap
@@ -102,6 +105,31 @@ class TestHelper(unittest.TestCase):
 
         print(len(df))
 
+    def test_lap_time_aligner(self):
+        reference_lap = Lap()
+        reference_lap.data_speed = [0, 36, 36, 36, 36]
+        reference_lap.data_time = [0, 1, 2, 3, 4]
+
+        slower_lap = Lap()
+        slower_lap.data_speed = [0, 18, 18, 18, 18, 18, 18, 18, 18]
+        slower_lap.data_time = [0, 1, 2, 3, 4, 5, 6, 7, 8]
+
+        aligner = gt7helper.LapTimeAligner(reference_lap, distance_step=0.1)
+        df_same, df_slower = aligner.compare_all([reference_lap, slower_lap])
+
+        self.assertListEqual(["distance", "reference", "comparison", "timedelta"], list(df_slower.columns))
+        self.assertEqual(0, df_same.timedelta.abs().max().total_seconds())
+
+        # The slower lap needs twice the time for the distance of the reference lap
+        end = df_slower.iloc[-1]
+        self.assertAlmostEqual(4, end.reference.total_seconds())
+        self.assertAlmostEqual(8, end.comparison.total_seconds())
+        self.assertAlmostEqual(4, end.timedelta.total_seconds())
+
+    def test_lap_time_aligner_empty_lap(self):
+        df = calculate_time_diff_by_distance(Lap(), Lap())
+        self.assertEqual(0, len(df))
+
     def test_convert_seconds_to_milliseconds(self):
         seconds = 10000
         ms = gt7helper.convert_seconds_to_milliseconds(seconds)
@@ -216,9 +244,17 @@ class TestLaps(unittest.TestCase):
         median_lap = gt7helper.get_median_lap(self.Laps)
         self.assertEqual(len(median_lap.data_throttle), len(self.Laps[0].data_throttle))
         self.assertEqual(1225, median_lap.lap_finish_time)
-        self.assertListEqual([0, 37.5, 75, 99, 100, 50, 27.5, 0], median_lap.data_throttle)
+        self.assertListEqual([0, 37.5, 75, 99, 100, 50, 27.5, 0], median_lap.data_throttle.tolist())
         # should contain the last 10, even though the other laps do not contain it
-        self.assertListEqual([6, 12, 0, -22.5, 10], median_lap.data_braking)
+        self.assertListEqual([6, 12, 0, -22.5, 10], median_lap.data_braking.tolist())
+
+        # Cached until the laps or their data change
+        self.assertIs(median_lap, gt7helper.get_median_lap(self.Laps))
+        self.assertIsNot(median_lap, gt7helper.get_median_lap(self.Laps[:3]))
+        self.Laps[0].data_throttle.append(10)
+        changed_median_lap = gt7helper.get_median_lap(self.Laps)
+        self.assertEqual(9, len(changed_median_lap.data_throttle))
+        self.assertEqual(10, changed_median_lap.data_throttle[-1])
 
         # with self.assertRaises(Exception) as context:
         #     get_median_lap([])
@@ -262,6 +298,27 @@ class TestLaps(unittest.TestCase):
         car_name = gt7helper.get_car_name_for_car_id(1448)
         self.assertEqual(car_name, "CAR-ID-1448")
 
+    def test_csv_catalog(self):
+        catalog = gt7helper.CsvCatalog()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cars.csv")
+            with open(path, "w") as f:
+                f.write("ID,ShortName,Maker\n1448,SILVIA spec-R Aero (S15) '02,27\n1449,Other,27\n")
+
+            self.assertEqual("SILVIA spec-R Aero (S15) '02", catalog.name(path, 1448))
+            self.assertIsNone(catalog.name(path, 1))
+            self.assertEqual([(1448, "SILVIA spec-R Aero (S15) '02"), (1449, "Other")], catalog.rows(path))
+
+            with open(path, "w") as f:
+                f.write("ID,ShortName,Maker\n1448,Renamed,27\n")
+            # Make sure the modification time differs on file systems with coarse timestamps
+            modification_time = os.stat(path).st_mtime_ns + 1000000000
+            os.utime(path, ns=(modification_time, modification_time))
+            self.assertEqual("Renamed", catalog.name(path, 1448))
+
+        self.assertIsNone(catalog.name(path, 1448))
+        self.assertEqual([], catalog.rows(path))
+
     def test_get_safe_filename(self):
         self.assertEqual("Cio_123_98", gt7helper.get_safe_filename("Cio 123 '98"))
 
@@ -303,6 +360,43 @@ class TestLaps(unittest.TestCase):
         self.assertEqual(2, len(tighter_filtered_laps))
 
 
+    def test_get_race_line_coordinates_for_all_modes(self):
+        lap = Lap()
+        lap.data_throttle = [100, 0, 0, 50]
+        lap.data_braking = [0, 80, 0, 50]
+        lap.data_position_x = [1, 2, 3, 4]
+        lap.data_position_y = [5, 6, 7, 8]
+        lap.data_position_z = [9, 10, 11, 12]
+
+        race_lines = gt7helper.get_race_line_coordinates_for_all_modes(lap)
+
+        y, x, z = race_lines[gt7helper.RACE_LINE_THROTTLE_MODE]
+        np.testing.assert_array_equal([1, np.nan, np.nan, np.nan], x)
+        np.testing.assert_array_equal([5, np.nan, np.nan, np.nan], y)
+        y, x, z = race_lines[gt7helper.RACE_LINE_BRAKING_MODE]
+        np.testing.assert_array_equal([np.nan, 10, np.nan, np.nan], z)
+        y, x, z = race_lines[gt7helper.RACE_LINE_COASTING_MODE]
+        np.testing.assert_array_equal([np.nan, np.nan, 3, np.nan], x)
+        self.assertEqual(np.float64, x.dtype)
+
+        y, x, z = gt7helper.get_race_line_coordinates_when_mode_is_active(lap, gt7helper.RACE_LINE_BRAKING_MODE)
+        np.testing.assert_array_equal([np.nan, 2, np.nan, np.nan], x)
+
+    def test_get_x_axis_for_distance(self):
+        lap = Lap()
+        lap.data_speed.extend([0, 36, 72, 72])
+        x_axis = gt7helper.get_x_axis_for_distance(lap)
+        tick_distance = 10 / 1000 * gt7helper.TICK_TIME
+        np.testing.assert_allclose([0, tick_distance, 3 * tick_distance, 5 * tick_distance], x_axis)
+        self.assertFalse(x_axis.flags.writeable)
+
+        # Cached until the data changes
+        self.assertIs(x_axis, gt7helper.get_x_axis_for_distance(lap))
+        lap.data_speed.append(36)
+        self.assertEqual(5, len(gt7helper.get_x_axis_for_distance(lap)))
+        lap.data_speed = [0, 36]
+        self.assertEqual(2, len(gt7helper.get_x_axis_for_distance(lap)))
+
     def test_get_variance_for_fastest_laps(self):
         l1 = Lap()
         l1.data_speed = [50, 100, 110, 120]
@@ -320,6 +414,20 @@ class TestLaps(unittest.TestCase):
         print("")
         print(variance)
 
+    def test_get_variance_for_laps_on_grid(self):
+        l1 = Lap()
+        l1.data_speed = [50, 100, 110, 120]
+        l2 = Lap()
+        l2.data_speed = [50, 100, 110, 120]
+
+        variance = gt7helper.get_variance_for_laps([l1, l2, Lap()], number_of_points=50)
+        self.assertEqual(50, len(variance))
+        self.assertListEqual(["distance", "speed_variance"], list(variance.columns))
+        self.assertEqual(0, variance.speed_variance.max())
+        self.assertAlmostEqual(gt7helper.get_x_axis_for_distance(l1)[-1], variance.distance.iloc[-1])
+
+        self.assertEqual(0, len(gt7helper.get_variance_for_laps([])))
+
     def test_get_n_fastest_laps_within_percent_threshold_ignoring_replays(self):
         empty_lap = Lap()
         empty_lap.data_speed = []
@@ -370,4 +478,20 @@ class TestLaps(unittest.TestCase):
 
         self.assertEqual(len(laps), len(laps_read))
         for obj1, obj2 in zip(laps, laps_read):
-            self.assertEqual(obj1.__dict__, obj2.__dict__)
+            self.assertEqual(obj1.to_dict(), obj2.to_dict())
+
+    def test_pickle_laps(self):
+        lap = Lap()
+        lap.number = 3
+        lap.data_speed = [100, 120, 130]
+
+        lap_read = pickle.loads(pickle.dumps(lap))
+        self.assertEqual(lap.to_dict(), lap_read.to_dict())
+
+        # Laps pickled before slots were introduced have their instance dict as state
+        legacy_lap = Lap.__new__(Lap)
+        legacy_lap.__setstate__({"number": 5, "data_speed": [100], "unknown_attribute": 1})
+        self.assertEqual(5, legacy_lap.number)
+        self.assertEqual([100], legacy_lap.data_speed)
+        self.assertEqual([], legacy_lap.data_braking_abs)
+        self.assertFalse(hasattr(legacy_lap, "unknown_attribute"))
@@ -0,0 +1,72 @@
+import unittest
+
+from gt7dashboard import gt7helper
+from gt7dashboard.gt7lap import Lap
+from gt7dashboard.gt7lapcollection import LapCollection
+
+
+def get_lap(finish_time: int, car_id: int = 1, track_id: int = 10, is_replay: bool = False) -> Lap:
+    lap = Lap()
+    lap.lap_finish_time = finish_time
+    lap.car_id = car_id
+    lap.track_id = track_id
+    lap.is_replay = is_replay
+    lap.data_speed.extend([100, 200])
+    return lap
+
+
+class TestLapCollection(unittest.TestCase):
+    def setUp(self):
+        self.replay = get_lap(900, is_replay=True)
+        self.fast = get_lap(1000, car_id=2)
+        self.medium = get_lap(1040, track_id=20)
+        self.slow = get_lap(1200)
+        # Most recent lap first
+        self.laps = [self.slow, self.replay, self.fast, self.medium]
+        self.collection = LapCollection(self.laps)
+
+    def test_order_and_sequence(self):
+        self.assertEqual(self.laps, self.collection)
+        self.assertEqual(4, len(self.collection))
+        self.assertIs(self.slow, self.collection[0])
+        self.assertEqual(self.laps[1:3], self.collection[1:3])
+        self.assertEqual(list(reversed(self.laps)), list(reversed(self.collection)))
+
+    def test_best_lap_includes_replays(self):
+        self.assertIs(self.replay, self.collection.best_lap())
+        self.assertIs(gt7helper.get_best_lap(self.laps), gt7helper.get_best_lap(self.collection))
+        self.assertIsNone(LapCollection().best_lap())
+
+    def test_fastest_laps_ignore_replays(self):
+        self.assertEqual([self.fast, self.medium], self.collection.fastest_laps(2))
+        self.assertEqual([self.fast, self.medium], self.collection.fastest_laps(5, percent_threshold=0.05))
+        self.assertEqual(
+            gt7helper.get_n_fastest_laps_within_percent_threshold_ignoring_replays(self.laps, 3, 0.5),
+            gt7helper.get_n_fastest_laps_within_percent_threshold_ignoring_replays(self.collection, 3, 0.5),
+        )
+
+    def test_best_lap_per_car_and_track(self):
+        self.assertIs(self.fast, self.collection.best_lap_of_car(2))
+        self.assertIs(self.medium, self.collection.best_lap_of_car(1))
+        self.assertIsNone(self.collection.best_lap_of_car(3))
+        self.assertIs(self.fast, self.collection.best_lap_of_track(10))
+        self.assertEqual({1: self.medium, 2: self.fast}, self.collection.best_laps_per_car())
+        self.assertEqual({10: self.fast, 20: self.medium}, self.collection.best_laps_per_track())
+
+    def test_most_recent_of_equal_laps_comes_first(self):
+        older = get_lap(1000)
+        newer = get_lap(1000)
+        collection = LapCollection([older])
+        collection.prepend(newer)
+        collection.extend([get_lap(1000)])
+
+        self.assertIs(newer, collection.best_lap())
+        self.assertIs(gt7helper.get_best_lap(collection.to_list()), collection.best_lap())
+
+    def test_copy_does_not_change(self):
+        copied = self.collection.copy()
+        self.collection.prepend(get_lap(500))
+
+        self.assertEqual(4, len(copied))
+        self.assertIs(self.fast, copied.fastest_laps(1)[0])
+        self.assertEqual(500, self.collection.fastest_laps(1)[0].lap_finish_time)
@@ -0,0 +1,120 @@
+import json
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+from gt7dashboard import gt7helper, gt7lapfile
+from gt7dashboard.gt7lap import Lap, LAP_ATTRIBUTES, DATA_CHANNELS
+from gt7dashboard.gt7laphistory import LapHistory
+
+
+class TestLapFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.json_path = os.path.join(self.directory, "laps.json")
+        shutil.copy(os.path.join(os.getcwd(), "test_data", "broad_bean_raceway_time_trial_4laps.json"), self.json_path)
+        self.laps = gt7helper.load_laps_from_json(self.json_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_and_read(self):
+        path = os.path.join(self.directory, "laps.gt7laps")
+        gt7lapfile.write_laps(path, self.laps)
+        laps = gt7lapfile.read_laps(path)
+
+        self.assertEqual(len(self.laps), len(laps))
+        for expected, lap in zip(self.laps, laps):
+            for key in LAP_ATTRIBUTES:
+                if key in DATA_CHANNELS:
+                    # Channels are stored as float32
+                    np.testing.assert_allclose(getattr(expected, key), getattr(lap, key), rtol=1e-6, atol=1e-6)
+                else:
+                    self.assertEqual(getattr(expected, key), getattr(lap, key), key)
+        self.assertEqual(np.int16, laps[0].data_gear.view().dtype)
+        self.assertEqual(np.float32, laps[0].data_speed.view().dtype)
+
+    def test_columns_are_aligned(self):
+        path = os.path.join(self.directory, "laps.gt7laps")
+        gt7lapfile.write_laps(path, self.laps)
+
+        with open(path, "rb") as f:
+            gt7lapfile.read_file_header(f)
+            size, metadata_size = gt7lapfile.LAP_HEADER.unpack(f.read(gt7lapfile.LAP_HEADER.size))
+            offsets = gt7lapfile.column_offsets(f.tell() + metadata_size, json.loads(f.read(metadata_size))["columns"])
+
+        self.assertTrue(all(offset % gt7lapfile.ALIGNMENT == 0 for _, _, _, offset in offsets))
+
+    def test_empty_lap(self):
+        path = os.path.join(self.directory, "laps.gt7laps")
+        gt7lapfile.write_laps(path, [Lap()])
+        lap = gt7lapfile.read_laps(path)[0]
+
+        self.assertEqual(0, len(lap.data_speed))
+        self.assertEqual(-1, lap.lap_end_timestamp)
+
+    def test_unsupported_files(self):
+        path = os.path.join(self.directory, "laps.gt7laps")
+        with open(path, "wb") as f:
+            f.write(struct.pack("<8sHHI", gt7lapfile.LAP_FILE_MAGIC, gt7lapfile.LAP_FILE_VERSION + 1, 0, 0))
+        with self.assertRaises(ValueError):
+            gt7lapfile.read_laps(path)
+
+        with self.assertRaises(ValueError):
+            gt7lapfile.read_laps(self.json_path)
+
+    def test_convert_and_list_lap_files(self):
+        path = gt7helper.convert_lap_file(self.json_path)
+
+        self.assertEqual(os.path.join(self.directory, "laps.gt7laps"), path)
+        self.assertLess(os.path.getsize(path), os.path.getsize(self.json_path))
+        self.assertEqual([lap.number for lap in self.laps], [lap.number for lap in gt7helper.load_laps_from_file(path)])
+        self.assertEqual(["laps.json", "laps.gt7laps"],
+                         [lap_file.name for lap_file in gt7helper.list_lap_files_from_path(self.directory)])
+
+
+class TestLapArchive(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.laps = gt7helper.load_laps_from_json(os.path.join(os.getcwd(), "test_data", "broad_bean_raceway_time_trial_4laps.json"))
+        self.path = os.path.join(self.directory, "laps.gt7laps")
+        gt7lapfile.write_laps(self.path, self.laps)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_infos(self):
+        archive = gt7lapfile.LapArchive(self.path)
+
+        self.assertEqual(4, len(archive))
+        info = archive.infos[1]
+        lap = self.laps[1]
+        self.assertEqual((1, lap.number, lap.lap_finish_time, lap.car_id, lap.track_id, len(lap.data_speed)), info)
+        # Laps are only created when they are used
+        self.assertEqual([None] * 4, archive._laps)
+
+    def test_laps_are_mapped(self):
+        archive = gt7lapfile.LapArchive(self.path)
+        lap = archive[2]
+
+        self.assertIs(lap, archive.laps[2])
+        self.assertIsInstance(lap.data_speed, gt7lapfile.MappedColumn)
+        self.assertTrue(lap.data_speed.frozen)
+        self.assertEqual(0, lap.data_speed.nbytes)
+        np.testing.assert_allclose(self.laps[2].data_speed, lap.data_speed, rtol=1e-6)
+        self.assertEqual(self.laps[2].lap_start_timestamp, lap.lap_start_timestamp)
+
+        copied = pickle.loads(pickle.dumps(lap))
+        self.assertNotIsInstance(copied.data_speed, gt7lapfile.MappedColumn)
+        self.assertEqual(lap.data_speed, copied.data_speed)
+
+    def test_mapped_laps_are_not_spilled(self):
+        history = LapHistory(gt7helper.load_laps_from_file(self.path), max_laps_in_memory=1)
+
+        self.assertEqual(4, len(history))
+        self.assertFalse(any(history.is_spilled(lap) for lap in history))
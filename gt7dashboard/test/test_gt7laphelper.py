@@ -0,0 +1,74 @@
+import unittest
+
+from gt7dashboard.gt7lap import Lap
+from gt7dashboard.gt7laphelper import LapDataCache
+
+
+def get_test_lap(ticks: int) -> Lap:
+    lap = Lap()
+    for i in range(ticks):
+        lap.data_speed.append(100 + i)
+        lap.data_throttle.append(100 if i % 2 else 0)
+        lap.data_braking.append(0 if i % 2 else 100)
+        lap.data_position_x.append(i)
+        lap.data_position_y.append(0)
+        lap.data_position_z.append(2 * i)
+    return lap
+
+
+class TestLapDataCache(unittest.TestCase):
+    def test_computes_lap_once(self):
+        cache = LapDataCache()
+        lap = get_test_lap(10)
+
+        data = cache.get(lap)
+        self.assertEqual(10, len(data["speed"]))
+        self.assertEqual((0, 1), (cache.hits, cache.misses))
+
+        cached_data = cache.get(lap)
+        self.assertIs(data["speed"], cached_data["speed"])
+        self.assertIsNot(data, cached_data)
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+        # Different distance mode is a different entry
+        cache.get(lap, distance_mode=False)
+        self.assertEqual((1, 2), (cache.hits, cache.misses))
+
+    def test_data_changes_invalidate(self):
+        cache = LapDataCache()
+        lap = get_test_lap(10)
+        cache.get(lap)
+
+        lap.data_speed.append(110)
+        self.assertEqual(11, len(cache.get(lap)["speed"]))
+
+        lap.data_speed = [1, 2, 3]
+        self.assertEqual([1, 2, 3], cache.get(lap)["speed"].tolist())
+        self.assertEqual(3, cache.misses)
+
+    def test_evicts_least_recently_used(self):
+        lap_1 = get_test_lap(10)
+        lap_2 = get_test_lap(10)
+        lap_3 = get_test_lap(10)
+
+        cache = LapDataCache()
+        cache.get(lap_1)
+        cache.max_bytes = 2 * cache.size_bytes
+        cache.get(lap_2)
+        cache.get(lap_1)
+        cache.get(lap_3)
+
+        self.assertEqual(2, len(cache))
+        self.assertLessEqual(cache.size_bytes, cache.max_bytes)
+        cache.get(lap_1)
+        self.assertEqual(2, cache.hits)
+        cache.get(lap_2)
+        self.assertEqual(4, cache.misses)
+
+    def test_cached_columns_are_read_only(self):
+        cache = LapDataCache()
+        lap = get_test_lap(10)
+        with self.assertRaises(ValueError):
+            cache.get(lap)["speed"][0] = 1
+        lap.data_speed.append(1)
+        self.assertEqual(100, lap.data_speed[0])
@@ -0,0 +1,121 @@
+import copy
+import pickle
+import unittest
+
+import numpy as np
+
+from gt7dashboard.gt7column import TelemetryColumn
+from gt7dashboard.gt7communication import GT7TelemetryProcessor
+from gt7dashboard.gt7lap import Lap
+from gt7dashboard.gt7lapcollection import LapCollection
+from gt7dashboard.gt7laphistory import LapHistory, LapSpillFile, SpilledColumn
+
+
+def get_lap(number: int, ticks: int = 100) -> Lap:
+    lap = Lap()
+    lap.number = number
+    lap.data_speed = TelemetryColumn(np.arange(ticks, dtype=np.float64) + number)
+    lap.data_gear = TelemetryColumn(np.full(ticks, number % 6, dtype=np.int64))
+    return lap
+
+
+class TestLapHistory(unittest.TestCase):
+    def test_prepend_keeps_most_recent_first(self):
+        history = LapHistory()
+        for number in range(1, 4):
+            history.prepend(get_lap(number))
+
+        self.assertEqual([3, 2, 1], [lap.number for lap in history])
+        self.assertEqual(3, history[0].number)
+        self.assertEqual([2, 1], [lap.number for lap in history[1:]])
+        self.assertTrue(history[0].sealed)
+
+    def test_extend_and_extend_first(self):
+        history = LapHistory([get_lap(2)])
+        history.extend([get_lap(1), get_lap(0)])
+        history.extend_first([get_lap(4), get_lap(3)])
+
+        self.assertEqual([4, 3, 2, 1, 0], [lap.number for lap in history])
+
+    def test_spills_laps_beyond_max_laps(self):
+        history = LapHistory(max_laps_in_memory=2)
+        laps = [get_lap(number) for number in range(1, 5)]
+        for lap in laps:
+            history.prepend(lap)
+
+        self.assertFalse(history.is_spilled(laps[3]))
+        self.assertFalse(history.is_spilled(laps[2]))
+        self.assertTrue(history.is_spilled(laps[1]))
+        self.assertTrue(history.is_spilled(laps[0]))
+        self.assertIsInstance(laps[0].data_speed, SpilledColumn)
+        self.assertEqual(0, laps[0].data_speed.nbytes)
+
+    def test_spills_laps_beyond_max_bytes(self):
+        # Two laps of 100 speed and gear values
+        history = LapHistory(max_bytes_in_memory=2 * 2 * 100 * 8)
+        laps = [get_lap(number) for number in range(1, 5)]
+        for lap in laps:
+            history.prepend(lap)
+
+        self.assertEqual([False, False, True, True], [history.is_spilled(lap) for lap in reversed(laps)])
+
+    def test_keeps_most_recent_lap_over_budget(self):
+        history = LapHistory(max_bytes_in_memory=1)
+        lap = get_lap(1)
+        history.prepend(lap)
+
+        self.assertFalse(history.is_spilled(lap))
+
+    def test_spilled_lap_is_read_again(self):
+        history = LapHistory(max_laps_in_memory=1)
+        lap = get_lap(1)
+        cache_key = lap.cache_key
+        history.prepend(lap)
+        history.prepend(get_lap(2))
+
+        self.assertTrue(history.is_spilled(lap))
+        self.assertEqual(cache_key, lap.cache_key)
+        self.assertEqual(100, len(lap.data_speed))
+        self.assertFalse(lap.data_speed.loaded)
+        np.testing.assert_array_equal(np.arange(100) + 1, lap.data_speed)
+        self.assertEqual(np.int64, lap.data_gear.view().dtype)
+        self.assertTrue(lap.data_speed.loaded)
+        self.assertTrue(lap.data_speed.frozen)
+        with self.assertRaises(ValueError):
+            lap.data_speed.append(1)
+
+    def test_spilled_lap_can_be_copied_and_pickled(self):
+        history = LapHistory(max_laps_in_memory=1)
+        lap = get_lap(1)
+        history.prepend(lap)
+        history.prepend(get_lap(2))
+
+        for copied in (copy.deepcopy(lap), pickle.loads(pickle.dumps(lap))):
+            self.assertNotIsInstance(copied.data_speed, SpilledColumn)
+            self.assertEqual(lap.data_speed, copied.data_speed)
+
+    def test_reloaded_columns_are_dropped_over_budget(self):
+        spill_file = LapSpillFile(max_reloaded_bytes=100 * 8)
+        first = spill_file.write(np.arange(100, dtype=np.float64))
+        second = spill_file.write(np.arange(100, dtype=np.float64) * 2)
+
+        self.assertEqual(99, first[-1])
+        self.assertEqual(198, second[-1])
+        self.assertFalse(first.loaded)
+        self.assertTrue(second.loaded)
+        self.assertEqual(99, first[-1])
+        spill_file.close()
+
+
+class TestTelemetryProcessorLapHistory(unittest.TestCase):
+    def test_load_laps(self):
+        processor = GT7TelemetryProcessor("127.0.0.1")
+        processor.max_laps_in_memory = 1
+        processor.load_laps([get_lap(2), get_lap(1)], replace_other_laps=True)
+        processor.load_laps([get_lap(3)], to_first_position=True)
+        processor.load_laps([get_lap(0)], to_last_position=True)
+
+        laps = processor.get_laps()
+        self.assertIsInstance(laps, LapCollection)
+        self.assertEqual([3, 2, 1, 0], [lap.number for lap in laps])
+        self.assertEqual([False, True, True, True], [processor.laps.is_spilled(lap) for lap in laps])
@@ -0,0 +1,70 @@
+import socket
+import threading
+import unittest
+
+from gt7dashboard.gt7packetbuffer import PacketRingBuffer
+
+
+class TestPacketRingBuffer(unittest.TestCase):
+    def test_get_batch_in_order(self):
+        buffer = PacketRingBuffer(capacity=8, max_packet_size=16)
+        for i in range(5):
+            self.assertTrue(buffer.put(bytes([i]) * (i + 1), arrival_time=i))
+
+        batch = buffer.get_batch(max_packets=3)
+        self.assertEqual([(0, b"\x00"), (1, b"\x01\x01"), (2, b"\x02\x02\x02")], batch)
+        self.assertEqual(2, len(buffer))
+
+        batch = buffer.get_batch(max_packets=3)
+        self.assertEqual([3, 4], [arrival_time for arrival_time, _ in batch])
+        self.assertEqual(0, len(buffer))
+
+    def test_wraps_around(self):
+        buffer = PacketRingBuffer(capacity=4, max_packet_size=4)
+        received = []
+        for i in range(10):
+            buffer.put(i.to_bytes(4, "little"))
+            received += [int.from_bytes(data, "little") for _, data in buffer.get_batch()]
+
+        self.assertEqual(list(range(10)), received)
+        self.assertEqual(0, buffer.overflows)
+
+    def test_overflow_drops_new_packets(self):
+        buffer = PacketRingBuffer(capacity=4, max_packet_size=4)
+        for i in range(6):
+            buffer.put(bytes([i]))
+
+        self.assertEqual(2, buffer.overflows)
+        self.assertEqual(4, buffer.high_watermark)
+        self.assertEqual([bytes([i]) for i in range(4)], [data for _, data in buffer.get_batch()])
+
+    def test_get_batch_timeout(self):
+        buffer = PacketRingBuffer(capacity=4)
+        self.assertEqual([], buffer.get_batch(timeout=0.01))
+
+    def test_receive_from_socket(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            receiver.bind(("127.0.0.1", 0))
+            receiver.settimeout(1)
+            buffer = PacketRingBuffer(capacity=2, max_packet_size=8)
+
+            consumer = threading.Thread(target=lambda: received.extend(buffer.get_batch(timeout=1)))
+            received = []
+            consumer.start()
+
+            for data in (b"first", b"second", b"third"):
+                sender.sendto(data, receiver.getsockname())
+            for data in (b"first", b"second", b"third"):
+                _, received_data = buffer.receive_from(receiver)
+                # Also dropped packets are returned
+                self.assertEqual(data, bytes(received_data))
+            consumer.join()
+
+            received += buffer.get_batch()
+            self.assertEqual(3, len(received) + buffer.overflows)
+            self.assertEqual(b"first", received[0][1])
+        finally:
+            receiver.close()
+            sender.close()
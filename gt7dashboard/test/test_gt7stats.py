@@ -0,0 +1,49 @@
+import math
+import unittest
+
+from gt7dashboard.gt7stats import RollingHistogram, ReceiveStats, flatten_stats
+
+
+class TestRollingHistogram(unittest.TestCase):
+    def test_histogram(self):
+        histogram = RollingHistogram((0, 10, 20))
+        for value in (-1, 5, 10, 15, 25, 30):
+            histogram.add(value)
+
+        # Below 0, 0 to 10, 10 to 20, above 20
+        self.assertEqual([1, 1, 2, 2], histogram.histogram())
+        self.assertEqual(12.5, histogram.percentile(50))
+
+    def test_window(self):
+        histogram = RollingHistogram((0, 10), window=3)
+        for value in (100, 1, 2, 3):
+            histogram.add(value)
+
+        self.assertEqual(3, len(histogram))
+        self.assertEqual([0, 3, 0], histogram.histogram())
+        self.assertEqual(1.0, histogram.std())
+
+    def test_empty(self):
+        histogram = RollingHistogram((0, 10))
+        self.assertEqual([0, 0, 0], histogram.histogram())
+        self.assertTrue(math.isnan(histogram.percentile(50)))
+        self.assertTrue(math.isnan(histogram.std()))
+
+
+class TestReceiveStats(unittest.TestCase):
+    def test_gaps(self):
+        stats = ReceiveStats()
+        for package_id in (10, 11, 15, 16, 20):
+            stats.add_processed(package_id, 0.01, 0.01, 0.01)
+
+        self.assertEqual(2, stats.gaps)
+        self.assertEqual(6, stats.packets_missing)
+
+    def test_flatten_stats(self):
+        stats = ReceiveStats()
+        stats.add_arrival(1.0)
+        stats.add_arrival(1.5)
+
+        rows = dict(flatten_stats(stats.to_dict()))
+        self.assertEqual("2", rows["packets_received"])
+        self.assertEqual("500.000", rows["inter_arrival_ms.p50"])
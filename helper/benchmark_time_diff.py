@@ -0,0 +1,75 @@
+"""
+Benchmarks the time diff calculation of the 'Get Faster' tab against the former pandas implementation.
+
+Usage: python3 helper/benchmark_time_diff.py [lap file]
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gt7dashboard import gt7helper  # noqa: E402
+
+
+def legacy_time_delta_dataframe_for_lap(lap, name: str) -> DataFrame:
+    lap_distance = list(gt7helper.get_x_axis_for_distance(lap))
+    lap_time_ms = [gt7helper.convert_seconds_to_milliseconds(item) for item in lap.data_time]
+
+    series = pd.Series(lap_distance, index=pd.to_timedelta(lap_time_ms, unit="ms"))
+    interpolated_upsample = series.resample("10ms").asfreq().interpolate()
+    inverted = pd.Series(interpolated_upsample.index.values, index=interpolated_upsample)
+    return DataFrame(data=pd.Series(inverted.values.astype("int64"), name=name, index=inverted.index))
+
+
+def legacy_calculate_time_diff_by_distance(reference_lap, comparison_lap) -> DataFrame:
+    df1 = legacy_time_delta_dataframe_for_lap(reference_lap, "reference")
+    df2 = legacy_time_delta_dataframe_for_lap(comparison_lap, "comparison")
+
+    df = df1.join(df2, how="outer").sort_index().interpolate()
+    df.reset_index(inplace=True)
+    df = df.rename(columns={"index": "distance"})
+    df["reference"] = pd.to_timedelta(df["reference"])
+    df["comparison"] = pd.to_timedelta(df["comparison"])
+    df["timedelta"] = df["comparison"] - df["reference"]
+    return df
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join("test_data", "broad_bean_raceway_time_trial_4laps.json")
+    laps = gt7helper.load_laps_from_json(path)
+    reference_lap, comparison_laps = laps[0], laps[1:]
+    repetitions = 20
+
+    legacy = timeit.timeit(
+        lambda: [legacy_calculate_time_diff_by_distance(reference_lap, lap) for lap in comparison_laps],
+        number=repetitions,
+    )
+    aligned = timeit.timeit(
+        lambda: gt7helper.LapTimeAligner(reference_lap).compare_all(comparison_laps),
+        number=repetitions,
+    )
+
+    # Compare the results at the distances of the legacy implementation
+    max_deviation_ms = 0
+    for lap in comparison_laps:
+        df_legacy = legacy_calculate_time_diff_by_distance(reference_lap, lap)
+        df = gt7helper.calculate_time_diff_by_distance(reference_lap, lap)
+        in_both = df_legacy.distance <= df.distance.iloc[-1]
+        timedelta_ms = np.interp(df_legacy.distance[in_both], df.distance, df.timedelta.dt.total_seconds() * 1000)
+        deviation = np.abs(timedelta_ms - df_legacy.timedelta[in_both].dt.total_seconds() * 1000)
+        max_deviation_ms = max(max_deviation_ms, deviation.max())
+
+    print("%d comparison laps, %d repetitions" % (len(comparison_laps), repetitions))
+    print("pandas resampling: %8.2f ms per refresh" % (legacy / repetitions * 1000))
+    print("np.interp grid:    %8.2f ms per refresh" % (aligned / repetitions * 1000))
+    print("Speedup:           %8.1fx" % (legacy / aligned))
+    print("Max deviation:     %8.2f ms" % max_deviation_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+Converts JSON and pickle lap files to binary .gt7laps files next to them.
+
+Usage: python3 helper/convert_lap_files.py [lap files]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gt7dashboard import gt7helper  # noqa: E402
+
+
+def main(paths):
+    for path in paths:
+        lap_file_path = gt7helper.convert_lap_file(path)
+        print("%s (%s) -> %s (%s)" % (
+            path,
+            gt7helper.human_readable_size(os.path.getsize(path)),
+            lap_file_path,
+            gt7helper.human_readable_size(os.path.getsize(lap_file_path)),
+        ))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,4 +1,4 @@
-import copy
+import asyncio
 import itertools
 import logging
 import os
@@ -19,14 +19,13 @@ from bokeh.palettes import Plasma11 as palette
 from bokeh.plotting import curdoc
 from bokeh.plotting import figure
 
-from gt7dashboard import gt7communication, gt7diagrams, gt7help, gt7helper
+from gt7dashboard import gt7asynccommunication, gt7communication, gt7diagrams, gt7events, gt7help, gt7helper
 from gt7dashboard.gt7diagrams import get_speed_peak_and_valley_diagram
 
 from gt7dashboard.gt7help import get_help_div
 from gt7dashboard.gt7helper import (
-    load_laps_from_pickle,
     list_lap_files_from_path,
-    calculate_time_diff_by_distance, save_laps_to_json, load_laps_from_json,
+    calculate_time_diff_by_distance, save_laps_to_lap_file, load_laps_from_file,
 )
 from gt7dashboard.gt7lap import Lap
 from gt7dashboard.gt7laphelper import car_name, get_data_dict
@@ -115,8 +114,6 @@ def update_lap_change():
     If true, it updates all the visual elements.
     """
     global g_laps_stored
-    global g_session_stored
-    global g_connection_status_stored
     global g_telemetry_update_needed
     global g_reference_lap_selected
 
@@ -124,15 +121,6 @@ def update_lap_change():
 
     laps = app.gt7comm.get_laps()
 
-    if app.gt7comm.session != g_session_stored:
-        update_tuning_info()
-        g_session_stored = copy.copy(app.gt7comm.session)
-
-    if app.gt7comm.is_connected() != g_connection_status_stored:
-        update_connection_info()
-        g_connection_status_stored = copy.copy(app.gt7comm.is_connected())
-
-    # This saves on cpu time, 99.9% of the time this is true
     if laps == g_laps_stored and not g_telemetry_update_needed:
         return
 
@@ -188,9 +176,12 @@ def update_realtime_data():
     """
     This function updates the braking and throttle diagram.
     """ 
-    last_data = app.gt7comm.get_last_data()
-    if last_data is None:   
+    global g_realtime_frame_sequence
+    frame_sequence, last_data = app.gt7comm.get_last_frame()
+    # Skip frames that are already shown
+    if last_data is None or frame_sequence == g_realtime_frame_sequence:
         return
+    g_realtime_frame_sequence = frame_sequence
     debug_table.update_debug_data(last_data)
     race_diagram.add_realtime_debug_data(last_data)
 
@@ -199,6 +190,10 @@ def update_realtime_data():
 
        
 
+def update_receive_stats():
+    receive_stats_table.update_receive_stats(app.gt7comm.get_receive_stats())
+
+
 def update_speed_velocity_graph(laps: List[Lap]):
     last_lap, reference_lap, median_lap = gt7helper.get_last_reference_median_lap(
         laps, reference_lap_selected=g_reference_lap_selected
@@ -288,14 +283,14 @@ def log_lap_button_handler(event):
 
 def save_button_handler(event):
     if len(app.gt7comm.laps) > 0:
-        path = save_laps_to_json(app.gt7comm.laps)
+        path = save_laps_to_lap_file(app.gt7comm.get_laps())
         logger.info("Saved %d laps as %s" % (len(app.gt7comm.laps), path))
 
 
 def load_laps_handler(attr, old, new):
     logger.info("Loading %s" % new)
     race_diagram.delete_all_additional_laps()
-    app.gt7comm.load_laps(load_laps_from_json(new), replace_other_laps=True)
+    app.gt7comm.load_laps(load_laps_from_file(new), replace_other_laps=True)
 
 
 def load_reference_lap_handler(attr, old, new):
@@ -347,6 +342,12 @@ def get_race_lines_layout(number_of_race_lines):
 
     return l, race_line_diagrams, race_lines_data
 
+
+def log_communication_task_exception(task: asyncio.Task):
+    # Otherwise, an error while receiving is not reported before the task is garbage collected
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Communication with the PlayStation stopped", exc_info=task.exception())
+
 app = bokeh.application.Application
 
 # Share the gt7comm connection between sessions by storing them as an application attribute
@@ -358,14 +359,24 @@ if not hasattr(app, "gt7comm"):
         playstation_ip = "255.255.255.255"
         logger.info(f"No IP set in env var GT7_PLAYSTATION_IP using broadcast at {playstation_ip}")
 
-    app.gt7comm = gt7communication.GT7Communication(playstation_ip)
+    use_async_communication = os.environ.get("GT7_ASYNC_COMMUNICATION", "false").lower() == "true"
+    if use_async_communication:
+        app.gt7comm = gt7asynccommunication.GT7AsyncCommunication(playstation_ip)
+    else:
+        app.gt7comm = gt7communication.GT7Communication(playstation_ip)
 
     if load_laps_path:
         app.gt7comm.load_laps(
-            load_laps_from_pickle(load_laps_path), replace_other_laps=True
+            load_laps_from_file(load_laps_path), replace_other_laps=True
         )
 
-    app.gt7comm.start()
+    if use_async_communication:
+        # Receive on the event loop of the Bokeh server, which runs this script
+        # Keep a reference to the task, the event loop only references tasks weakly
+        app.gt7comm_task = asyncio.ensure_future(app.gt7comm.start())
+        app.gt7comm_task.add_done_callback(log_communication_task_exception)
+    else:
+        app.gt7comm.start()
 else:
     # Reuse existing thread
     if not app.gt7comm.is_connected():
@@ -383,11 +394,10 @@ else:
 # init_lap_times_source()
 
 g_laps_stored = []
-g_session_stored = None
-g_connection_status_stored = None
 g_reference_lap_selected = None
 g_stored_fuel_map = None
 g_telemetry_update_needed = False
+g_realtime_frame_sequence = -1
 
 stored_lap_files = gt7helper.bokeh_tuple_for_list_of_lapfiles(
     list_lap_files_from_path(os.path.join(os.getcwd(), "data"))
@@ -401,6 +411,7 @@ total_width = race_line_width + speed_diagram_width
 race_diagram = gt7diagrams.RaceDiagram(width=1000)
 race_time_table = gt7diagrams.RaceTimeTable()
 debug_table = gt7diagrams.DebugTable()
+receive_stats_table = gt7diagrams.ReceiveStatsTable()
 colors = itertools.cycle(palette)
 
 def table_row_selection_callback(attrname, old, new):
@@ -423,8 +434,8 @@ def table_row_selection_callback(attrname, old, new):
         # get element at index of iterator
         color = colors[colors_index]
         colors_index+=1
-        lap_to_add = g_laps_stored[index]
-        new_lap_data_source = race_diagram.add_lap_to_race_diagram(color, legend=g_laps_stored[index].title, visible=True)
+        lap_to_add = race_time_table.get_lap(index)
+        new_lap_data_source = race_diagram.add_lap_to_race_diagram(color, legend=lap_to_add.title, visible=True)
         new_lap_data_source.data = get_data_dict(lap_to_add)
 
 
@@ -557,8 +568,17 @@ t2 =layout(
 )
 
 tab5_1 = TabPanel(child=t1, title="Graph")
+receive_stats_table.t_receive_stats_table.height=800
+
+t3 = layout(
+    children=[
+        receive_stats_table.t_receive_stats_table
+    ]
+)
+
 tab5_2 = TabPanel(child=t2, title="Table")
-l5 = Tabs(tabs=[tab5_1, tab5_2])
+tab5_3 = TabPanel(child=t3, title="Packets")
+l5 = Tabs(tabs=[tab5_1, tab5_2, tab5_3])
 
 #  Setup the tabs
 tab1 = TabPanel(child=l1, title="Get Faster")
@@ -580,9 +600,16 @@ curdoc().template =  """
 curdoc().add_root(tabs)
 curdoc().title = "GT7 Dashboard"
 
-# This will only trigger once per lap, but we check every second if anything happened
-curdoc().add_periodic_callback(update_lap_change, 1000)
+# Laps, session and connection are updated when they change, and once when the page is opened
+app.gt7comm.events.subscribe_document(curdoc(), gt7events.LAP_FINISHED, lambda lap: update_lap_change())
+app.gt7comm.events.subscribe_document(curdoc(), gt7events.LAPS_CHANGED, lambda laps: update_lap_change())
+app.gt7comm.events.subscribe_document(curdoc(), gt7events.SESSION_CHANGED, lambda session: update_tuning_info())
+app.gt7comm.events.subscribe_document(curdoc(), gt7events.CONNECTION_CHANGED, lambda connected: update_connection_info())
+curdoc().add_next_tick_callback(update_lap_change)
+curdoc().add_next_tick_callback(update_tuning_info)
+curdoc().add_next_tick_callback(update_connection_info)
 curdoc().add_periodic_callback(update_fuel_map, 5000)
+curdoc().add_periodic_callback(update_receive_stats, 1000)
 
 updateFrequency = os.environ.get("GT7_UPDATE_FREQUENCY_MS")
 timeframeToShow = os.environ.get("GT7_TIMEFRAME_TO_SHOW")